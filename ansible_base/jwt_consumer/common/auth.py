@@ -232,51 +232,56 @@ class JWTCommonAuth:
             return
 
         from ansible_base.rbac.models import RoleUserAssignment
+        from ansible_base.rbac.triggers import rbac_batch
 
         role_diff = RoleUserAssignment.objects.filter(user=self.user, role_definition__name__in=settings.ANSIBLE_BASE_JWT_MANAGED_ROLES)
 
-        for system_role_name in self.token.get("global_roles", []):
-            logger.debug(f"Processing system role {system_role_name} for {self.user.username}")
-            rd = self.get_role_definition(system_role_name)
-            if rd:
-                if rd.name in settings.ANSIBLE_BASE_JWT_MANAGED_ROLES:
-                    assignment = rd.give_global_permission(self.user)
-                    role_diff = role_diff.exclude(pk=assignment.pk)
-                    logger.info(f"Granted user {self.user.username} global role {system_role_name}")
+        # Assignments are combined so that RBAC cached data is updated once for the user
+        with rbac_batch():
+            for system_role_name in self.token.get("global_roles", []):
+                logger.debug(f"Processing system role {system_role_name} for {self.user.username}")
+                rd = self.get_role_definition(system_role_name)
+                if rd:
+                    if rd.name in settings.ANSIBLE_BASE_JWT_MANAGED_ROLES:
+                        assignment = rd.give_global_permission(self.user)
+                        role_diff = role_diff.exclude(pk=assignment.pk)
+                        logger.info(f"Granted user {self.user.username} global role {system_role_name}")
+                    else:
+                        logger.error(f"Unable to grant {self.user.username} system level role {system_role_name} because it is not a JWT managed role")
                 else:
-                    logger.error(f"Unable to grant {self.user.username} system level role {system_role_name} because it is not a JWT managed role")
-            else:
-                logger.error(f"Unable to grant {self.user.username} system level role {system_role_name} because it does not exist")
-                continue
-
-        for object_role_name in self.token.get('object_roles', {}).keys():
-            rd = self.get_role_definition(object_role_name)
-            if rd is None:
-                logger.error(f"Unable to grant {self.user.username} object role {object_role_name} because it does not exist")
-                continue
-            elif rd.name not in settings.ANSIBLE_BASE_JWT_MANAGED_ROLES:
-                logger.error(f"Unable to grant {self.user.username} object role {object_role_name} because it is not a JWT managed role")
-                continue
-
-            object_type = self.token['object_roles'][object_role_name]['content_type']
-            object_indexes = self.token['object_roles'][object_role_name]['objects']
-
-            for index in object_indexes:
-                object_data = self.token['objects'][object_type][index]
-                resource, obj = self.get_or_create_resource(object_type, object_data)
-                if resource is not None:
-                    assignment = rd.give_permission(self.user, obj)
-                    role_diff = role_diff.exclude(pk=assignment.pk)
-                    logger.info(f"Granted user {self.user.username} role {object_role_name} to object {obj.name} with ansible_id {object_data['ansible_id']}")
-
-        # Remove all permissions not authorized by the JWT
-        for role_assignment in role_diff:
-            rd = role_assignment.role_definition
-            content_object = role_assignment.content_object
-            if content_object:
-                rd.remove_permission(self.user, content_object)
-            else:
-                rd.remove_global_permission(self.user)
+                    logger.error(f"Unable to grant {self.user.username} system level role {system_role_name} because it does not exist")
+                    continue
+
+            for object_role_name in self.token.get('object_roles', {}).keys():
+                rd = self.get_role_definition(object_role_name)
+                if rd is None:
+                    logger.error(f"Unable to grant {self.user.username} object role {object_role_name} because it does not exist")
+                    continue
+                elif rd.name not in settings.ANSIBLE_BASE_JWT_MANAGED_ROLES:
+                    logger.error(f"Unable to grant {self.user.username} object role {object_role_name} because it is not a JWT managed role")
+                    continue
+
+                object_type = self.token['object_roles'][object_role_name]['content_type']
+                object_indexes = self.token['object_roles'][object_role_name]['objects']
+
+                for index in object_indexes:
+                    object_data = self.token['objects'][object_type][index]
+                    resource, obj = self.get_or_create_resource(object_type, object_data)
+                    if resource is not None:
+                        assignment = rd.give_permission(self.user, obj)
+                        role_diff = role_diff.exclude(pk=assignment.pk)
+                        logger.info(
+                            f"Granted user {self.user.username} role {object_role_name} to object {obj.name} with ansible_id {object_data['ansible_id']}"
+                        )
+
+            # Remove all permissions not authorized by the JWT
+            for role_assignment in role_diff:
+                rd = role_assignment.role_definition
+                content_object = role_assignment.content_object
+                if content_object:
+                    rd.remove_permission(self.user, content_object)
+                else:
+                    rd.remove_global_permission(self.user)
 
     def get_or_create_resource(self, content_type: str, data: dict) -> Tuple[Optional[Resource], Optional[Model]]:
         """
@@ -5,6 +5,7 @@ from django.contrib.contenttypes.models import ContentType
 from ansible_base.jwt_consumer.common.auth import JWTAuthentication
 from ansible_base.jwt_consumer.common.exceptions import InvalidService
 from ansible_base.rbac.models import RoleDefinition, RoleUserAssignment
+from ansible_base.rbac.triggers import rbac_batch
 from ansible_base.resource_registry.models import Resource
 
 logger = logging.getLogger('ansible_base.jwt_consumer.hub.auth')
@@ -54,22 +55,23 @@ class HubJWTAuth(JWTAuthentication):
                     elif role_name == 'Team Member':
                         member_teams.append(team)
 
-        for roledef_name, teams in [('Team Admin', admin_teams), ('Team Member', member_teams)]:
+        with rbac_batch():
+            for roledef_name, teams in [('Team Admin', admin_teams), ('Team Member', member_teams)]:
 
-            # the "shared" "non-local" definition ...
-            roledef = RoleDefinition.objects.get(name=roledef_name)
+                # the "shared" "non-local" definition ...
+                roledef = RoleDefinition.objects.get(name=roledef_name)
 
-            # pks for filtering ...
-            team_pks = [team.pk for team in teams]
+                # pks for filtering ...
+                team_pks = [team.pk for team in teams]
 
-            # delete all assignments not defined by this jwt ...
-            for assignment in RoleUserAssignment.objects.filter(user=self.common_auth.user, role_definition=roledef).exclude(object_id__in=team_pks):
-                team = Team.objects.get(pk=assignment.object_id)
-                roledef.remove_permission(self.common_auth.user, team)
+                # delete all assignments not defined by this jwt ...
+                for assignment in RoleUserAssignment.objects.filter(user=self.common_auth.user, role_definition=roledef).exclude(object_id__in=team_pks):
+                    team = Team.objects.get(pk=assignment.object_id)
+                    roledef.remove_permission(self.common_auth.user, team)
 
-            # assign "non-local" for each team ...
-            for team in teams:
-                roledef.give_permission(self.common_auth.user, team)
+                # assign "non-local" for each team ...
+                for team in teams:
+                    roledef.give_permission(self.common_auth.user, team)
 
         auditor_roledef = RoleDefinition.objects.get(name='Platform Auditor')
         if "Platform Auditor" in self.common_auth.token.get('global_roles', []):
@@ -212,6 +212,35 @@ def get_dab_settings(
         # entries mapping that permission to the assignment's organization
         dab_data['ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS'] = False
 
+        # How RoleEvaluation entries are computed, options are
+        # "python" - expected entries are computed in python, and compared to existing entries
+        # "sql" - entries are inserted and deleted by set-based queries ran in the database,
+        #   this has only been verified on sqlite so far, run test_sql_caching.py on your database before using it
+        dab_data['ANSIBLE_BASE_EVALUATION_ENGINE'] = 'python'
+        # Number of object roles processed at a time when rebuilding all RoleEvaluation entries
+        # this is also the batch size for writing those entries, and limits memory use of the rebuild
+        dab_data['ANSIBLE_BASE_EVALUATION_CHUNK_SIZE'] = 1000
+        # Permission changes of a role definition affecting more object roles than this are queued
+        # and recomputed by the rbac_process_recompute_queue command, None to always recompute in the request
+        dab_data['ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD'] = None
+        # How access_qs and accessible_objects filter by permission evaluations, options are
+        # "in" - primary key IN a distinct subquery of evaluations, best when users have access to few objects
+        # "exists" - correlated EXISTS subquery of evaluations, best when users have access to many objects
+        dab_data['ANSIBLE_BASE_ACCESSIBLE_OBJECTS_STRATEGY'] = 'in'
+
+        # Name of a Django cache to save the ids of the object roles each user has, None to not use this
+        # evaluations will use these ids directly instead of a subquery of the role assignments
+        dab_data['ANSIBLE_BASE_ROLE_ID_CACHE'] = None
+        # Users with more roles than this will not use the saved ids, because the list is too long for a query
+        dab_data['ANSIBLE_BASE_ROLE_ID_CACHE_MAX_SIZE'] = 500
+        # Name of a Django cache to save the permissions each user has from global roles, None to not use this
+        dab_data['ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE'] = None
+        # Time in seconds before saved ids and global permissions expire, they are replaced when role assignments change anyway
+        dab_data['ANSIBLE_BASE_ROLE_ID_CACHE_TIMEOUT'] = 3600
+        # Name of a Django cache used to signal role definition changes to all processes, None to not use this
+        # with this, each process keeps the role definitions and permissions used to compute evaluations until they change
+        dab_data['ANSIBLE_BASE_TYPES_PREFETCH_CACHE'] = None
+
         # API clients can assign users and teams roles for shared resources
         dab_data['ALLOW_LOCAL_RESOURCE_MANAGEMENT'] = True
         # API clients can assign roles provided by the JWT
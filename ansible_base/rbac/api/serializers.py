@@ -1,6 +1,8 @@
+from collections import defaultdict
+
 from django.apps import apps
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
@@ -14,6 +16,8 @@ from ansible_base.lib.serializers.common import CommonModelSerializer, Immutable
 from ansible_base.rbac.models import RoleDefinition, RoleTeamAssignment, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry  # careful for circular imports
 from ansible_base.rbac.policies import check_content_obj_permission, visible_users
+from ansible_base.rbac.recompute_queue import get_recompute_status
+from ansible_base.rbac.triggers import rbac_batch
 from ansible_base.rbac.validators import check_locally_managed, validate_permissions_for_model
 
 
@@ -131,12 +135,17 @@ class RoleDefinitionSerializer(CommonModelSerializer):
     # content_type = ContentTypeField(slug_field='model', queryset=permission_registry.content_type_model.objects.all(), allow_null=True, default=None)
     permissions = ManyRelatedListField(child=PermissionField())
     content_type = ContentTypeField(allow_null=True, default=None)
+    recompute_status = serializers.SerializerMethodField(help_text=_('Progress of updating permissions of assigned users and teams after a change.'))
 
     class Meta:
         model = RoleDefinition
         read_only_fields = ('id', 'summary_fields')
         fields = '__all__'
 
+    def get_recompute_status(self, obj) -> dict:
+        # the count is annotated by the view, to avoid a query for each role definition in a list
+        return get_recompute_status(obj, pending=getattr(obj, 'pending_recompute_count', None))
+
     def validate(self, validated_data):
         # Obtain the resultant new values
         if 'permissions' in validated_data:
@@ -157,6 +166,40 @@ class RoleDefinitionDetailSerializer(RoleDefinitionSerializer):
     content_type = ContentTypeField(read_only=True)
 
 
+class BulkAssignmentListSerializer(serializers.ListSerializer):
+    """Creates a list of assignments, used when a list is posted to the assignment endpoints
+
+    Object assignments are grouped by role definition and object so that
+    each group is given with RoleDefinition.give_permissions_bulk,
+    and the RBAC cached data is updated once for the entire request.
+    """
+
+    def create(self, validated_data):
+        resolved = [self.child.resolve_assignment(item) for item in validated_data]
+        actor_id_field = f'{self.child.actor_field}_id'
+
+        actors_by_object = defaultdict(list)
+        for rd, actor, obj in resolved:
+            if rd.content_type:
+                actors_by_object[(rd, obj)].append(actor)
+
+        assignment_map = {}
+        with transaction.atomic(), rbac_batch():
+            for (rd, obj), actors in actors_by_object.items():
+                for assignment in rd.give_permissions_bulk(actors, [obj]):
+                    assignment_map[(rd.id, assignment.object_id, getattr(assignment, actor_id_field))] = assignment
+
+            assignments = []
+            for rd, actor, obj in resolved:
+                if rd.content_type:
+                    object_id = str(obj._meta.pk.get_db_prep_value(obj.pk, connection))
+                    assignments.append(assignment_map[(rd.id, object_id, actor.pk)])
+                else:
+                    assignments.append(self.child.give_global_assignment(rd, actor))
+
+        return assignments
+
+
 class BaseAssignmentSerializer(CommonModelSerializer):
     content_type = ContentTypeField(read_only=True)
     object_ansible_id = serializers.UUIDField(
@@ -241,7 +284,11 @@ class BaseAssignmentSerializer(CommonModelSerializer):
                 )
         return obj
 
-    def create(self, validated_data):
+    def resolve_assignment(self, validated_data):
+        """Return the role definition, actor, and object for the assignment
+
+        This also checks that the requesting user is allowed to make the assignment.
+        """
         rd = validated_data['role_definition']
         requesting_user = self.context['view'].request.user
 
@@ -267,19 +314,32 @@ class BaseAssignmentSerializer(CommonModelSerializer):
                 raise ValidationError({'object_id': _('Object must be specified for this role assignment')})
 
             check_content_obj_permission(requesting_user, obj)
+        else:
+            # Global role assignment, only allowed by superuser
+            if not requesting_user.is_superuser:
+                raise PermissionDenied
+
+        return (rd, actor, obj)
 
+    def give_global_assignment(self, rd, actor):
+        "Gives a global role, if the same assignment was just made by another request then that is returned"
+        try:
+            with transaction.atomic():
+                return rd.give_global_permission(actor)
+        except IntegrityError:
+            return self.Meta.model.objects.get(role_definition=rd, object_role=None, **{self.actor_field: actor})
+
+    def create(self, validated_data):
+        rd, actor, obj = self.resolve_assignment(validated_data)
+
+        if rd.content_type:
             try:
                 with transaction.atomic():
                     assignment = rd.give_permission(actor, obj)
             except IntegrityError:
                 assignment = self.Meta.model.objects.get(role_definition=rd, object_id=obj.pk, **{self.actor_field: actor})
         else:
-            # Global role assignment, only allowed by superuser
-            if not requesting_user.is_superuser:
-                raise PermissionDenied
-
-            with transaction.atomic():
-                assignment = rd.give_global_permission(actor)
+            assignment = self.give_global_assignment(rd, actor)
 
         return assignment
 
@@ -312,6 +372,7 @@ class RoleUserAssignmentSerializer(BaseAssignmentSerializer):
 
     class Meta:
         model = RoleUserAssignment
+        list_serializer_class = BulkAssignmentListSerializer
         fields = ASSIGNMENT_FIELDS + ['user', 'user_ansible_id']
 
     def get_actor_queryset(self, requesting_user):
@@ -327,6 +388,7 @@ class RoleTeamAssignmentSerializer(BaseAssignmentSerializer):
 
     class Meta:
         model = RoleTeamAssignment
+        list_serializer_class = BulkAssignmentListSerializer
         fields = ASSIGNMENT_FIELDS + ['team', 'team_ansible_id']
 
     def get_actor_queryset(self, requesting_user):
@@ -1,8 +1,9 @@
 from collections import OrderedDict
-from typing import Type
+from typing import Mapping, Type
 
 from django.db import transaction
-from django.db.models import Model
+from django.db.models import Count, Model, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from rest_framework import permissions
 from rest_framework.exceptions import ValidationError
@@ -21,13 +22,13 @@ from ansible_base.rbac.api.serializers import (
     RoleUserAssignmentSerializer,
 )
 from ansible_base.rbac.evaluations import has_super_permission
-from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.models import RecomputeQueueEntry, RoleDefinition
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.policies import check_can_remove_assignment
 from ansible_base.rbac.validators import check_locally_managed, permissions_allowed_for_role, system_roles_enabled
 
 
-def list_combine_values(data: dict[Type[Model], list[str]]) -> list[str]:
+def list_combine_values(data: Mapping[Type[Model], tuple[str, ...]]) -> list[str]:
     "Utility method to merge everything in .values() into a single list"
     ret = []
     for this_list in data.values():
@@ -87,7 +88,18 @@ class RoleDefinitionViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
     but can be assigned to users.
     """
 
-    queryset = RoleDefinition.objects.prefetch_related('created_by', 'modified_by', 'content_type', 'permissions')
+    queryset = RoleDefinition.objects.prefetch_related('created_by', 'modified_by', 'content_type', 'permissions').annotate(
+        pending_recompute_count=Coalesce(
+            Subquery(
+                RecomputeQueueEntry.objects.filter(role_definition=OuterRef('pk'))
+                .order_by()
+                .values('role_definition')
+                .annotate(count=Count('id'))
+                .values('count')
+            ),
+            0,
+        )
+    )
     serializer_class = RoleDefinitionSerializer
     permission_classes = try_add_oauth2_scope_permission([RoleDefinitionPermissions])
 
@@ -102,7 +114,9 @@ class RoleDefinitionViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
 
     def perform_update(self, serializer):
         self._error_if_managed(serializer.instance)
-        return super().perform_update(serializer)
+        super().perform_update(serializer)
+        # the change may have queued recomputes, so the annotated count is outdated
+        serializer.instance.__dict__.pop('pending_recompute_count', None)
 
     def perform_destroy(self, instance):
         self._error_if_managed(instance)
@@ -130,6 +144,13 @@ class BaseAssignmentViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
             new_qs = model.visible_items(self.request.user, qs)
         return super().filter_queryset(new_qs)
 
+    def get_serializer(self, *args, **kwargs):
+        # A list of assignments may be posted to create them all in bulk
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+            kwargs['allow_empty'] = False
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         return super().perform_create(serializer)
 
@@ -1,13 +1,19 @@
 import logging
+import time
 from collections import defaultdict
+from collections.abc import Iterable
 from typing import Optional
 from uuid import UUID
 
 from django.conf import settings
+from django.db.models import Q
 
-from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.evaluations import clear_permission_cache
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID, TeamAncestor
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.prefetch import TypesPrefetch
+from ansible_base.rbac.role_id_cache import invalidate_global_permissions
+from ansible_base.rbac.sql_caching import compute_object_role_permissions_sql
 
 logger = logging.getLogger('ansible_base.rbac.caching')
 
@@ -24,49 +30,89 @@ Those methods are what truly dictate the object-role to object-permission transl
 """
 
 
-def all_team_parents(team_id: int, team_team_parents: dict, seen: Optional[set] = None) -> set[int]:
+def compute_team_ancestors(team_ids: Iterable[int], team_team_parents: dict, known_ancestors: Optional[dict] = None) -> dict[int, dict[int, int]]:
     """
-    Returns parent teams, and parent teams of parent teams, until we have them all
-        {parent_team_id, parent_team_id, ...}
+    Returns parent teams, and parent teams of parent teams, with the shortest depth they are found at
+        {
+            team_id: {ancestor_team_id: depth, ancestor_team_id: depth, ...},
+            team_id: {}
+        }
 
-    team_id: id of the team we want to get the direct and indirect parents of
+    team_ids: ids of the teams we want to get the direct and indirect parents of
     team_team_parents: mapping of team id to ids of its parents, this is not modified by this method
-    seen: mutable set that will be added to by each call so that we can not recurse infinitely
+    known_ancestors: mapping of team id to its ancestors and depths, for teams whose parents do not need to be walked
+    A team in a loop of the graph will be found as its own ancestor.
     """
-    parent_team_ids = set()
-    if seen is None:
-        seen = set()
-    for parent_id in team_team_parents.get(team_id, []):
-        if parent_id in seen:
-            # will be combined in a lower level of the call stack
-            # this condition prevents infinite recursion in the event of loops in the graph
-            continue
-        parent_team_ids.add(parent_id)
-        seen.add(parent_id)
-        parent_team_ids.update(all_team_parents(parent_id, team_team_parents, seen=seen))
-    return parent_team_ids
+    known_ancestors = known_ancestors or {}
+    team_ancestors = {}
+    for team_id in team_ids:
+        ancestors = {}
+        to_check = [team_id]
+        depth = 0
+        while to_check:
+            depth += 1
+            next_check = []
+            for child_id in to_check:
+                for parent_id in team_team_parents.get(child_id, []):
+                    if parent_id in known_ancestors:
+                        # parents of this team are already known, so this does not need to be walked further
+                        for ancestor_id, ancestor_depth in [(parent_id, 0)] + list(known_ancestors[parent_id].items()):
+                            if ancestor_id not in ancestors or ancestors[ancestor_id] > depth + ancestor_depth:
+                                ancestors[ancestor_id] = depth + ancestor_depth
+                    elif parent_id not in ancestors:
+                        # teams found first are at the shortest depth, this also prevents infinite loops
+                        ancestors[parent_id] = depth
+                        next_check.append(parent_id)
+            to_check = next_check
+        team_ancestors[team_id] = ancestors
+    return team_ancestors
+
 
+def get_team_ancestors(team_ids: Iterable[int]) -> dict[int, dict[int, int]]:
+    "Returns saved ancestors of the given teams in the same format as compute_team_ancestors"
+    team_ancestors = {team_id: {} for team_id in team_ids}
+    for team_id, ancestor_id, depth in TeamAncestor.objects.filter(team_id__in=team_ancestors.keys()).values_list('team_id', 'ancestor_id', 'depth'):
+        team_ancestors[team_id][ancestor_id] = depth
+    return team_ancestors
 
-def get_org_team_mapping() -> dict[int, list[int]]:
+
+def get_org_team_mapping(team_ids: Optional[Iterable[int]] = None) -> dict[int, list[int]]:
     """
     Returns the teams in all organization as a dictionary.
         {
             organization_id: [team_id, team_id, ...],
             organization_id: [team_id, ...]
         }
+    team_ids: if given, only these teams are included in the mapping
     """
     org_team_mapping = defaultdict(list)
     team_fields = ['id']
     team_parent_fd = permission_registry.get_parent_fd_name(permission_registry.team_model)
     if team_parent_fd:
         team_fields.append(f'{team_parent_fd}_id')
-        for team in permission_registry.team_model.objects.only(*team_fields):
+        team_qs = permission_registry.team_model.objects.only(*team_fields)
+        if team_ids is not None:
+            team_qs = team_qs.filter(pk__in=team_ids)
+        for team in team_qs:
             team_parent_id = getattr(team, f'{team_parent_fd}_id')
             org_team_mapping[team_parent_id].append(team.id)
     return org_team_mapping
 
 
-def get_direct_team_member_roles(org_team_mapping: dict) -> dict[int, list[int]]:
+def team_role_filter(org_team_mapping: dict, team_ids: Iterable[int]) -> Q:
+    """
+    Returns a filter for ObjectRole that limits to roles which target the given teams,
+    either directly or by targeting the organization the team is in.
+    org_team_mapping: output of get_org_team_mapping, needs to cover the given teams
+    """
+    role_filter = Q(content_type_id=permission_registry.team_ct_id, object_id__in=[str(team_id) for team_id in team_ids])
+    org_ids = [str(org_id) for org_id in org_team_mapping.keys() if org_id is not None]
+    if org_ids:
+        role_filter |= Q(content_type_id=permission_registry.org_ct_id, object_id__in=org_ids)
+    return role_filter
+
+
+def get_direct_team_member_roles(org_team_mapping: dict, role_filter: Optional[Q] = None) -> dict[int, list[int]]:
     """
     If an organization-level role lists "member_team" permission, that confers
     several team's permissions to users who holds an org role of that type.
@@ -78,9 +124,13 @@ def get_direct_team_member_roles(org_team_mapping: dict) -> dict[int, list[int]]
             team_id: [role_id, role_id, ...],
             team_id: [role_id, ...]
         }
+    role_filter: optional filter from team_role_filter, to only consider roles for some teams
     """
     direct_member_roles = defaultdict(list)
-    for object_role in ObjectRole.objects.filter(role_definition__permissions__codename=permission_registry.team_permission).iterator():
+    role_qs = ObjectRole.objects.filter(role_definition__permissions__codename=permission_registry.team_permission)
+    if role_filter is not None:
+        role_qs = role_qs.filter(role_filter)
+    for object_role in role_qs.iterator():
         if object_role.content_type_id == permission_registry.team_ct_id:
             direct_member_roles[int(object_role.object_id)].append(object_role.id)
         elif object_role.content_type_id == permission_registry.org_ct_id:
@@ -94,7 +144,7 @@ def get_direct_team_member_roles(org_team_mapping: dict) -> dict[int, list[int]]
     return direct_member_roles
 
 
-def get_parent_teams_of_teams(org_team_mapping: dict) -> dict[int, list[int]]:
+def get_parent_teams_of_teams(org_team_mapping: dict, role_filter: Optional[Q] = None) -> dict[int, list[int]]:
     """
     Returns a dictionary showing the teams-of-teams relationships in the system
     this happens when a member_team role confers membership to another team.
@@ -106,9 +156,10 @@ def get_parent_teams_of_teams(org_team_mapping: dict) -> dict[int, list[int]]:
     optimizations are different.
     """
     team_team_parents = defaultdict(list)
-    for object_role in ObjectRole.objects.filter(
-        role_definition__permissions__codename=permission_registry.team_permission, teams__isnull=False
-    ).prefetch_related('teams'):
+    role_qs = ObjectRole.objects.filter(role_definition__permissions__codename=permission_registry.team_permission, teams__isnull=False)
+    if role_filter is not None:
+        role_qs = role_qs.filter(role_filter)
+    for object_role in role_qs.distinct().prefetch_related('teams'):
         for actor_team in object_role.teams.all():
             if object_role.content_type_id == permission_registry.team_ct_id:
                 team_team_parents[int(object_role.object_id)].append(actor_team.id)
@@ -121,11 +172,168 @@ def get_parent_teams_of_teams(org_team_mapping: dict) -> dict[int, list[int]]:
     return team_team_parents
 
 
-def compute_team_member_roles():
+def get_team_ids_for_object_roles(object_roles: Iterable[ObjectRole]) -> set[int]:
+    """
+    Returns the ids of teams that the given object roles could give membership to.
+    For team roles, this is the team itself, for organization roles this is all teams in the organization.
+    This does not check whether the role definition lists the member_team permission.
+    """
+    team_ids = set()
+    org_ids = set()
+    for object_role in object_roles:
+        if object_role.content_type_id == permission_registry.team_ct_id:
+            team_ids.add(int(object_role.object_id))
+        elif permission_registry.get_parent_fd_name(permission_registry.team_model) and object_role.content_type_id == permission_registry.org_ct_id:
+            org_ids.add(int(object_role.object_id))
+    if org_ids:
+        team_parent_fd = permission_registry.get_parent_fd_name(permission_registry.team_model)
+        team_ids.update(permission_registry.team_model.objects.filter(**{f'{team_parent_fd}_id__in': org_ids}).values_list('id', flat=True))
+    return team_ids
+
+
+def get_descendent_team_ids(team_ids: Iterable[int]) -> set[int]:
+    """
+    Returns the given teams, and all teams that those teams are members of, and so on.
+    Changes to the membership of a team will affect the membership of all of these teams.
+    Teams that do not exist are excluded from the result.
+    """
+    # only keep teams that exist, this also sanitizes stale data given from deletion signals
+    existing_team_ids = set(permission_registry.team_model.objects.filter(pk__in=team_ids).values_list('id', flat=True))
+    if not existing_team_ids:
+        return set()
+    # A team with any of these as an ancestor gets members from it
+    # before a change, these are all teams that may be affected, and a change can only remove teams from this
+    return existing_team_ids | set(TeamAncestor.objects.filter(ancestor_id__in=existing_team_ids).values_list('team_id', flat=True))
+
+
+def save_team_member_roles(all_member_roles: dict[int, set[int]], team_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Writes the ObjectRole.provides_teams relationship from all_member_roles
+    only adding and removing the entries that have changed.
+    team_ids: if given, only the member roles of these teams are updated
+    """
+    through_model = ObjectRole.provides_teams.through
+    role_fd = ObjectRole.provides_teams.field.m2m_field_name()
+    team_fd = ObjectRole.provides_teams.field.m2m_reverse_field_name()
+
+    existing_qs = through_model.objects.all()
+    if team_ids is not None:
+        team_ids = set(team_ids)
+        existing_qs = existing_qs.filter(**{f'{team_fd}_id__in': team_ids})
+    else:
+        team_ids = set(permission_registry.team_model.objects.values_list('id', flat=True))
+
+    existing = {}
+    for entry_id, role_id, team_id in existing_qs.values_list('id', f'{role_fd}_id', f'{team_fd}_id'):
+        existing[(role_id, team_id)] = entry_id
+
+    expected = set()
+    for team_id in team_ids:
+        for role_id in all_member_roles.get(team_id, []):
+            expected.add((role_id, team_id))
+
+    to_remove = [existing[key] for key in set(existing.keys()) - expected]
+    to_add = [through_model(**{f'{role_fd}_id': role_id, f'{team_fd}_id': team_id}) for role_id, team_id in expected - set(existing.keys())]
+    if to_remove:
+        logger.debug(f'Removing {len(to_remove)} team membership roles')
+        through_model.objects.filter(id__in=to_remove).delete()
+    if to_add:
+        logger.debug(f'Adding {len(to_add)} team membership roles')
+        through_model.objects.bulk_create(to_add, ignore_conflicts=True)
+    if to_remove or to_add:
+        # users may have gained or lost global roles of teams
+        invalidate_global_permissions()
+
+
+def save_team_ancestors(team_ancestors: dict[int, dict[int, int]], team_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Writes the TeamAncestor table from team_ancestors, the output of compute_team_ancestors
+    only adding and removing the entries that have changed.
+    team_ids: if given, only the ancestors of these teams are updated
+    """
+    existing_qs = TeamAncestor.objects.all()
+    if team_ids is not None:
+        team_ids = set(team_ids)
+        existing_qs = existing_qs.filter(team_id__in=team_ids)
+    else:
+        team_ids = set(permission_registry.team_model.objects.values_list('id', flat=True))
+
+    existing = {}
+    for entry_id, team_id, ancestor_id, depth in existing_qs.values_list('id', 'team_id', 'ancestor_id', 'depth'):
+        existing[(team_id, ancestor_id, depth)] = entry_id
+
+    expected = set()
+    for team_id in team_ids:
+        for ancestor_id, depth in team_ancestors.get(team_id, {}).items():
+            expected.add((team_id, ancestor_id, depth))
+
+    to_remove = [existing[key] for key in set(existing.keys()) - expected]
+    to_add = [TeamAncestor(team_id=team_id, ancestor_id=ancestor_id, depth=depth) for team_id, ancestor_id, depth in expected - set(existing.keys())]
+    if to_remove:
+        logger.debug(f'Removing {len(to_remove)} team ancestor entries')
+        TeamAncestor.objects.filter(id__in=to_remove).delete()
+    if to_add:
+        logger.debug(f'Adding {len(to_add)} team ancestor entries')
+        TeamAncestor.objects.bulk_create(to_add)
+
+
+def compute_team_member_roles(team_ids: Optional[Iterable[int]] = None, object_roles: Optional[Iterable[ObjectRole]] = None) -> Optional[set[int]]:
     """
     Fills in the ObjectRole.provides_teams relationship for all teams.
     This relationship is a list of teams that the role grants membership for
-    This method is always ran globally.
+
+    If team_ids or object_roles are given, this will run in a scoped mode,
+    team_ids: teams whose membership may have changed
+    object_roles: roles that changed, and may give membership to some teams
+    Only the teams that are given or affected by the object roles,
+    and the teams those teams are members of, will be updated.
+    In scoped mode, this returns the ids of the teams that were updated.
+    """
+    clear_permission_cache()
+    if team_ids is None and object_roles is None:
+        return compute_all_team_member_roles()
+
+    changed_team_ids = set(team_ids or [])
+    if object_roles:
+        changed_team_ids.update(get_team_ids_for_object_roles(object_roles))
+    if not changed_team_ids:
+        return set()
+
+    # Changing the membership of a team changes membership for every team it is a member of
+    affected_team_ids = get_descendent_team_ids(changed_team_ids)
+    if not affected_team_ids:
+        return set()
+
+    # Parents of affected teams may have changed, so their ancestors are re-computed
+    # other teams are unaffected, so the saved ancestors of those teams are still correct
+    org_team_mapping = get_org_team_mapping(team_ids=affected_team_ids)
+    team_team_parents = get_parent_teams_of_teams(org_team_mapping, role_filter=team_role_filter(org_team_mapping, affected_team_ids))
+    unaffected_parent_ids = set(parent_id for parent_ids in team_team_parents.values() for parent_id in parent_ids) - affected_team_ids
+    team_ancestors = compute_team_ancestors(affected_team_ids, team_team_parents, known_ancestors=get_team_ancestors(unaffected_parent_ids))
+
+    # Any team in the ancestors contributes member roles to the affected teams
+    member_team_ids = set(affected_team_ids)
+    for ancestors in team_ancestors.values():
+        member_team_ids.update(ancestors.keys())
+    member_org_team_mapping = get_org_team_mapping(team_ids=member_team_ids)
+    direct_member_roles = get_direct_team_member_roles(member_org_team_mapping, role_filter=team_role_filter(member_org_team_mapping, member_team_ids))
+
+    all_member_roles = {}
+    for team_id in affected_team_ids:
+        all_member_roles[team_id] = set(direct_member_roles.get(team_id, []))
+        for parent_team_id in team_ancestors[team_id]:
+            all_member_roles[team_id].update(set(direct_member_roles.get(parent_team_id, [])))
+
+    save_team_ancestors(team_ancestors, team_ids=affected_team_ids)
+    save_team_member_roles(all_member_roles, team_ids=affected_team_ids)
+    return affected_team_ids
+
+
+def compute_all_team_member_roles():
+    """
+    Fills in the ObjectRole.provides_teams relationship for all teams.
+    This is the global version of compute_team_member_roles, which is used for
+    things like post_migrate, and serves as the reference for the scoped version.
     """
     # Manually prefetch the team to org memberships
     org_team_mapping = get_org_team_mapping()
@@ -135,6 +343,7 @@ def compute_team_member_roles():
 
     # Build a team-to-team child-to-parents mapping for teams that have permission to other teams
     team_team_parents = get_parent_teams_of_teams(org_team_mapping)
+    team_ancestors = compute_team_ancestors(team_team_parents.keys(), team_team_parents)
 
     # Now we need to crawl the team-team graph to get the full list of roles that grants access to each team
     # for each parent team that grants membership to a team, we need to add the roles that grant
@@ -142,38 +351,114 @@ def compute_team_member_roles():
     all_member_roles = {}
     for team_id, member_roles in direct_member_roles.items():
         all_member_roles[team_id] = set(member_roles)  # will also avoid mutating original data structure later
-        for parent_team_id in all_team_parents(team_id, team_team_parents):
+        for parent_team_id in team_ancestors.get(team_id, {}):
             all_member_roles[team_id].update(set(direct_member_roles.get(parent_team_id, [])))
 
     # Great! we should be done building all_member_roles which tells what roles gives team membership for all teams
     # now at this point we save that data
-    for team in permission_registry.team_model.objects.prefetch_related('member_roles'):
-        # NOTE: the .set method will not use the prefetched data, thus the messy implementation here
-        existing_ids = set(r.id for r in team.member_roles.all())
-        expected_ids = set(all_member_roles.get(team.id, []))
-        to_add = expected_ids - existing_ids
-        to_remove = existing_ids - expected_ids
-        if to_add:
-            team.member_roles.add(*to_add)
-        if to_remove:
-            team.member_roles.remove(*to_remove)
+    save_team_ancestors(team_ancestors)
+    save_team_member_roles(all_member_roles)
 
 
-def compute_object_role_permissions(object_roles=None, types_prefetch=None):
+def compute_object_role_permissions(object_roles=None, types_prefetch=None, chunk_size=None):
     """
     Assumes the ObjectRole.provides_teams relationship is correct.
     Makes the RoleEvaluation table correct for all specified object_roles
+    If object_roles is None, all object roles are processed in chunks of chunk_size
     """
+    clear_permission_cache()
+    if settings.ANSIBLE_BASE_EVALUATION_ENGINE == 'sql':
+        return compute_object_role_permissions_sql(object_roles=object_roles, types_prefetch=types_prefetch)
+
+    if types_prefetch is None:
+        types_prefetch = TypesPrefetch.from_snapshot(RoleDefinition)
+    if object_roles is None:
+        return compute_all_object_role_permissions(types_prefetch=types_prefetch, chunk_size=chunk_size)
+
+    to_delete, to_add = get_needed_cache_updates(object_roles, types_prefetch=types_prefetch)
+
+    if to_add:
+        logger.info(f'Adding {len(to_add)} object-permission records')
+    if to_delete:
+        logger.info(f'Deleting {len(to_delete)} object-permission records')
+    save_cache_updates(to_delete, to_add)
+
+
+def compute_all_object_role_permissions(types_prefetch=None, chunk_size=None, object_role_qs=None) -> tuple[int, int, int]:
+    """
+    Makes the RoleEvaluation table correct for all object roles, in chunks of chunk_size object roles.
+    Changes are saved after each chunk, so memory use does not grow with the number of object roles.
+    object_role_qs can limit this to a subset of object roles.
+    Returns a tuple of the number of (object roles processed, evaluations added, evaluations deleted)
+    """
+    if types_prefetch is None:
+        types_prefetch = TypesPrefetch.from_snapshot(RoleDefinition)
+    if chunk_size is None:
+        chunk_size = settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+    if object_role_qs is None:
+        object_role_qs = ObjectRole.objects.all()
+
+    start = time.monotonic()
+    processed = added = deleted = 0
+    last_id = 0
+    while True:
+        object_roles = list(object_role_qs.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not object_roles:
+            break
+        last_id = object_roles[-1].id
+
+        to_delete, to_add = get_needed_cache_updates(object_roles, types_prefetch=types_prefetch)
+        save_cache_updates(to_delete, to_add, batch_size=chunk_size)
+
+        processed += len(object_roles)
+        added += len(to_add)
+        deleted += len(to_delete)
+        logger.info(
+            f'Processed {processed} object roles, added {added} and deleted {deleted} object-permission records in {time.monotonic() - start:.2f} seconds'
+        )
+
+    return (processed, added, deleted)
+
+
+def prefetch_child_ids(object_roles: Iterable[ObjectRole], types_prefetch: TypesPrefetch) -> None:
+    """
+    Groups the object roles by the child models their permissions apply to,
+    and fetches the child objects of all those roles with one query per child model.
+    Results are saved in types_prefetch for use by ObjectRole.expected_direct_permissions
+    """
+    parent_ids = defaultdict(set)
+    for object_role in object_roles:
+        object_id = None
+        for _, _, child_model, filter_path in object_role.child_permission_paths(types_prefetch):
+            if object_id is None:
+                role_model = types_prefetch.get_content_type(object_role.content_type_id).model_class()
+                object_id = role_model._meta.pk.to_python(object_role.object_id)
+            parent_ids[(child_model, filter_path)].add(object_id)
+    for (child_model, filter_path), object_ids in parent_ids.items():
+        types_prefetch.prefetch_child_ids(child_model, filter_path, object_ids)
+
+
+def get_needed_cache_updates(object_roles, types_prefetch=None) -> tuple[set[tuple], list]:
+    "Combines the ObjectRole.needed_cache_updates results for all the object roles"
     to_delete = set()
     to_add = []
 
     if types_prefetch is None:
-        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
-    if object_roles is None:
-        object_roles = ObjectRole.objects.iterator()
+        types_prefetch = TypesPrefetch.from_snapshot(RoleDefinition)
+    # Load existing evaluations and team roles of all the object roles in a constant number of queries
+    # these are new instances so that the prefetched data is not left on objects from the caller
+    object_roles = list(
+        ObjectRole.objects.filter(id__in=[object_role.id for object_role in object_roles])
+        .select_related('content_type')
+        .prefetch_related('permission_partials', 'permission_partials_uuid', 'provides_teams__has_roles')
+    )
+    team_roles = {team_role.id: team_role for object_role in object_roles for team in object_role.provides_teams.all() for team_role in team.has_roles.all()}
+    prefetch_child_ids(object_roles + list(team_roles.values()), types_prefetch)
 
+    # Roles held by teams are commonly needed by many of the object roles
+    direct_cache = {}
     for object_role in object_roles:
-        role_to_delete, role_to_add = object_role.needed_cache_updates(types_prefetch=types_prefetch)
+        role_to_delete, role_to_add = object_role.needed_cache_updates(types_prefetch=types_prefetch, direct_cache=direct_cache)
 
         if role_to_delete:
             logger.debug(f'Removing {len(role_to_delete)} object-permissions from {object_role}')
@@ -183,8 +468,13 @@ def compute_object_role_permissions(object_roles=None, types_prefetch=None):
             logger.debug(f'Adding {len(role_to_add)} object-permissions to {object_role}')
             to_add.extend(role_to_add)
 
+    types_prefetch.clear_child_ids()
+    return (to_delete, to_add)
+
+
+def save_cache_updates(to_delete, to_add, batch_size=None) -> None:
+    "Writes the output of get_needed_cache_updates to the evaluation tables, batch_size limits the size of queries"
     if to_add:
-        logger.info(f'Adding {len(to_add)} object-permission records')
         to_add_int = []
         to_add_uuid = []
         for evaluation in to_add:
@@ -195,12 +485,11 @@ def compute_object_role_permissions(object_roles=None, types_prefetch=None):
             else:
                 raise RuntimeError(f'Could not find a place in cache for {evaluation}')
         if to_add_int:
-            RoleEvaluation.objects.bulk_create(to_add_int, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS)
+            RoleEvaluation.objects.bulk_create(to_add_int, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS, batch_size=batch_size)
         if to_add_uuid:
-            RoleEvaluationUUID.objects.bulk_create(to_add_uuid, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS)
+            RoleEvaluationUUID.objects.bulk_create(to_add_uuid, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS, batch_size=batch_size)
 
     if to_delete:
-        logger.info(f'Deleting {len(to_delete)} object-permission records')
         to_delete_int = []
         to_delete_uuid = []
         for evaluation_id, evaluation_type in to_delete:
@@ -210,7 +499,9 @@ def compute_object_role_permissions(object_roles=None, types_prefetch=None):
                 to_delete_uuid.append(evaluation_id)
             else:
                 raise RuntimeError(f'Unexpected type to delete {evaluation_id}-{evaluation_type}')
-        if to_delete_int:
-            RoleEvaluation.objects.filter(id__in=to_delete_int).delete()
-        if to_delete_uuid:
-            RoleEvaluationUUID.objects.filter(id__in=to_delete_uuid).delete()
+        for eval_cls, id_list in ((RoleEvaluation, to_delete_int), (RoleEvaluationUUID, to_delete_uuid)):
+            if not id_list:
+                continue
+            step = batch_size or len(id_list)
+            for i in range(0, len(id_list), step):
+                eval_cls.objects.filter(id__in=id_list[i : i + step]).delete()
@@ -1,14 +1,20 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from typing import Optional
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.db.models.functions import Cast
+from django.db.models import Case, Exists, OuterRef, TextField, Value, When
+from django.db.models.functions import Cast, Concat
 from django.db.models.query import QuerySet
 from rest_framework.serializers import ValidationError
 
+from ansible_base.lib.utils.models import is_add_perm
 from ansible_base.rbac import permission_registry
 from ansible_base.rbac.models import DABPermission, RoleDefinition, get_evaluation_model
-from ansible_base.rbac.validators import validate_codename_for_model
+from ansible_base.rbac.role_id_cache import actor_roles, get_local_global_permissions_generation, get_user_global_permissions
+from ansible_base.rbac.validators import codenames_for_cls, validate_codename_for_model
 
 """
 RoleEvaluation or RoleEvaluationUUID models are the authority for permission evaluations,
@@ -23,6 +29,81 @@ models in an app using these RBAC internals.
 """
 
 
+class PermissionCache(threading.local):
+    """
+    Thread-local memo of permission evaluations, only used inside of a permission_cache block,
+    which is normally the duration of a request, see RBACPermissionCacheMiddleware.
+    This is cleared whenever the RBAC cached data is recomputed.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.clear()
+
+    def __bool__(self):
+        return bool(self.depth > 0)
+
+    def clear(self):
+        self.obj_perms = {}
+        self.singleton_perms = {}
+        self.querysets = {}
+
+
+permission_cache_state = PermissionCache()
+
+
+@contextmanager
+def permission_cache():
+    """
+    Memoize results of has_obj_perm, super permission checks, and access_ids_qs querysets
+    until the end of the block.
+
+    with permission_cache():
+        user.has_obj_perm(inventory, 'change')
+        user.has_obj_perm(inventory, 'change')  # no query
+
+    Nested blocks are combined with the outermost block.
+    """
+    permission_cache_state.depth += 1
+    try:
+        yield
+    finally:
+        permission_cache_state.depth -= 1
+        if permission_cache_state.depth == 0:
+            permission_cache_state.clear()
+
+
+def clear_permission_cache() -> None:
+    "Call this when evaluations may have changed, so memoized answers are not used again"
+    permission_cache_state.clear()
+
+
+def actor_cache_key(actor) -> tuple:
+    return (actor._meta.label_lower, actor.pk)
+
+
+def get_singleton_permissions(actor) -> set[str]:
+    if not permission_cache_state:
+        return actor.singleton_permissions()
+    key = actor_cache_key(actor)
+    if key not in permission_cache_state.singleton_perms:
+        permission_cache_state.singleton_perms[key] = actor.singleton_permissions()
+    return permission_cache_state.singleton_perms[key]
+
+
+def cached_queryset(key: tuple, get_queryset) -> QuerySet:
+    """
+    Inside of a permission_cache block, the same queryset object is returned for the same key.
+    Querysets keep their results, so evaluating it again, or calling .exists(), does not make another query.
+    This is only used for querysets of ids, because model objects could change during the block.
+    """
+    if not permission_cache_state:
+        return get_queryset()
+    if key not in permission_cache_state.querysets:
+        permission_cache_state.querysets[key] = get_queryset()
+    return permission_cache_state.querysets[key]
+
+
 def has_super_permission(user, full_codename=None) -> bool:
     "Analog to has_obj_perm but only evaluates to True if user has this permission system-wide"
     if isinstance(user, AnonymousUser):
@@ -41,24 +122,26 @@ def has_super_permission(user, full_codename=None) -> bool:
         raise RuntimeError(f'Evaluation methods are for users or teams, got {user._meta.model_name}: {user}')
 
     if full_codename:
-        if full_codename in user.singleton_permissions():
+        if full_codename in get_singleton_permissions(user):
             return True  # User has system role for this action
     return False
 
 
+def compute_global_permissions(user) -> set[str]:
+    # values_list will make the return type set[str]
+    permission_qs = DABPermission.objects.values_list('codename', flat=True)
+    return RoleDefinition.user_global_permissions(user, permission_qs=permission_qs)
+
+
 def bound_singleton_permissions(self):
     "Method attached to User model as singleton_permissions"
-    if not hasattr(self, '_singleton_permissions') or bound_singleton_permissions._team_clear_signal:
-        # values_list will make the return type set[str]
-        permission_qs = DABPermission.objects.values_list('codename', flat=True)
-        self._singleton_permissions = RoleDefinition.user_global_permissions(self, permission_qs=permission_qs)
-        bound_singleton_permissions._team_clear_signal = False
+    generation = get_local_global_permissions_generation()
+    if not hasattr(self, '_singleton_permissions') or self._singleton_permissions_generation != generation:
+        self._singleton_permissions = get_user_global_permissions(self, compute_global_permissions)
+        self._singleton_permissions_generation = generation
     return self._singleton_permissions
 
 
-bound_singleton_permissions._team_clear_signal = False
-
-
 class BaseEvaluationDescriptor:
     """
     Descriptors have to be used to attach what are effectively a @classmethod
@@ -71,7 +154,7 @@ class BaseEvaluationDescriptor:
 
 
 class AccessibleObjectsDescriptor(BaseEvaluationDescriptor):
-    def __call__(self, actor, codename: str = 'view', queryset: Optional[QuerySet] = None) -> QuerySet:
+    def __call__(self, actor, codename: str = 'view', queryset: Optional[QuerySet] = None, strategy: Optional[str] = None) -> QuerySet:
         if queryset is None:
             queryset = self.cls.objects.all()
         if isinstance(actor, AnonymousUser):
@@ -82,7 +165,7 @@ class AccessibleObjectsDescriptor(BaseEvaluationDescriptor):
         full_codename = validate_codename_for_model(codename, self.cls)
         if actor._meta.model_name == 'user' and has_super_permission(actor, full_codename):
             return queryset
-        return get_evaluation_model(self.cls).accessible_objects(self.cls, actor, full_codename, queryset=queryset)
+        return get_evaluation_model(self.cls).accessible_objects(self.cls, actor, full_codename, queryset=queryset, strategy=strategy)
 
 
 class AccessibleIdsDescriptor(BaseEvaluationDescriptor):
@@ -95,7 +178,67 @@ class AccessibleIdsDescriptor(BaseEvaluationDescriptor):
                 return self.cls.objects.values_list('id', flat=True)
             else:
                 return self.cls.objects.values_list(Cast('id', output_field=cast_field), flat=True)
-        return get_evaluation_model(self.cls).accessible_ids(self.cls, actor, full_codename, content_types=content_types, cast_field=cast_field)
+        if content_types is not None or cast_field is not None:
+            return get_evaluation_model(self.cls).accessible_ids(self.cls, actor, full_codename, content_types=content_types, cast_field=cast_field)
+        return cached_queryset(
+            ('access_ids_qs', actor_cache_key(actor), self.cls._meta.label_lower, full_codename),
+            lambda: get_evaluation_model(self.cls).accessible_ids(self.cls, actor, full_codename),
+        )
+
+
+# Ends each codename in the with_user_permissions annotation, codenames may contain spaces but not control characters
+CODENAME_SEPARATOR = '\x1f'
+
+
+class CodenameListField(TextField):
+    "Output field of the with_user_permissions annotation, which is a CODENAME_SEPARATOR-terminated string in the database"
+
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return []
+        return value.split(CODENAME_SEPARATOR)[:-1]
+
+
+class UserPermissionsDescriptor(BaseEvaluationDescriptor):
+    """
+    Annotates every row with the list of permission codenames the actor has to that object, in the same query
+        MyModel.with_user_permissions(user, queryset=MyModel.access_qs(user))[0].user_permissions
+        ['change_mymodel', 'view_mymodel']
+    """
+
+    def __call__(self, actor, queryset: Optional[QuerySet] = None, codenames: Optional[list[str]] = None, annotation: str = 'user_permissions') -> QuerySet:
+        if queryset is None:
+            queryset = self.cls.objects.all()
+        if codenames is None:
+            codenames = [codename for codename in codenames_for_cls(self.cls) if not is_add_perm(codename)]
+        full_codenames = []
+        for codename in codenames:
+            full_codename = validate_codename_for_model(codename, self.cls)
+            if full_codename not in full_codenames:
+                full_codenames.append(full_codename)
+
+        parts = []
+        if not isinstance(actor, AnonymousUser):
+            evaluation_qs = get_evaluation_model(self.cls).objects.filter(
+                role__in=actor_roles(actor),
+                content_type_id=permission_registry.content_type_model.objects.get_for_model(self.cls).id,
+                object_id=OuterRef('pk'),
+            )
+            for full_codename in full_codenames:
+                if actor._meta.model_name == 'user' and has_super_permission(actor, full_codename):
+                    parts.append(Value(f'{full_codename}{CODENAME_SEPARATOR}'))
+                else:
+                    parts.append(
+                        Case(When(Exists(evaluation_qs.filter(codename=full_codename)), then=Value(f'{full_codename}{CODENAME_SEPARATOR}')), default=Value(''))
+                    )
+
+        if not parts:
+            expr = Value('', output_field=CodenameListField())
+        elif len(parts) == 1:
+            expr = Concat(parts[0], Value(''), output_field=CodenameListField())
+        else:
+            expr = Concat(*parts, output_field=CodenameListField())
+        return queryset.annotate(**{annotation: expr})
 
 
 def bound_has_obj_perm(self, obj, codename) -> bool:
@@ -104,9 +247,63 @@ def bound_has_obj_perm(self, obj, codename) -> bool:
     full_codename = validate_codename_for_model(codename, obj)
     if has_super_permission(self, full_codename):
         return True
-    return get_evaluation_model(obj).has_obj_perm(self, obj, full_codename)
+    if not permission_cache_state:
+        return get_evaluation_model(obj).has_obj_perm(self, obj, full_codename)
+    key = (actor_cache_key(self), obj._meta.label_lower, obj._meta.pk.to_python(obj.pk), full_codename)
+    if key not in permission_cache_state.obj_perms:
+        permission_cache_state.obj_perms[key] = get_evaluation_model(obj).has_obj_perm(self, obj, full_codename)
+    return permission_cache_state.obj_perms[key]
+
+
+def bound_get_obj_perms(self, objs, codenames: list[str]) -> dict:
+    """
+    Method attached to User model as get_obj_perms
+    Evaluates many permissions to many objects of the same model in one query
+    returns {obj.pk: set of codenames, as given, that user has to that object}
+    keys are converted to the python type of the primary key field, so a UUID given as a string is a UUID key
+    """
+    objs = list(objs)
+    if not objs:
+        return {}
+    model_cls = type(objs[0])
+    if not permission_registry.is_registered(model_cls):
+        raise ValidationError(f'Object of {model_cls._meta.model_name} type is not registered with DAB RBAC')
+    if any(type(obj) is not model_cls for obj in objs):
+        raise ValidationError('All objects for evaluation must be of the same type')
+
+    given_codenames = defaultdict(list)  # full codename to codenames as given, like change and change_inventory
+    for codename in codenames:
+        given_codenames[validate_codename_for_model(codename, model_cls)].append(codename)
+
+    ret = {model_cls._meta.pk.to_python(obj.pk): set() for obj in objs}
+    to_query = []
+    for full_codename, codename_list in given_codenames.items():
+        if has_super_permission(self, full_codename):
+            for obj_perms in ret.values():
+                obj_perms.update(codename_list)
+        else:
+            to_query.append(full_codename)
+
+    if to_query:
+        for object_id, full_codename in get_evaluation_model(model_cls).get_permissions_for_objects(self, model_cls, list(ret.keys()), to_query):
+            ret[model_cls._meta.pk.to_python(object_id)].update(given_codenames[full_codename])
+        if permission_cache_state:
+            for pk, obj_perms in ret.items():
+                for full_codename in to_query:
+                    key = (actor_cache_key(self), model_cls._meta.label_lower, pk, full_codename)
+                    permission_cache_state.obj_perms[key] = bool(given_codenames[full_codename][0] in obj_perms)
+    return ret
+
+
+def bound_has_obj_perms(self, objs, codename: str) -> dict:
+    """
+    Method attached to User model as has_obj_perms
+    Batch version of has_obj_perm, returns {obj.pk: bool} from one query
+    """
+    return {pk: bool(obj_perms) for pk, obj_perms in bound_get_obj_perms(self, objs, [codename]).items()}
 
 
 def connect_rbac_methods(cls):
     cls.add_to_class('access_qs', AccessibleObjectsDescriptor(cls))
     cls.add_to_class('access_ids_qs', AccessibleIdsDescriptor(cls))
+    cls.add_to_class('with_user_permissions', UserPermissionsDescriptor(cls))
@@ -0,0 +1,119 @@
+"""
+Command to check that cached RoleEvaluation entries are correct, without writing anything
+
+Usage::
+
+    django-admin rbac_check_evaluations
+    django-admin rbac_check_evaluations --repair  # recompute only the object roles that have drifted
+
+For every object role, a digest of the stored evaluations is compared to a digest
+of the evaluations that ObjectRole.expected_direct_permissions would produce.
+Only roles where the digests differ are inspected in detail.
+"""
+
+import hashlib
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ansible_base.rbac.caching import compute_object_role_permissions, prefetch_child_ids
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.prefetch import TypesPrefetch
+
+
+class EvaluationDigest:
+    "Order-independent digest of a set of (codename, content_type_id, object_id) evaluations"
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def add(self, codename: str, content_type_id: int, object_id) -> None:
+        row_hash = hashlib.blake2b(f'{codename}:{content_type_id}:{object_id}'.encode(), digest_size=8).digest()
+        self.count += 1
+        self.total = (self.total + int.from_bytes(row_hash, 'big')) % 2**64
+
+    def __eq__(self, other) -> bool:
+        return (self.count, self.total) == (other.count, other.total)
+
+
+def stored_digests(role_ids: list[int]) -> dict[int, EvaluationDigest]:
+    "Digests of evaluations saved in the database for the given roles, rows are streamed and not kept in memory"
+    digests = defaultdict(EvaluationDigest)
+    for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+        for role_id, codename, ct_id, object_id in (
+            eval_cls.objects.filter(role_id__in=role_ids).values_list('role_id', 'codename', 'content_type_id', 'object_id').iterator()
+        ):
+            digests[role_id].add(codename, ct_id, object_id)
+    return digests
+
+
+def expected_digest(object_role: ObjectRole, types_prefetch: TypesPrefetch, direct_cache: dict) -> EvaluationDigest:
+    "Digest of evaluations the role should have, following the logic of ObjectRole.needed_cache_updates"
+    expected = set()
+    for role in [object_role] + [team_role for team in object_role.provides_teams.all() for team_role in team.has_roles.all()]:
+        if role.id not in direct_cache:
+            direct_cache[role.id] = role.expected_direct_permissions(types_prefetch)
+        expected.update(direct_cache[role.id])
+    digest = EvaluationDigest()
+    for codename, ct_id, object_id in expected:
+        digest.add(codename, ct_id, object_id)
+    return digest
+
+
+class Command(BaseCommand):
+    help = "Check that cached RBAC RoleEvaluation entries are correct, and optionally repair object roles that are not"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="Recompute evaluations for object roles found to be incorrect")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of object roles checked at a time, defaults to the ANSIBLE_BASE_EVALUATION_CHUNK_SIZE setting",
+        )
+
+    def find_drifted_roles(self, chunk_size: int) -> tuple[int, list[ObjectRole]]:
+        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+        drifted = []
+        checked = 0
+        last_id = 0
+        while True:
+            object_roles = list(ObjectRole.objects.filter(id__gt=last_id).order_by('id').prefetch_related('provides_teams__has_roles')[:chunk_size])
+            if not object_roles:
+                break
+            last_id = object_roles[-1].id
+            checked += len(object_roles)
+
+            digests = stored_digests([object_role.id for object_role in object_roles])
+            prefetch_child_ids(object_roles, types_prefetch)
+            # Expected evaluations of roles held by teams are commonly needed by many roles in a chunk
+            direct_cache = {}
+            for object_role in object_roles:
+                if expected_digest(object_role, types_prefetch, direct_cache) != digests[object_role.id]:
+                    drifted.append(object_role)
+            types_prefetch.clear_child_ids()
+        return (checked, drifted)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+        start = time.monotonic()
+
+        checked, drifted = self.find_drifted_roles(chunk_size)
+        self.stdout.write(f'Checked evaluations of {checked} object roles in {time.monotonic() - start:.2f} seconds')
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All role evaluations are correct'))
+            return
+
+        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+        for object_role in drifted:
+            to_delete, to_add = object_role.needed_cache_updates(types_prefetch=types_prefetch)
+            self.stdout.write(self.style.WARNING(f'{object_role} is missing {len(to_add)} and has {len(to_delete)} unexpected evaluations'))
+
+        if options['repair']:
+            compute_object_role_permissions(object_roles=drifted)
+            self.stdout.write(self.style.SUCCESS(f'Repaired evaluations for {len(drifted)} object roles'))
+        else:
+            raise CommandError(f'Found {len(drifted)} object roles with incorrect evaluations, use --repair to fix them')
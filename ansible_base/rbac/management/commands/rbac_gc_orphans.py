@@ -0,0 +1,66 @@
+"""
+Command to delete object roles that have no users or teams assigned
+
+Usage::
+
+    django-admin rbac_gc_orphans
+    django-admin rbac_gc_orphans --chunk-size 1000 --time-limit 60
+
+Object roles are normally deleted when their last user or team is removed,
+so this only finds object roles left over by changes made without signals.
+Object roles are checked in order of id, one chunk at a time.
+When the time limit is reached, the last id checked is printed, so a later run can continue with --start-id.
+"""
+
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ansible_base.rbac.models import ObjectRole
+from ansible_base.rbac.triggers import delete_orphaned_object_roles
+
+
+def delete_orphans_in_chunk(after_id: int, chunk_size: int) -> tuple[Optional[int], int]:
+    "Delete orphaned object roles among the next chunk_size roles after after_id, returns (last id checked, number deleted)"
+    role_ids = list(ObjectRole.objects.filter(id__gt=after_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+    if not role_ids:
+        return (None, 0)
+    return (role_ids[-1], delete_orphaned_object_roles(role_ids))
+
+
+class Command(BaseCommand):
+    help = "Delete RBAC object roles that have no users or teams assigned, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of object roles checked at a time, defaults to the ANSIBLE_BASE_EVALUATION_CHUNK_SIZE setting",
+        )
+        parser.add_argument("--time-limit", type=float, default=None, help="Stop after the chunk that exceeds this number of seconds")
+        parser.add_argument("--start-id", type=int, default=0, help="Only check object roles with an id greater than this")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+        if chunk_size < 1:
+            raise CommandError('Chunk size must be at least 1')
+        time_limit = options['time_limit']
+        start = time.monotonic()
+
+        last_id = options['start_id']
+        deleted = 0
+        while True:
+            chunk_last_id, chunk_deleted = delete_orphans_in_chunk(last_id, chunk_size)
+            if chunk_last_id is None:
+                break
+            last_id = chunk_last_id
+            deleted += chunk_deleted
+            if time_limit is not None and time.monotonic() - start > time_limit:
+                self.stdout.write(f'Deleted {deleted} orphaned object roles in {time.monotonic() - start:.2f} seconds')
+                self.stdout.write(self.style.WARNING(f'Time limit reached, continue with --start-id {last_id}'))
+                return
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} orphaned object roles in {time.monotonic() - start:.2f} seconds'))
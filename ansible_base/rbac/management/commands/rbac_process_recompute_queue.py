@@ -0,0 +1,54 @@
+"""
+Command to recompute permission evaluations of object roles in the recompute queue
+
+Usage::
+
+    django-admin rbac_process_recompute_queue
+    django-admin rbac_process_recompute_queue --chunk-size 1000 --time-limit 60
+
+Object roles are queued when a role definition used by many object roles has its permissions changed,
+see the ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD setting.
+Queued object roles are recomputed one chunk at a time, until the queue is empty or the time limit is reached.
+Several of these commands can run at once, as each chunk is locked while it is processed.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ansible_base.rbac.models import RecomputeQueueEntry
+from ansible_base.rbac.recompute_queue import process_recompute_queue
+
+
+class Command(BaseCommand):
+    help = "Recompute RBAC permission evaluations of object roles queued by role definition changes, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of queued object roles recomputed at a time, defaults to the ANSIBLE_BASE_EVALUATION_CHUNK_SIZE setting",
+        )
+        parser.add_argument("--time-limit", type=float, default=None, help="Stop after the chunk that exceeds this number of seconds")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+        if chunk_size < 1:
+            raise CommandError('Chunk size must be at least 1')
+        time_limit = options['time_limit']
+        start = time.monotonic()
+
+        processed = 0
+        while True:
+            chunk_processed = process_recompute_queue(chunk_size)
+            if not chunk_processed:
+                break
+            processed += chunk_processed
+            if time_limit is not None and time.monotonic() - start > time_limit:
+                self.stdout.write(f'Recomputed {processed} object roles in {time.monotonic() - start:.2f} seconds')
+                self.stdout.write(self.style.WARNING(f'Time limit reached, {RecomputeQueueEntry.objects.count()} queued object roles remain'))
+                return
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {processed} object roles in {time.monotonic() - start:.2f} seconds'))
@@ -0,0 +1,100 @@
+"""
+Command to rebuild all cached RBAC data, which is team membership and RoleEvaluation entries
+
+Usage::
+
+    django-admin rbac_rebuild_evaluations  # use all available cores
+    django-admin rbac_rebuild_evaluations --workers 4 --chunk-size 500
+
+Team membership is rebuilt first, by this process, because evaluations depend on it.
+Then the ObjectRole id space is split into one shard per worker, and each worker
+process rebuilds the evaluations for its shard with its own database connection.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ansible_base.rbac.caching import compute_all_object_role_permissions, compute_team_member_roles
+from ansible_base.rbac.models import ObjectRole
+from ansible_base.rbac.sql_caching import compute_object_role_permissions_sql
+
+
+def get_shard_ranges(workers: int) -> list[tuple[int, int]]:
+    "Split the ObjectRole ids into contiguous (first_id, last_id) ranges of about the same number of roles"
+    role_ct = ObjectRole.objects.count()
+    if not role_ct:
+        return []
+    workers = min(workers, role_ct)
+    id_qs = ObjectRole.objects.order_by('id').values_list('id', flat=True)
+    starts = [id_qs[i * role_ct // workers] for i in range(workers)]
+    last_id = ObjectRole.objects.order_by('-id').values_list('id', flat=True)[0]
+    return [(first_id, next_first_id - 1) for first_id, next_first_id in zip(starts[:-1], starts[1:])] + [(starts[-1], last_id)]
+
+
+def rebuild_shard(first_id: int, last_id: int, chunk_size: int) -> tuple[int, int, int]:
+    "Rebuild evaluations for object roles with ids in the given range, returns numbers of (roles processed, evaluations added, evaluations deleted)"
+    shard_qs = ObjectRole.objects.filter(id__gte=first_id, id__lte=last_id)
+    if settings.ANSIBLE_BASE_EVALUATION_ENGINE == 'sql':
+        added, deleted = compute_object_role_permissions_sql(object_roles=shard_qs)
+        return (shard_qs.count(), added, deleted)
+    return compute_all_object_role_permissions(chunk_size=chunk_size, object_role_qs=shard_qs)
+
+
+def rebuild_shard_in_worker(first_id: int, last_id: int, chunk_size: int) -> tuple[int, int, int]:
+    "Runs in a worker process, which should not leave connections open when it is done"
+    try:
+        return rebuild_shard(first_id, last_id, chunk_size)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Rebuild RBAC team membership and RoleEvaluation entries from scratch, using multiple processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes to rebuild evaluations with, a value of 1 does everything in this process",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of object roles each worker processes at a time, defaults to the ANSIBLE_BASE_EVALUATION_CHUNK_SIZE setting",
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('Number of workers must be at least 1')
+        chunk_size = options['chunk_size'] or settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+
+        start = time.monotonic()
+        self.stdout.write('Rebuilding team membership')
+        compute_team_member_roles()
+
+        shards = get_shard_ranges(workers)
+        self.stdout.write(f'Rebuilding evaluations for {len(shards)} shards of object roles with {min(workers, len(shards))} workers')
+        if workers == 1 or len(shards) <= 1:
+            results = [rebuild_shard(first_id, last_id, chunk_size) for first_id, last_id in shards]
+        else:
+            # workers must open their own database connections, so do not share the current one
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('fork')) as executor:
+                futures = [executor.submit(rebuild_shard_in_worker, first_id, last_id, chunk_size) for first_id, last_id in shards]
+                try:
+                    results = [future.result() for future in futures]
+                except Exception as exc:
+                    raise CommandError(f'Rebuilding evaluations failed in worker process: {exc}') from exc
+
+        for (first_id, last_id), (processed, added, deleted) in zip(shards, results):
+            self.stdout.write(f'  object roles {first_id}-{last_id}: processed {processed} roles, added {added} and deleted {deleted} evaluations')
+        self.stdout.write(self.style.SUCCESS(f'Finished rebuilding RBAC evaluations in {time.monotonic() - start:.2f} seconds'))
@@ -0,0 +1,18 @@
+from ansible_base.rbac.evaluations import permission_cache
+
+
+class RBACPermissionCacheMiddleware:
+    """
+    Memoize RBAC permission evaluations for the duration of a request.
+
+    Serializers and permission classes often ask the same question several times in a request,
+    with this, repeated has_obj_perm calls and super permission checks do not query the database again.
+    Memoized results are thrown out when role assignments change, and at the end of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with permission_cache():
+            return self.get_response(request)
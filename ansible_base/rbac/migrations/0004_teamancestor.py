@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-17 05:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.ANSIBLE_BASE_TEAM_MODEL),
+        ('dab_rbac', '0003_alter_dabpermission_codename_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamAncestor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(help_text='Number of team memberships from the ancestor to the team, 1 for a direct member team.')),
+                ('ancestor', models.ForeignKey(help_text='The team whose members are also members of the team.', on_delete=django.db.models.deletion.CASCADE, related_name='descendant_entries', to=settings.ANSIBLE_BASE_TEAM_MODEL)),
+                ('team', models.ForeignKey(help_text='The team that the ancestor team gives members to.', on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_entries', to=settings.ANSIBLE_BASE_TEAM_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'team_ancestors',
+                'indexes': [models.Index(fields=['ancestor', 'team'], name='dab_rbac_te_ancesto_36d194_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='teamancestor',
+            constraint=models.UniqueConstraint(fields=('team', 'ancestor'), name='one_entry_per_team_and_ancestor'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-17 07:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dab_rbac', '0004_teamancestor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecomputeQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='The date/time this entry was queued.')),
+                ('object_role', models.ForeignKey(help_text='The object role whose evaluations need to be recomputed.', on_delete=django.db.models.deletion.CASCADE, related_name='queued_recomputes', to='dab_rbac.objectrole')),
+                ('role_definition', models.ForeignKey(help_text='The role definition whose change queued this recompute, used to report progress.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queued_recomputes', to='dab_rbac.roledefinition')),
+            ],
+            options={
+                'verbose_name_plural': 'recompute_queue_entries',
+            },
+        ),
+    ]
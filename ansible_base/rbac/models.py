@@ -7,6 +7,7 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef
 from django.db.models.functions import Cast
 from django.db.models.query import QuerySet
 from django.db.utils import IntegrityError
@@ -19,9 +20,10 @@ from rest_framework.exceptions import ValidationError
 from ansible_base.lib.abstract_models.common import CommonModel, ImmutableCommonModel
 
 # ansible_base RBAC logic imports
-from ansible_base.lib.utils.models import is_add_perm
+from ansible_base.lib.utils.models import current_user_or_system_user, is_add_perm
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.prefetch import TypesPrefetch
+from ansible_base.rbac.role_id_cache import actor_roles, invalidate_user_role_ids
 from ansible_base.rbac.validators import validate_assignment, validate_permissions_for_model
 
 logger = logging.getLogger('ansible_base.rbac.models')
@@ -221,15 +223,12 @@ class RoleDefinition(CommonModel):
                 assignment.delete()
 
         # Clear any cached permissions
+        from ansible_base.rbac.evaluations import clear_permission_cache
+
+        clear_permission_cache()
         if actor._meta.model_name == 'user':
             if hasattr(actor, '_singleton_permissions'):
                 delattr(actor, '_singleton_permissions')
-        else:
-            # when team permissions change, users in memory may be affected by this
-            # but there is no way to know what users, so we use a global flag
-            from ansible_base.rbac.evaluations import bound_singleton_permissions
-
-            bound_singleton_permissions._team_clear_signal = True
 
         return assignment
 
@@ -304,6 +303,107 @@ class RoleDefinition(CommonModel):
 
         return assignment
 
+    def give_permissions_bulk(self, actors, content_objects):
+        return self.give_or_remove_permissions_bulk(actors, content_objects, giving=True)
+
+    def remove_permissions_bulk(self, actors, content_objects):
+        return self.give_or_remove_permissions_bulk(actors, content_objects, giving=False)
+
+    def give_or_remove_permissions_bulk(self, actors, content_objects, giving=True, sync_action=False):
+        """Give or remove this role for every actor (users and teams) to every object
+
+        This has the same effect as calling give_or_remove_permission for every combination,
+        but object roles and assignments are written with bulk queries,
+        and cached data is computed once for everything at the end.
+        When giving, returns a list of the assignments, which includes pre-existing ones.
+        sync_action: if True, tracked relationships are not updated, because the change came from them
+        """
+        actors = list(actors)
+        content_objects = list(content_objects)
+        if not (actors and content_objects):
+            return []
+
+        validated_types = set()
+        for actor in actors:
+            for content_object in content_objects:
+                types_key = (actor._meta.model_name, content_object._meta.model_name)
+                if types_key not in validated_types:
+                    validate_assignment(self, actor, content_object)
+                    validated_types.add(types_key)
+
+        users = [actor for actor in actors if actor._meta.model_name == 'user']
+        teams = [actor for actor in actors if isinstance(actor, permission_registry.team_model)]
+
+        obj_ct = ContentType.objects.get_for_model(content_objects[0])
+        # sanitize the object_id to its database version, and use text to match the ObjectRole.object_id field
+        object_ids = set(str(obj._meta.pk.get_db_prep_value(obj.pk, connection)) for obj in content_objects)
+        role_kwargs = dict(role_definition=self, content_type=obj_ct)
+
+        object_roles = list(ObjectRole.objects.filter(object_id__in=object_ids, **role_kwargs))
+        created_roles = []
+        if giving:
+            missing_ids = object_ids - set(object_role.object_id for object_role in object_roles)
+            if missing_ids:
+                # conflicts are from concurrent creation of the same object role, which is fine
+                ObjectRole.objects.bulk_create([ObjectRole(object_id=object_id, **role_kwargs) for object_id in missing_ids], ignore_conflicts=True)
+                created_roles = list(ObjectRole.objects.filter(object_id__in=missing_ids, **role_kwargs))
+                object_roles += created_roles
+        if not object_roles:
+            return []  # nothing to remove
+
+        from ansible_base.rbac.triggers import needed_updates_on_bulk_assignment, update_after_assignment
+
+        update_teams, to_update = needed_updates_on_bulk_assignment(self, teams, object_roles, created_roles, giving=giving)
+
+        assignments = []
+        created_by = current_user_or_system_user() if giving else None
+        for assignment_cls, actor_field, actor_list in ((RoleUserAssignment, 'user', users), (RoleTeamAssignment, 'team', teams)):
+            if not actor_list:
+                continue
+            assignment_qs = assignment_cls.objects.filter(object_role__in=object_roles, **{f'{actor_field}__in': actor_list})
+            if giving:
+                existing = set(assignment_qs.values_list('object_role_id', f'{actor_field}_id'))
+                # bulk_create skips save, so fields normally filled in by AssignmentBase.save are given here
+                new_assignments = [
+                    assignment_cls(
+                        object_role=object_role,
+                        object_id=object_role.object_id,
+                        content_type_id=object_role.content_type_id,
+                        role_definition=self,
+                        created_by=created_by,
+                        **{actor_field: actor},
+                    )
+                    for object_role in object_roles
+                    for actor in actor_list
+                    if (object_role.id, actor.pk) not in existing
+                ]
+                assignment_cls.objects.bulk_create(new_assignments, ignore_conflicts=True)
+                if actor_field == 'user':
+                    # bulk_create does not send the signals that normally do this
+                    invalidate_user_role_ids(actor.pk for actor in actor_list)
+                assignments += list(assignment_qs)
+            else:
+                assignment_qs.delete()
+
+        if not giving:
+            unused_roles = ObjectRole.objects.filter(id__in=[object_role.id for object_role in object_roles], users__isnull=True, teams__isnull=True)
+            deleted_ids = set(unused_roles.values_list('id', flat=True))
+            if deleted_ids:
+                to_update = set(object_role for object_role in to_update if object_role.id not in deleted_ids)
+                ObjectRole.objects.filter(id__in=deleted_ids).delete()
+
+        update_after_assignment(update_teams, to_update)
+
+        if not sync_action and self.name in permission_registry._trackers:
+            tracker = permission_registry._trackers[self.name]
+            with tracker.sync_active():
+                for actor in actors:
+                    for content_object in content_objects:
+                        tracker.sync_relationship(actor, content_object, giving=giving)
+
+        if giving:
+            return assignments
+
     @classmethod
     def user_global_permissions(cls, user, permission_qs=None):
         """Evaluation method only for global permissions from global roles
@@ -352,7 +452,7 @@ class ObjectRoleFields(models.Model):
     @classmethod
     def _visible_items(cls, eval_cls, user, qs=None):
         permission_qs = eval_cls.objects.filter(
-            role__in=user.has_roles.all(),
+            role__in=actor_roles(user),
             content_type_id=models.OuterRef('content_type_id'),
         )
         # NOTE: type casting is necessary in postgres but not sqlite3
@@ -527,34 +627,20 @@ class ObjectRole(ObjectRoleFields):
 
     def descendent_roles(self):
         "Returns a set of roles that you implicitly have if you have this role"
-        descendents = set()
-        for target_team in self.provides_teams.all():
-            # the roles that offer these permissions could change as a result of adding teams
-            descendents.update(set(target_team.has_roles.all()))
-        return descendents
+        # the roles held by teams this gives membership to, which could change as a result of adding teams
+        return set(ObjectRole.objects.filter(teams__member_roles=self).distinct())
 
-    def expected_direct_permissions(self, types_prefetch=None):
-        expected_evaluations = set()
-        cached_id_lists = {}
-        if not types_prefetch:
-            types_prefetch = TypesPrefetch()
-        role_content_type = types_prefetch.get_content_type(self.content_type_id)
-        role_model = role_content_type.model_class()
-        # ObjectRole.object_id is stored as text, we convert it to the model pk native type
-        object_id = role_model._meta.pk.to_python(self.object_id)
+    def child_permission_paths(self, types_prefetch):
+        """
+        Yields information about how permissions of this role apply to child objects
+            (permission, content type id of evaluations, child model, filter path from child model to the object)
+        """
+        role_model = types_prefetch.get_content_type(self.content_type_id).model_class()
         for permission in types_prefetch.permissions_for_object_role(self):
-            permission_content_type = types_prefetch.get_content_type(permission.content_type_id)
-
-            # direct object permission
             if permission.content_type_id == self.content_type_id:
-                expected_evaluations.add((permission.codename, self.content_type_id, object_id))
                 continue
+            permission_content_type = types_prefetch.get_content_type(permission.content_type_id)
 
-            # add child permission on the parent object, usually only for add permission
-            if is_add_perm(permission.codename) or settings.ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS:
-                expected_evaluations.add((permission.codename, self.content_type_id, object_id))
-
-            # add child object permission on child objects
             # Only propogate add permission to children which are parents of the permission model
             filter_path = None
             child_model = None
@@ -576,21 +662,38 @@ class ObjectRole(ObjectRoleFields):
                 else:
                     logger.warning(f'{self.role_definition} listed {permission.codename} but model is not a child, ignoring')
                     continue
+            yield (permission, eval_ct, child_model, filter_path)
 
-            # fetching child objects of an organization is very performance sensitive
-            # for multiple permissions of same type, make sure to only do query once
-            id_list = []
-            if eval_ct in cached_id_lists:
-                id_list = cached_id_lists[eval_ct]
-            else:
-                id_list = child_model.objects.filter(**{filter_path: object_id}).values_list('pk', flat=True)
-                cached_id_lists[eval_ct] = list(id_list)
+    def expected_direct_permissions(self, types_prefetch=None):
+        expected_evaluations = set()
+        if not types_prefetch:
+            types_prefetch = TypesPrefetch()
+        role_content_type = types_prefetch.get_content_type(self.content_type_id)
+        # ObjectRole.object_id is stored as text, we convert it to the model pk native type
+        object_id = role_content_type.model_class()._meta.pk.to_python(self.object_id)
+        for permission in types_prefetch.permissions_for_object_role(self):
+            # direct object permission
+            if permission.content_type_id == self.content_type_id:
+                expected_evaluations.add((permission.codename, self.content_type_id, object_id))
+                continue
 
-            for id in id_list:
+            # add child permission on the parent object, usually only for add permission
+            if is_add_perm(permission.codename) or settings.ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS:
+                expected_evaluations.add((permission.codename, self.content_type_id, object_id))
+
+        # add child object permission on child objects
+        for permission, eval_ct, child_model, filter_path in self.child_permission_paths(types_prefetch):
+            # fetching child objects of an organization is very performance sensitive
+            # these are shared by types_prefetch, for multiple permissions and multiple roles
+            for id in types_prefetch.get_child_ids(child_model, filter_path, object_id):
                 expected_evaluations.add((permission.codename, eval_ct, id))
         return expected_evaluations
 
-    def needed_cache_updates(self, types_prefetch=None):
+    def needed_cache_updates(self, types_prefetch=None, direct_cache=None):
+        """
+        direct_cache: optional dictionary of role ids to expected_direct_permissions results,
+        which is filled in by this method, to share results for roles held by teams between calls
+        """
         existing_partials = dict()
         for permission_partial in self.permission_partials.all():
             existing_partials[permission_partial.obj_perm_id()] = permission_partial
@@ -601,7 +704,12 @@ class ObjectRole(ObjectRoleFields):
 
         for team in self.provides_teams.all():
             for team_role in team.has_roles.all():
-                expected_evaluations.update(team_role.expected_direct_permissions(types_prefetch))
+                if direct_cache is None:
+                    expected_evaluations.update(team_role.expected_direct_permissions(types_prefetch))
+                    continue
+                if team_role.id not in direct_cache:
+                    direct_cache[team_role.id] = team_role.expected_direct_permissions(types_prefetch)
+                expected_evaluations.update(direct_cache[team_role.id])
 
         existing_set = set(existing_partials.keys())
 
@@ -681,7 +789,7 @@ class RoleEvaluationFields(models.Model):
         """
         # We only have a content_types exception for multiple content types for polymorphic models
         # for normal models you should not need it, but AWX unified_ models need it to get by
-        filter_kwargs = dict(role__in=actor.has_roles.all(), codename=codename)
+        filter_kwargs = dict(role__in=actor_roles(actor), codename=codename)
         if content_types:
             filter_kwargs['content_type_id__in'] = content_types
         else:
@@ -693,10 +801,25 @@ class RoleEvaluationFields(models.Model):
             return qs.values_list(Cast('object_id', output_field=cast_field)).distinct()
 
     @classmethod
-    def accessible_objects(cls, model_cls, user, codename, queryset: Optional[QuerySet] = None) -> QuerySet:
+    def accessible_objects(cls, model_cls, user, codename, queryset: Optional[QuerySet] = None, strategy: Optional[str] = None) -> QuerySet:
+        """
+        Filters queryset to objects that user has the codename permission to
+        strategy is how the evaluations are used in the query, defaulting to ANSIBLE_BASE_ACCESSIBLE_OBJECTS_STRATEGY
+          "in" - pk IN (SELECT DISTINCT object_id ...), good when user has permission to few objects
+          "exists" - correlated EXISTS for each object, good when user has permission to many objects
+        """
         if queryset is None:
             queryset = model_cls.objects.all()
-        return queryset.filter(pk__in=cls.accessible_ids(model_cls, user, codename))
+        if strategy is None:
+            strategy = settings.ANSIBLE_BASE_ACCESSIBLE_OBJECTS_STRATEGY
+        if strategy == 'in':
+            return queryset.filter(pk__in=cls.accessible_ids(model_cls, user, codename))
+        elif strategy == 'exists':
+            evaluations = cls.objects.filter(
+                role__in=actor_roles(user), codename=codename, content_type_id=ContentType.objects.get_for_model(model_cls).id, object_id=OuterRef('pk')
+            )
+            return queryset.filter(Exists(evaluations))
+        raise RuntimeError(f'Accessible objects strategy must be "in" or "exists", got {strategy}')
 
     @classmethod
     def get_permissions(cls, user, obj):
@@ -704,7 +827,7 @@ class RoleEvaluationFields(models.Model):
         Returns permissions that a user has to obj from object-roles,
         does not consider permissions from user flags or system-wide roles
         """
-        return cls.objects.filter(role__in=user.has_roles.all(), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.id).values_list(
+        return cls.objects.filter(role__in=actor_roles(user), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.id).values_list(
             'codename', flat=True
         )
 
@@ -715,9 +838,23 @@ class RoleEvaluationFields(models.Model):
         method on permission classes, but it is named differently to avoid unintentionally conflicting
         """
         return cls.objects.filter(
-            role__in=user.has_roles.all(), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.pk, codename=codename
+            role__in=actor_roles(user), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.pk, codename=codename
         ).exists()
 
+    @classmethod
+    def get_permissions_for_objects(cls, user, model_cls, pks: Iterable, codenames: Iterable[str]) -> QuerySet:
+        """
+        Returns (object_id, codename) for permissions that a user has to many objects of model_cls in a single query,
+        does not consider permissions from user flags or system-wide roles
+        """
+        return (
+            cls.objects.filter(
+                role__in=actor_roles(user), content_type_id=ContentType.objects.get_for_model(model_cls).id, object_id__in=pks, codename__in=codenames
+            )
+            .values_list('object_id', 'codename')
+            .distinct()
+        )
+
 
 class RoleEvaluation(RoleEvaluationFields):
     class Meta(RoleEvaluationMeta):
@@ -751,6 +888,73 @@ class RoleEvaluationUUID(RoleEvaluationFields):
     object_id = models.UUIDField(null=False, help_text=_("The object UUID this role evaluation will be applied to."))
 
 
+# COMPUTED DATA
+class TeamAncestor(models.Model):
+    """
+    Cached transitive closure of the teams-of-teams graph
+    example:
+        team 5 is a member of team 7, and team 7 is a member of team 9
+        so team 9 has the ancestors team 7 with depth 1, and team 5 with depth 2
+
+    Members of an ancestor team are also members of the team.
+    A team in a loop of team memberships is its own ancestor.
+    The only method that should ever write to this table is
+        compute_team_member_roles()
+    """
+
+    class Meta:
+        app_label = 'dab_rbac'
+        verbose_name_plural = _('team_ancestors')
+        indexes = [models.Index(fields=["ancestor", "team"])]  # used to find teams affected by changes to a team
+        constraints = [models.UniqueConstraint(name='one_entry_per_team_and_ancestor', fields=['team', 'ancestor'])]
+
+    team = models.ForeignKey(
+        settings.ANSIBLE_BASE_TEAM_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ancestor_entries',
+        help_text=_("The team that the ancestor team gives members to."),
+    )
+    ancestor = models.ForeignKey(
+        settings.ANSIBLE_BASE_TEAM_MODEL,
+        on_delete=models.CASCADE,
+        related_name='descendant_entries',
+        help_text=_("The team whose members are also members of the team."),
+    )
+    depth = models.PositiveIntegerField(help_text=_("Number of team memberships from the ancestor to the team, 1 for a direct member team."))
+
+
+class RecomputeQueueEntry(models.Model):
+    """
+    An object role whose RoleEvaluation entries are outdated, waiting to be recomputed
+    example:
+        role definition 12 had a permission added, and ObjectRole 423 uses it
+        so ObjectRole 423 is saved here until its evaluations include that permission
+
+    Entries are only saved for changes affecting more object roles than
+    the ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD setting.
+    The rbac_process_recompute_queue command recomputes these and deletes the entries.
+    """
+
+    class Meta:
+        app_label = 'dab_rbac'
+        verbose_name_plural = _('recompute_queue_entries')
+
+    object_role = models.ForeignKey(
+        ObjectRole,
+        on_delete=models.CASCADE,
+        related_name='queued_recomputes',
+        help_text=_("The object role whose evaluations need to be recomputed."),
+    )
+    role_definition = models.ForeignKey(
+        RoleDefinition,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='queued_recomputes',
+        help_text=_("The role definition whose change queued this recompute, used to report progress."),
+    )
+    created = models.DateTimeField(auto_now_add=True, help_text=_("The date/time this entry was queued."))
+
+
 def get_evaluation_model(cls):
     pk_field = cls._meta.pk
     # For proxy models, including django-polymorphic, use the id field from parent table
@@ -1,11 +1,12 @@
 import logging
-from typing import Optional, Type, Union
+from types import MappingProxyType
+from typing import Mapping, Optional, Type, Union
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Model
 from django.db.models.base import ModelBase  # post_migrate may call with phony objects
-from django.db.models.signals import post_delete, post_migrate
+from django.db.models.signals import post_delete, post_migrate, pre_delete
 from django.utils.functional import cached_property
 
 from ansible_base.rbac.managed import ManagedRoleConstructor, get_managed_role_constructors
@@ -22,15 +23,26 @@ permission_registry.register(MyModel, AnotherModel)
 logger = logging.getLogger('ansible_base.rbac.permission_registry')
 
 
+def model_codenames(cls: Union[ModelBase, Model]) -> tuple[str, ...]:
+    "Gives the Django permission codenames for a given class"
+    return tuple([t[0] for t in cls._meta.permissions] + [f'{act}_{cls._meta.model_name}' for act in cls._meta.default_permissions])
+
+
 class PermissionRegistry:
     def __init__(self):
         self._registry = set()  # model registry
         self._name_to_model = dict()
+        self._registered_labels = set()  # app_label.model_name of registered models
         self._parent_fields = dict()
         self._managed_roles = dict()  # code-defined role definitions, managed=True
         self.apps_ready = False
         self._tracked_relationships = set()
         self._trackers = dict()
+        # Lookup tables built from the registry when apps are ready, see compile_lookups
+        self._child_models = MappingProxyType({})
+        self._codenames = MappingProxyType({})
+        self._child_codenames = MappingProxyType({})
+        self._allowed_permissions = MappingProxyType({})
 
     def register(self, *args: Type[Model], parent_field_name: Optional[str] = 'organization'):
         if self.apps_ready:
@@ -42,6 +54,7 @@ class PermissionRegistry:
                 if model_name in self._name_to_model:
                     raise RuntimeError(f'Two models registered with same name {model_name}')
                 self._name_to_model[model_name] = cls
+                self._registered_labels.add(cls._meta.label_lower)
                 if model_name != 'organization':
                     self._parent_fields[model_name] = parent_field_name
             else:
@@ -60,14 +73,21 @@ class PermissionRegistry:
     def get_parent_fd_name(self, model) -> Optional[str]:
         return self._parent_fields.get(model._meta.model_name)
 
-    def get_child_models(self, parent_model, seen=None) -> list[tuple[str, Type[Model]]]:
+    def get_child_models(self, parent_model: Union[ModelBase, Model]) -> tuple[tuple[str, Type[Model]], ...]:
         """Returns child models and the filter relationship to the parent
 
         This is used for rebuilding RoleEvaluation entries.
-        For the given parent model like organization, this returns a list of tuples that contains
+        For the given parent model like organization, this returns a tuple of tuples that contains
          - path like "parent__organization" in Model.objects.filter(parent__organization=organization)
          - the model class which is a child resource of the parent model
         """
+        child_models = self._child_models.get(parent_model._meta.model_name)
+        if child_models is None:
+            # registry is not finished, or the model is not registered
+            return tuple(self._find_child_models(parent_model))
+        return child_models
+
+    def _find_child_models(self, parent_model, seen=None) -> list[tuple[str, Type[Model]]]:
         if not seen:
             seen = set()
         child_filters = []
@@ -83,10 +103,58 @@ class PermissionRegistry:
                 seen.add(model_name)
 
                 child_filters.append((parent_field_name, child_model))
-                for next_parent_filter, grandchild_model in self.get_child_models(child_model, seen=seen):
+                for next_parent_filter, grandchild_model in self._find_child_models(child_model, seen=seen):
                     child_filters.append((f'{next_parent_filter}__{parent_field_name}', grandchild_model))
         return child_filters
 
+    def get_codenames(self, cls: Union[ModelBase, Model]) -> tuple[str, ...]:
+        "Gives the Django permission codenames for a given class"
+        codenames = self._codenames.get(cls._meta.label_lower)
+        if codenames is None:
+            return model_codenames(cls)
+        return codenames
+
+    def get_child_codenames(self, cls: Union[ModelBase, Model]) -> frozenset[str]:
+        "Gives the Django permission codenames of all child models of a given class"
+        child_codenames = self._child_codenames.get(cls._meta.label_lower)
+        if child_codenames is None:
+            return frozenset(codename for _, child_cls in self.get_child_models(cls) for codename in model_codenames(child_cls))
+        return child_codenames
+
+    def get_allowed_permissions(self, cls: Optional[Type[Model]]) -> Mapping[Type[Model], tuple[str, ...]]:
+        "Permission codenames valid for a RoleDefinition of given registered class, or None for system roles"
+        allowed_permissions = self._allowed_permissions.get(None if cls is None else cls._meta.label_lower)
+        if allowed_permissions is None:
+            # registry is not finished
+            return self._compute_allowed_permissions(cls)
+        return allowed_permissions
+
+    def _compute_allowed_permissions(self, cls: Optional[Type[Model]]) -> Mapping[Type[Model], tuple[str, ...]]:
+        from ansible_base.rbac.validators import compute_permissions_allowed_for_role
+
+        return MappingProxyType({model: tuple(codenames) for model, codenames in compute_permissions_allowed_for_role(cls).items()})
+
+    def compile_lookups(self) -> None:
+        """Builds lookup tables for the finished registry
+
+        The registry can not change after apps are ready, so these replace searches of the
+        registry done for every permission evaluation with dictionary lookups.
+        """
+        self._child_models = MappingProxyType({cls._meta.model_name: tuple(self._find_child_models(cls)) for cls in self._registry})
+        self._codenames = MappingProxyType({cls._meta.label_lower: model_codenames(cls) for cls in self._registry})
+        self._child_codenames = MappingProxyType(
+            {
+                cls._meta.label_lower: frozenset(
+                    codename for _, child_cls in self._child_models[cls._meta.model_name] for codename in self.get_codenames(child_cls)
+                )
+                for cls in self._registry
+            }
+        )
+        allowed_permissions = {None: self._compute_allowed_permissions(None)}
+        for cls in self._registry:
+            allowed_permissions[cls._meta.label_lower] = self._compute_allowed_permissions(cls)
+        self._allowed_permissions = MappingProxyType(allowed_permissions)
+
     def get_resource_prefix(self, cls: Type[Model]) -> str:
         """For a given model class, give the prefix like shared, of API naming like shared.team"""
         if registry := self.get_resource_registry():
@@ -144,7 +212,13 @@ class PermissionRegistry:
 
     def call_when_apps_ready(self, apps, app_config) -> None:
         from ansible_base.rbac import triggers
-        from ansible_base.rbac.evaluations import bound_has_obj_perm, bound_singleton_permissions, connect_rbac_methods
+        from ansible_base.rbac.evaluations import (
+            bound_get_obj_perms,
+            bound_has_obj_perm,
+            bound_has_obj_perms,
+            bound_singleton_permissions,
+            connect_rbac_methods,
+        )
         from ansible_base.rbac.management import create_dab_permissions
 
         self.apps = apps
@@ -160,6 +234,7 @@ class PermissionRegistry:
 
         # This will lock-down the registry, raising an error for any other registrations
         self.apps_ready = True
+        self.compile_lookups()
 
         # Do no specify sender for create_dab_permissions, because that is passed as app_config
         # and we want to create permissions for external apps, not the dab_rbac app
@@ -174,7 +249,10 @@ class PermissionRegistry:
         )
 
         self.user_model.add_to_class('has_obj_perm', bound_has_obj_perm)
+        self.user_model.add_to_class('has_obj_perms', bound_has_obj_perms)
+        self.user_model.add_to_class('get_obj_perms', bound_get_obj_perms)
         self.user_model.add_to_class('singleton_permissions', bound_singleton_permissions)
+        pre_delete.connect(triggers.actor_pre_delete, sender=self.user_model, dispatch_uid='permission-registry-user-pre-delete')
         post_delete.connect(triggers.rbac_post_user_delete, sender=self.user_model, dispatch_uid='permission-registry-user-delete')
 
         for cls in self._registry:
@@ -234,14 +312,11 @@ class PermissionRegistry:
 
     def is_registered(self, obj: Union[ModelBase, Model]) -> bool:
         """Tells if the given object or class is a type tracked by DAB RBAC"""
-        return any((obj._meta.model_name == cls._meta.model_name and obj._meta.app_label == cls._meta.app_label) for cls in self._registry)
+        return obj._meta.label_lower in self._registered_labels
 
     def get_model_by_name(self, model_name: str) -> Optional[Type[Model]]:
         """Returns class with given model_name if registered, returns None otherwise"""
-        for cls in self._registry:
-            if model_name == cls._meta.model_name:
-                return cls
-        return None
+        return self._name_to_model.get(model_name)
 
 
 permission_registry = PermissionRegistry()
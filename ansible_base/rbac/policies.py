@@ -84,8 +84,10 @@ def check_content_obj_permission(request_user, obj) -> None:
             raise PermissionDenied
     else:
         cls = type(obj)
-        for codename in permissions_allowed_for_role(cls)[cls]:
-            if not request_user.has_obj_perm(obj, codename):
+        codenames = list(permissions_allowed_for_role(cls)[cls])
+        user_codenames = request_user.get_obj_perms([obj], codenames)[cls._meta.pk.to_python(obj.pk)]
+        for codename in codenames:
+            if codename not in user_codenames:
                 raise PermissionDenied({'detail': _('You do not have {codename} permission the object').format(codename=codename)})
 
 
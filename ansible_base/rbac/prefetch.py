@@ -1,4 +1,13 @@
+import threading
+
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import connection
+
+from ansible_base.rbac.role_id_cache import bump_generations, get_generation
+
+TYPES_PREFETCH_GENERATION_KEY = 'ansible_base_rbac_types_prefetch_generation'
 
 
 class TypesPrefetch:
@@ -9,6 +18,7 @@ class TypesPrefetch:
         self._role_definitions = {}
         self._permissions = {}
         self._rd_permissions = {}
+        self._child_ids = {}
 
     @classmethod
     def from_database(cls, RoleDefinition):
@@ -25,6 +35,40 @@ class TypesPrefetch:
             inst._rd_permissions[rd.id] = perm_list
         return inst
 
+    @classmethod
+    def from_snapshot(cls, RoleDefinition):
+        """
+        Like from_database, but with ANSIBLE_BASE_TYPES_PREFETCH_CACHE set, this copies a snapshot
+        saved by this process, which is only loaded again after role definitions change
+        """
+        cache = get_types_prefetch_cache()
+        if cache is None:
+            return cls.from_database(RoleDefinition)
+
+        global types_prefetch_snapshot
+        # a missing generation is created with a new unique number, so the snapshot is loaded again
+        generation = get_generation(cache, [TYPES_PREFETCH_GENERATION_KEY], cache.get_many([TYPES_PREFETCH_GENERATION_KEY]))
+        snapshot = types_prefetch_snapshot
+        if snapshot is not None and generation is not None and snapshot[0] == generation:
+            return snapshot[1].copy()
+
+        inst = cls.from_database(RoleDefinition)
+        if types_prefetch_state.changed_in_transaction and not connection.in_atomic_block:
+            types_prefetch_state.changed_in_transaction = False
+        if generation is not None and not types_prefetch_state.changed_in_transaction:
+            # a snapshot with changes that may be rolled back is not saved
+            types_prefetch_snapshot = (generation, inst)
+        return inst.copy()
+
+    def copy(self):
+        "Returns a new instance with the same prefetched data, so that the data of this instance is not modified by its use"
+        inst = type(self)()
+        inst._content_types = self._content_types.copy()
+        inst._role_definitions = self._role_definitions.copy()
+        inst._permissions = self._permissions.copy()
+        inst._rd_permissions = self._rd_permissions.copy()
+        return inst
+
     def get_content_type(self, ct_id):
         if ct_id not in self._content_types:
             self._content_types[ct_id] = ContentType.objects.get_for_id(ct_id)
@@ -39,3 +83,56 @@ class TypesPrefetch:
             self._rd_permissions[role.role_definition_id] = perm_id_list
         for permission_id in self._rd_permissions[role.role_definition_id]:
             yield self._permissions[permission_id]
+
+    def get_child_ids(self, child_model, filter_path, object_id):
+        "Returns primary keys of child_model objects with filter_path equal to object_id"
+        key = (child_model._meta.label, filter_path, object_id)
+        if key not in self._child_ids:
+            self._child_ids[key] = list(child_model.objects.filter(**{filter_path: object_id}).values_list('pk', flat=True))
+        return self._child_ids[key]
+
+    def prefetch_child_ids(self, child_model, filter_path, object_ids):
+        "Fetches the child ids for many parent objects in one query, for later get_child_ids calls"
+        label = child_model._meta.label
+        to_fetch = [object_id for object_id in set(object_ids) if (label, filter_path, object_id) not in self._child_ids]
+        if not to_fetch:
+            return
+        for object_id in to_fetch:
+            self._child_ids[(label, filter_path, object_id)] = []
+        for pk, object_id in child_model.objects.filter(**{f'{filter_path}__in': to_fetch}).values_list('pk', filter_path).iterator():
+            self._child_ids[(label, filter_path, object_id)].append(pk)
+
+    def clear_child_ids(self):
+        "Child objects can change, so these should not be kept longer than one computation"
+        self._child_ids = {}
+
+
+# (generation, TypesPrefetch) loaded by this process, shared by all threads
+types_prefetch_snapshot = None
+
+
+class TypesPrefetchState(threading.local):
+    def __init__(self):
+        # role definitions were changed inside of the current transaction of this thread
+        self.changed_in_transaction = False
+
+
+types_prefetch_state = TypesPrefetchState()
+
+
+def get_types_prefetch_cache():
+    if not settings.ANSIBLE_BASE_TYPES_PREFETCH_CACHE:
+        return None
+    return caches[settings.ANSIBLE_BASE_TYPES_PREFETCH_CACHE]
+
+
+def invalidate_types_prefetch() -> None:
+    "Call this when role definitions or their permissions change"
+    global types_prefetch_snapshot
+    types_prefetch_snapshot = None
+    cache = get_types_prefetch_cache()
+    if cache is None:
+        return
+    if connection.in_atomic_block:
+        types_prefetch_state.changed_in_transaction = True
+    bump_generations([(cache, TYPES_PREFETCH_GENERATION_KEY)])
@@ -0,0 +1,70 @@
+import logging
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import ObjectRole, RecomputeQueueEntry, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+
+logger = logging.getLogger('ansible_base.rbac.recompute_queue')
+
+
+"""
+Optional queue of object roles with outdated evaluations, for large role definition changes.
+
+Changing the permissions of a role definition recomputes evaluations of every object role
+of that definition, and the roles of teams those object roles apply to.
+With ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD set, changes affecting more object roles than that
+save the object roles in the RecomputeQueueEntry table instead,
+and the rbac_process_recompute_queue command recomputes them in chunks.
+
+Until an object role is recomputed, its evaluations are pessimistic.
+Evaluations for removed permissions are deleted when the change is queued,
+and added permissions are not given until the recompute.
+"""
+
+
+def should_queue_recompute(object_role_count: int) -> bool:
+    threshold = settings.ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD
+    return threshold is not None and object_role_count > threshold
+
+
+def queue_recompute(role_definition: RoleDefinition, object_roles: Iterable[ObjectRole], removed_codenames: Iterable[str] = ()) -> None:
+    """
+    Saves object_roles to be recomputed by the worker, after a change to role_definition
+    removed_codenames: permissions that were removed, evaluations for these are deleted now
+    """
+    role_ids = sorted(object_role.id for object_role in object_roles)
+    removed_codenames = list(removed_codenames)
+    chunk_size = settings.ANSIBLE_BASE_EVALUATION_CHUNK_SIZE
+    for i in range(0, len(role_ids), chunk_size):
+        chunk = role_ids[i : i + chunk_size]
+        if removed_codenames:
+            for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+                eval_cls.objects.filter(role_id__in=chunk, codename__in=removed_codenames).delete()
+        RecomputeQueueEntry.objects.bulk_create([RecomputeQueueEntry(object_role_id=role_id, role_definition=role_definition) for role_id in chunk])
+    logger.info(f'Queued recompute of {len(role_ids)} object roles for changes to role definition {role_definition.name}')
+
+
+def process_recompute_queue(chunk_size: int) -> int:
+    """
+    Recomputes evaluations for the object roles of the next chunk_size queue entries, and deletes those entries
+    Returns the number of object roles recomputed, which is 0 when the queue is empty
+    Entries are locked while they are processed, so several workers can run at once
+    """
+    with transaction.atomic():
+        entries = list(RecomputeQueueEntry.objects.select_for_update(skip_locked=True).order_by('id').values_list('id', 'object_role_id')[:chunk_size])
+        if not entries:
+            return 0
+        role_ids = set(role_id for _, role_id in entries)
+        compute_object_role_permissions(object_roles=set(ObjectRole.objects.filter(id__in=role_ids)))
+        RecomputeQueueEntry.objects.filter(id__in=[entry_id for entry_id, _ in entries]).delete()
+    return len(role_ids)
+
+
+def get_recompute_status(role_definition: RoleDefinition, pending: Optional[int] = None) -> dict:
+    "Progress of recomputing evaluations after changes to role_definition"
+    if pending is None:
+        pending = RecomputeQueueEntry.objects.filter(role_definition=role_definition).count()
+    return {'status': 'pending' if pending else 'complete', 'pending_object_roles': pending}
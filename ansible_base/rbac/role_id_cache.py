@@ -0,0 +1,195 @@
+import logging
+import time
+from typing import Iterable, Optional, Union
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+logger = logging.getLogger('ansible_base.rbac.role_id_cache')
+
+
+"""
+Optional cross-request caches of RBAC data for users.
+
+Permission evaluations filter RoleEvaluation by the roles of a user,
+which is normally done with a subquery of the role assignment table.
+With ANSIBLE_BASE_ROLE_ID_CACHE set to the name of a Django cache,
+the ids are saved in that cache, and small sets are given to the database as a list of literals.
+
+Permissions from global roles are computed from role definitions, team membership and assignments,
+for every new user object, which is normally every request.
+With ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE set to the name of a Django cache, those are saved in that cache.
+
+Saved data is versioned by a generation number for each user, and global generation numbers.
+These are increased whenever role assignments of the user change, or for all users
+when something that can affect all users changes, like team membership or migrations.
+Data saved with any other generation is ignored, so nothing is ever deleted from the cache.
+A generation key that is missing, like after it was evicted, is created with a new unique number,
+so data saved with the evicted generation is never used.
+"""
+
+
+GLOBAL_GENERATION_KEY = 'ansible_base_rbac_role_ids_generation'
+GLOBAL_PERMISSIONS_GENERATION_KEY = 'ansible_base_rbac_global_permissions_generation'
+
+
+def user_generation_key(user_id) -> str:
+    return f'ansible_base_rbac_user_generation_{user_id}'
+
+
+def user_role_ids_key(user_id) -> str:
+    return f'ansible_base_rbac_role_ids_{user_id}'
+
+
+def user_global_permissions_key(user_id) -> str:
+    return f'ansible_base_rbac_global_permissions_{user_id}'
+
+
+def get_role_id_cache():
+    if not settings.ANSIBLE_BASE_ROLE_ID_CACHE:
+        return None
+    return caches[settings.ANSIBLE_BASE_ROLE_ID_CACHE]
+
+
+def get_global_permissions_cache():
+    if not settings.ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE:
+        return None
+    return caches[settings.ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE]
+
+
+def enabled_caches() -> list:
+    cache_names = set(name for name in (settings.ANSIBLE_BASE_ROLE_ID_CACHE, settings.ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE) if name)
+    return [caches[name] for name in cache_names]
+
+
+def new_generation() -> int:
+    "Starting number for a generation key that does not exist, different from any number an evicted key could have had"
+    return time.time_ns()
+
+
+def get_generation(cache, keys: list[str], values: dict) -> Optional[tuple]:
+    """
+    Returns the current numbers of the generation keys, from values if they were already read with get_many
+    Keys that do not exist are created, returns None if the cache does not keep them, then nothing should be saved
+    """
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, new_generation(), timeout=None)
+        values = {**values, **cache.get_many(missing)}
+        if any(key not in values for key in keys):
+            return None
+    return tuple(values[key] for key in keys)
+
+
+def bump_generation(cache, key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key does not exist, if another process added it first then increase it
+        if not cache.add(key, new_generation(), timeout=None):
+            cache.incr(key)
+
+
+def bump_generations(cache_keys: list[tuple]) -> None:
+    """
+    Generations are increased now, and again after commit,
+    because another process could save data it read before the commit.
+    """
+    if not cache_keys:
+        return
+
+    def bump_keys():
+        for cache, key in cache_keys:
+            bump_generation(cache, key)
+
+    bump_keys()
+    transaction.on_commit(bump_keys)
+
+
+def invalidate_user_role_ids(user_ids: Iterable) -> None:
+    "Call this when role assignments of these users have changed"
+    user_ids = set(user_ids)
+    bump_generations([(cache, user_generation_key(user_id)) for cache in enabled_caches() for user_id in user_ids])
+
+
+def invalidate_all_role_ids() -> None:
+    cache = get_role_id_cache()
+    if cache is None:
+        return
+    bump_generation(cache, GLOBAL_GENERATION_KEY)
+
+
+# Global permissions saved on user objects are versioned by this, for the current process only
+local_global_permissions_generation = 0
+
+
+def invalidate_global_permissions() -> None:
+    "Call this when global permissions of any number of users may have changed"
+    global local_global_permissions_generation
+    local_global_permissions_generation += 1
+    cache = get_global_permissions_cache()
+    if cache is not None:
+        bump_generations([(cache, GLOBAL_PERMISSIONS_GENERATION_KEY)])
+
+
+def get_local_global_permissions_generation() -> int:
+    return local_global_permissions_generation
+
+
+def get_user_global_permissions(user, compute) -> set[str]:
+    """
+    Returns codenames of permissions the user has from global roles, from the cache if possible
+    compute: function that computes this for the user, when the saved permissions are outdated
+    """
+    cache = get_global_permissions_cache()
+    if cache is None or user.pk is None:
+        return compute(user)
+
+    generation_keys = [GLOBAL_PERMISSIONS_GENERATION_KEY, user_generation_key(user.pk)]
+    values = cache.get_many(generation_keys + [user_global_permissions_key(user.pk)])
+    generation = get_generation(cache, generation_keys, values)
+    saved = values.get(user_global_permissions_key(user.pk))
+    if saved is not None and generation is not None and saved[0] == generation:
+        return saved[1]
+
+    permissions = set(compute(user))
+    if generation is not None:
+        cache.set(user_global_permissions_key(user.pk), (generation, permissions), timeout=settings.ANSIBLE_BASE_ROLE_ID_CACHE_TIMEOUT)
+    return permissions
+
+
+def get_user_role_ids(user) -> Optional[list[int]]:
+    """
+    Returns ids of the object roles the user has, from the cache if possible,
+    or None if the cache is not enabled or the user has too many roles to list
+    """
+    cache = get_role_id_cache()
+    if cache is None or user.pk is None:
+        return None
+
+    generation_keys = [GLOBAL_GENERATION_KEY, user_generation_key(user.pk)]
+    values = cache.get_many(generation_keys + [user_role_ids_key(user.pk)])
+    generation = get_generation(cache, generation_keys, values)
+    saved = values.get(user_role_ids_key(user.pk))
+    if saved is not None and generation is not None and saved[0] == generation:
+        return saved[1]
+
+    max_size = settings.ANSIBLE_BASE_ROLE_ID_CACHE_MAX_SIZE
+    role_ids = list(user.has_roles.order_by('id').values_list('id', flat=True)[: max_size + 1])
+    if len(role_ids) > max_size:
+        role_ids = None  # saved so that this user does not count roles every time
+    if generation is not None:
+        cache.set(user_role_ids_key(user.pk), (generation, role_ids), timeout=settings.ANSIBLE_BASE_ROLE_ID_CACHE_TIMEOUT)
+    return role_ids
+
+
+def actor_roles(actor) -> Union[list[int], QuerySet]:
+    "For use as the value in role__in=actor_roles(actor) filters of permission evaluations"
+    if actor._meta.model_name == 'user':
+        role_ids = get_user_role_ids(actor)
+        if role_ids is not None:
+            return role_ids
+    return actor.has_roles.all()
@@ -0,0 +1,207 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Optional, Type
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BigIntegerField, F, Field, Model, UUIDField
+from django.db.models.functions import Cast
+from django.db.models.query import QuerySet
+
+from ansible_base.lib.utils.models import is_add_perm
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluationUUID, get_evaluation_model
+from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.prefetch import TypesPrefetch
+
+logger = logging.getLogger('ansible_base.rbac.sql_caching')
+
+
+"""
+Set-based alternative to the evaluation logic in caching.compute_object_role_permissions.
+
+Instead of loading expected and existing evaluations into python,
+the expected evaluations are expressed as SELECT statements,
+and the database inserts what is missing and deletes what is not expected.
+The number of statements scales with the number of role definitions and permissions in use,
+and not with the number of objects or roles.
+
+ObjectRole.expected_direct_permissions is the reference for what these statements produce.
+"""
+
+
+def get_evaluation_paths(role_model: Type[Model], permission, permission_model: Type[Model]) -> list[tuple[Optional[str], Type[Model], int]]:
+    """For a permission in a role for role_model, returns the sources of evaluations it gives
+
+    returns a list of tuples of
+        (filter path from the evaluation model to role_model or None for the role's object, evaluation model, evaluation content type id)
+    This follows the same rules as ObjectRole.expected_direct_permissions
+    """
+    role_ct_id = permission_registry.content_type_model.objects.get_for_model(role_model).id
+    if permission.content_type_id == role_ct_id:
+        return [(None, role_model, role_ct_id)]
+
+    paths = []
+    if is_add_perm(permission.codename) or settings.ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS:
+        paths.append((None, role_model, role_ct_id))
+
+    filter_path = None
+    child_model = None
+    if is_add_perm(permission.codename):
+        for path, model in permission_registry.get_child_models(role_model):
+            if '__' in path and model._meta.model_name == permission_model._meta.model_name:
+                path_to_parent, filter_path = path.split('__', 1)
+                child_model = permission_model._meta.get_field(path_to_parent).related_model
+    else:
+        for path, model in permission_registry.get_child_models(role_model):
+            if model._meta.model_name == permission_model._meta.model_name:
+                filter_path = path
+                child_model = model
+                break
+        else:
+            logger.warning(f'Role for {role_model._meta.model_name} listed {permission.codename} but model is not a child, ignoring')
+
+    if child_model:
+        paths.append((filter_path, child_model, permission_registry.content_type_model.objects.get_for_model(child_model).id))
+    return paths
+
+
+def object_id_cast_field(model: Type[Model]) -> Field:
+    "Field type to cast the text ObjectRole.object_id to, so it can be compared to primary keys of the model"
+    if get_evaluation_model(model) is RoleEvaluationUUID:
+        return UUIDField()
+    return BigIntegerField()
+
+
+def typed_placeholder(eval_model: Type[Model], field_name: str) -> str:
+    "Parameter placeholder cast to the type of the evaluation column, because untyped literals inside DISTINCT and UNION ALL may not resolve to it"
+    return f'CAST(%s AS {eval_model._meta.get_field(field_name).cast_db_type(connection)})'
+
+
+def compile_sql(qs: QuerySet) -> tuple[str, tuple]:
+    sql, params = qs.order_by().query.sql_with_params()
+    return (sql, tuple(params))
+
+
+class ExpectedEvaluationsSQL:
+    """Collects SELECT statements that give expected evaluations for a set of target object roles
+
+    Every statement gives columns role_id, codename, content_type_id, object_id
+    and these are organized by the evaluation model they are for.
+    """
+
+    def __init__(self, target_qs: QuerySet, types_prefetch: Optional[TypesPrefetch] = None):
+        self.target_qs = target_qs
+        if types_prefetch is None:
+            types_prefetch = TypesPrefetch.from_snapshot(RoleDefinition)
+        self.types_prefetch = types_prefetch
+        self.selects = defaultdict(list)
+
+    def source_querysets(self) -> list[QuerySet]:
+        """Querysets of roles that give permissions to the target roles
+
+        These are the target roles themselves, and roles held by teams that target roles give membership to.
+        The target_id is the role that will hold the evaluations.
+        """
+        target_ids = self.target_qs.values('id')
+        return [
+            ObjectRole.objects.filter(id__in=target_ids).annotate(rbac_target_id=F('id')),
+            ObjectRole.objects.filter(teams__member_roles__in=target_ids).annotate(rbac_target_id=F('teams__member_roles')),
+        ]
+
+    def add_select(self, eval_model: Type[Model], sql: str, params: tuple) -> None:
+        self.selects[eval_model].append((sql, params))
+
+    def build(self) -> dict[Type[Model], list[tuple[str, tuple]]]:
+        qn = connection.ops.quote_name
+        for source_qs in self.source_querysets():
+            for rd_id, ct_id in source_qs.order_by().values_list('role_definition_id', 'content_type_id').distinct():
+                role_model = self.types_prefetch.get_content_type(ct_id).model_class()
+                rd_qs = source_qs.filter(role_definition_id=rd_id, content_type_id=ct_id)
+                # ObjectRole.object_id is stored as text, cast to the native type to join to other tables
+                sources_sql, sources_params = compile_sql(
+                    rd_qs.values('rbac_target_id', rbac_source_id=Cast('object_id', output_field=object_id_cast_field(role_model)))
+                )
+                for permission in self.types_prefetch.permissions_for_object_role(ObjectRole(role_definition_id=rd_id)):
+                    permission_model = self.types_prefetch.get_content_type(permission.content_type_id).model_class()
+                    for filter_path, eval_model, eval_ct_id in get_evaluation_paths(role_model, permission, permission_model):
+                        evaluation_cls = get_evaluation_model(eval_model)
+                        params = (permission.codename, eval_ct_id) + sources_params
+                        constants_sql = (
+                            f'{typed_placeholder(evaluation_cls, "codename")} AS {qn("codename")}, '
+                            f'{typed_placeholder(evaluation_cls, "content_type_id")} AS {qn("content_type_id")}'
+                        )
+                        if filter_path is None:
+                            sql = (
+                                f'SELECT DISTINCT s.rbac_target_id AS {qn("role_id")}, {constants_sql}, '
+                                f's.rbac_source_id AS {qn("object_id")} FROM ({sources_sql}) s'
+                            )
+                        else:
+                            children_sql, children_params = compile_sql(eval_model.objects.values(rbac_child_id=F('pk'), rbac_parent_id=F(filter_path)))
+                            sql = (
+                                f'SELECT DISTINCT s.rbac_target_id AS {qn("role_id")}, {constants_sql}, '
+                                f'c.rbac_child_id AS {qn("object_id")} FROM ({sources_sql}) s '
+                                f'INNER JOIN ({children_sql}) c ON c.rbac_parent_id = s.rbac_source_id'
+                            )
+                            params += children_params
+                        self.add_select(evaluation_cls, sql, params)
+        return self.selects
+
+
+def evaluation_columns_match(left: str, right: str) -> str:
+    qn = connection.ops.quote_name
+    return ' AND '.join(f'{left}.{qn(col)} = {right}.{qn(col)}' for col in ('role_id', 'codename', 'content_type_id', 'object_id'))
+
+
+def compute_object_role_permissions_sql(object_roles: Optional[Iterable[ObjectRole]] = None, types_prefetch: Optional[TypesPrefetch] = None) -> tuple[int, int]:
+    """
+    Set-based equivalent of compute_object_role_permissions.
+    Assumes the ObjectRole.provides_teams relationship is correct.
+    Makes the RoleEvaluation tables correct for all specified object_roles, or all object roles if None
+    object_roles may also be an ObjectRole queryset
+    Returns a tuple of the number of (evaluations added, evaluations deleted)
+    """
+    if object_roles is None:
+        target_qs = ObjectRole.objects.all()
+    elif isinstance(object_roles, QuerySet):
+        target_qs = object_roles
+    else:
+        role_ids = set(object_role.id for object_role in object_roles)
+        if not role_ids:
+            return (0, 0)
+        target_qs = ObjectRole.objects.filter(id__in=role_ids)
+
+    selects = ExpectedEvaluationsSQL(target_qs, types_prefetch=types_prefetch).build()
+
+    qn = connection.ops.quote_name
+    targets_sql, targets_params = compile_sql(target_qs.values('id'))
+    columns = ', '.join(qn(col) for col in ('role_id', 'codename', 'content_type_id', 'object_id'))
+    added = deleted = 0
+    with connection.cursor() as cursor:
+        for eval_model in {get_evaluation_model(model) for model in permission_registry.all_registered_models}:
+            table = qn(eval_model._meta.db_table)
+            eval_selects = selects.get(eval_model, [])
+
+            delete_sql = f'DELETE FROM {table} WHERE {table}.{qn("role_id")} IN ({targets_sql})'
+            delete_params = targets_params
+            if eval_selects:
+                expected_sql = ' UNION ALL '.join(f'SELECT * FROM ({sql}) u{i}' for i, (sql, params) in enumerate(eval_selects))
+                delete_sql += f' AND NOT EXISTS (SELECT 1 FROM ({expected_sql}) x WHERE {evaluation_columns_match("x", table)})'
+                for sql, params in eval_selects:
+                    delete_params += params
+            cursor.execute(delete_sql, delete_params)
+            if cursor.rowcount > 0:
+                logger.info(f'Deleted {cursor.rowcount} {eval_model._meta.model_name} records')
+                deleted += cursor.rowcount
+
+            for sql, params in eval_selects:
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) SELECT {columns} FROM ({sql}) x '
+                    f'WHERE NOT EXISTS (SELECT 1 FROM {table} e WHERE {evaluation_columns_match("e", "x")})',
+                    params,
+                )
+                if cursor.rowcount > 0:
+                    logger.info(f'Added {cursor.rowcount} {eval_model._meta.model_name} records')
+                    added += cursor.rowcount
+
+    return (added, deleted)
@@ -1,16 +1,23 @@
 import logging
+import threading
+from collections import defaultdict
 from contextlib import contextmanager
-from typing import Optional, Union
+from typing import Optional, Type, Union
 from uuid import UUID
 
+from django.db import transaction
 from django.db.models import Model, Q
 from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
 from django.db.utils import ProgrammingError
 from django.dispatch import Signal
 
-from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles
-from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, get_evaluation_model
+from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles, get_team_ids_for_object_roles, save_cache_updates
+from ansible_base.rbac.evaluations import clear_permission_cache
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment, get_evaluation_model
 from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.prefetch import TypesPrefetch, invalidate_types_prefetch
+from ansible_base.rbac.recompute_queue import queue_recompute, should_queue_recompute
+from ansible_base.rbac.role_id_cache import invalidate_all_role_ids, invalidate_global_permissions, invalidate_user_role_ids
 from ansible_base.rbac.validators import validate_team_assignment_enabled
 
 logger = logging.getLogger('ansible_base.rbac.triggers')
@@ -41,7 +48,7 @@ def needed_updates_on_assignment(role_definition, actor, object_role, created=Fa
     If a user or a team is granted a role or has a role revoked,
     then this returns instructions for what needs to be updated
     returns tuple
-        (bool: should update team owners, set: object roles to update)
+        (set: ids of teams whose membership needs to be recomputed, set: object roles to update)
     """
     # we maintain a list of object roles that we need to update evaluations for
     to_update = set()
@@ -78,49 +85,280 @@ def needed_updates_on_assignment(role_definition, actor, object_role, created=Fa
         to_update.update(object_role.descendent_roles())
 
     # actions which can change the team parentage structure
-    recompute_teams = bool(has_team_perm and (created or deleted or changes_team_owners))
+    recompute_teams = set()
+    if has_team_perm and (created or deleted or changes_team_owners):
+        recompute_teams = get_team_ids_for_object_roles([object_role])
 
     return (recompute_teams, to_update)
 
 
+def needed_updates_on_bulk_assignment(role_definition, teams, object_roles, created_roles, giving=True):
+    """
+    The same as needed_updates_on_assignment, but for many actors and object roles at once
+    this must be called before the assignments are created or removed
+    returns tuple
+        (set: ids of teams whose membership needs to be recomputed, set: object roles to update)
+    """
+    to_update = set(created_roles)
+
+    has_team_perm = role_definition.permissions.filter(codename=permission_registry.team_permission).exists()
+
+    if teams:
+        has_org_member = role_definition.permissions.filter(codename='member_organization').exists()
+        validate_team_assignment_enabled(role_definition.content_type, has_team_perm=has_team_perm, has_org_member=has_org_member)
+
+        # roles that grant any form of permission to the teams, see team_ancestor_roles
+        permission_kwargs = dict(
+            codename=permission_registry.team_permission, object_id__in=[team.id for team in teams], content_type_id=permission_registry.team_ct_id
+        )
+        to_update.update(ObjectRole.objects.filter(permission_partials__in=RoleEvaluation.objects.filter(**permission_kwargs)).distinct())
+
+    if (has_team_perm and created_roles) or teams:
+        # roles held by teams that these roles give membership to, see ObjectRole.descendent_roles
+        to_update.update(ObjectRole.objects.filter(teams__member_roles__in=object_roles).distinct())
+
+    recompute_teams = set()
+    if has_team_perm:
+        if teams:
+            recompute_teams = get_team_ids_for_object_roles(object_roles)
+        elif created_roles:
+            recompute_teams = get_team_ids_for_object_roles(created_roles)
+
+    return (recompute_teams, to_update)
+
+
+class RBACBatch(threading.local):
+    """
+    Thread-local state of an active rbac_batch block,
+    which collects the outputs of needed_updates_on_assignment instead of acting on them
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.on_commit = False
+        self.team_ids = set()
+        self.role_ids = set()
+        self.deleted = DeletedObjects()
+
+    def __bool__(self):
+        return bool(self.depth > 0)
+
+    def add(self, update_teams, to_update):
+        self.team_ids.update(update_teams)
+        # ids are saved because roles may be deleted by later assignments in the batch
+        self.role_ids.update(object_role.id for object_role in to_update)
+
+    def add_deleted(self, instance):
+        if instance._meta.model_name == permission_registry.team_model._meta.model_name:
+            # teams this team gave membership to need to be updated
+            self.team_ids.update(getattr(instance, '__rbac_stashed_child_team_ids'))
+        self.deleted.add(instance)
+
+    def pop(self):
+        team_ids, role_ids, deleted = self.team_ids, self.role_ids, self.deleted
+        self.team_ids, self.role_ids, self.deleted = set(), set(), DeletedObjects()
+        return (team_ids, role_ids, deleted)
+
+
+class DeletedObjects:
+    "Objects deleted inside of a rbac_batch block, whose object roles and evaluations are deleted at the end of the block"
+
+    def __init__(self):
+        self.object_ids = defaultdict(set)  # content type id to primary keys
+        self.team_member_role_ids = set()
+        self.orphan_candidate_ids = set()  # roles held by deleted users and teams
+
+    def __bool__(self):
+        return bool(self.object_ids or self.orphan_candidate_ids)
+
+    def add(self, instance):
+        ct = permission_registry.content_type_model.objects.get_for_model(instance)
+        self.object_ids[ct.id].add(instance.pk)
+        if ct.id == permission_registry.team_ct_id:
+            self.team_member_role_ids.update(object_role.id for object_role in getattr(instance, '__rbac_stashed_member_roles'))
+            self.orphan_candidate_ids.update(getattr(instance, '__rbac_stashed_role_ids'))
+
+    def remove_object_roles(self) -> set[int]:
+        """
+        Deletes object roles and evaluations of all the deleted objects with one query of each type
+        Returns ids of the roles which had evaluations from membership to deleted teams
+        """
+        affected_role_ids = set()
+        team_ids = self.object_ids.get(permission_registry.team_ct_id)
+        if team_ids:
+            team_evaluations = RoleEvaluation.objects.filter(
+                codename=permission_registry.team_permission, content_type_id=permission_registry.team_ct_id, object_id__in=team_ids
+            )
+            affected_role_ids.update(ObjectRole.objects.filter(permission_partials__in=team_evaluations).values_list('id', flat=True))
+            affected_role_ids.update(ObjectRole.objects.filter(teams__member_roles__in=self.team_member_role_ids).values_list('id', flat=True))
+
+        if self.object_ids:
+            role_filter = Q(pk__in=[])
+            evaluation_filters = defaultdict(lambda: Q(pk__in=[]))
+            for ct_id, pks in self.object_ids.items():
+                role_filter |= Q(content_type_id=ct_id, object_id__in=[str(pk) for pk in pks])
+                model = permission_registry.content_type_model.objects.get_for_id(ct_id).model_class()
+                if permission_registry.get_parent_fd_name(model):
+                    evaluation_filters[get_evaluation_model(model)] |= Q(content_type_id=ct_id, object_id__in=pks)
+            ObjectRole.objects.filter(role_filter).delete()
+            for eval_cls, evaluation_filter in evaluation_filters.items():
+                eval_cls.objects.filter(evaluation_filter).delete()
+
+        delete_orphaned_object_roles(self.orphan_candidate_ids)
+        clear_permission_cache()
+        return affected_role_ids
+
+
+rbac_batch_state = RBACBatch()
+
+
+def run_batch_updates(team_ids, role_ids, deleted=None):
+    "Make cached data correct after the assignments and deletions made inside of a rbac_batch block"
+    if deleted:
+        role_ids = role_ids | deleted.remove_object_roles()
+    to_update = set(ObjectRole.objects.filter(id__in=role_ids))
+    if team_ids:
+        affected_team_ids = compute_team_member_roles(team_ids=team_ids)
+        # Lookups of roles that give membership to teams can be outdated during the batch
+        # so all roles that give membership to changed teams are updated
+        if affected_team_ids:
+            to_update.update(ObjectRole.objects.filter(provides_teams__in=affected_team_ids).distinct())
+    if to_update:
+        compute_object_role_permissions(object_roles=to_update)
+
+
+@contextmanager
+def rbac_batch(on_commit: bool = False):
+    """
+    Defer the recompute of team membership and role evaluations from role assignments
+    until the end of the block, where all updates are combined and ran once.
+
+    with rbac_batch():
+        for user in users:
+            rd.give_permission(user, organization)
+
+    Objects deleted inside of the block, like by queryset.delete(), are also combined,
+    so that their object roles and evaluations are deleted with a few queries at the end.
+
+    Permission evaluations will not be correct inside of the block.
+    on_commit: do the updates when the current transaction commits, instead of at the end of the block
+    Nested blocks are combined with the outermost block.
+    If the block raises an exception, the collected updates are discarded.
+    """
+    rbac_batch_state.depth += 1
+    if on_commit:
+        rbac_batch_state.on_commit = True
+    outermost = False
+    try:
+        yield
+    finally:
+        rbac_batch_state.depth -= 1
+        if rbac_batch_state.depth == 0:
+            outermost = True
+            team_ids, role_ids, deleted = rbac_batch_state.pop()
+            use_on_commit = rbac_batch_state.on_commit
+            rbac_batch_state.on_commit = False
+
+    # Only reached if the block did not raise, cached data of failed work is never written
+    if not outermost:
+        return
+    connection = transaction.get_connection()
+    if connection.needs_rollback:
+        logger.info('Not updating RBAC cached data from batch because transaction will be rolled back')
+    elif team_ids or role_ids or deleted:
+        if use_on_commit:
+            transaction.on_commit(lambda: run_batch_updates(team_ids, role_ids, deleted=deleted))
+        else:
+            run_batch_updates(team_ids, role_ids, deleted=deleted)
+
+
 def update_after_assignment(update_teams, to_update):
     "Call this with the output of needed_updates_on_assignment"
+    if rbac_batch_state:
+        rbac_batch_state.add(update_teams, to_update)
+        return
+
     if update_teams:
-        compute_team_member_roles()
+        compute_team_member_roles(team_ids=update_teams)
 
     compute_object_role_permissions(object_roles=to_update)
 
 
 def permissions_changed(instance, action, model, pk_set, reverse, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # post_clear does not give the permissions that were removed, so save them here
+        instance.__rbac_cleared_permission_ids = set(instance.permissions.values_list('pk', flat=True))
     if action.startswith('pre_'):
         return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('__rbac_cleared_permission_ids', None)
+    invalidate_types_prefetch()
+    if (not reverse) and instance.content_type_id is None:
+        invalidate_global_permissions()  # global role changed
     to_recompute = set(ObjectRole.objects.filter(role_definition=instance).prefetch_related('teams__member_roles'))
     if not to_recompute:
         return
     if reverse:
         raise RuntimeError('Removal of permssions through reverse relationship not supported')
 
-    if action in ('post_add', 'post_remove'):
-        if permission_registry.permission_qs.filter(codename=permission_registry.team_permission, pk__in=pk_set).exists():
-            for object_role in to_recompute.copy():
-                to_recompute.update(object_role.descendent_roles())
-            compute_team_member_roles()
-        # All team member roles that give this permission through this role need to be updated
-        for role in to_recompute.copy():
-            for team in role.teams.all():
-                for team_role in team.member_roles.all():
-                    to_recompute.add(team_role)
-    elif action == 'post_clear':
-        # unfortunately this does not give us a list of permissions to work with
-        # this is slow, not ideal, but will at least be correct
-        compute_team_member_roles()
-        to_recompute = None  # all
+    if pk_set is None:
+        # clear without the permissions saved by pre_clear, this is slow but will at least be correct
+        compute_team_member_roles(object_roles=to_recompute)
+        compute_object_role_permissions()
+        return
+
+    team_permission_changed = permission_registry.permission_qs.filter(codename=permission_registry.team_permission, pk__in=pk_set).exists()
+    if team_permission_changed:
+        rd_object_roles = to_recompute.copy()
+        for object_role in rd_object_roles:
+            to_recompute.update(object_role.descendent_roles())
+        compute_team_member_roles(object_roles=rd_object_roles)
+    # All team member roles that give this permission through this role need to be updated
+    for role in to_recompute.copy():
+        for team in role.teams.all():
+            for team_role in team.member_roles.all():
+                to_recompute.add(team_role)
+
+    # Permissions given through team membership can not be removed pessimistically, so those changes are not queued
+    if (not team_permission_changed) and should_queue_recompute(len(to_recompute)):
+        removed_codenames = []
+        if action != 'post_add':
+            removed_codenames = list(permission_registry.permission_qs.filter(pk__in=pk_set).values_list('codename', flat=True))
+        queue_recompute(instance, to_recompute, removed_codenames=removed_codenames)
+        return
     compute_object_role_permissions(object_roles=to_recompute)
 
 
 m2m_changed.connect(permissions_changed, sender=RoleDefinition.permissions.through)
 
 
+def role_definition_changed(instance, *args, **kwargs):
+    invalidate_types_prefetch()
+
+
+post_save.connect(role_definition_changed, sender=RoleDefinition, dispatch_uid='rbac-role-definition-save')
+post_delete.connect(role_definition_changed, sender=RoleDefinition, dispatch_uid='rbac-role-definition-delete')
+
+
+def user_assignment_changed(instance, *args, **kwargs):
+    "Connect to post_save and post_delete signals, the cached ids of roles the user has are no longer correct"
+    invalidate_user_role_ids([instance.user_id])
+    if instance.object_role_id is None:
+        invalidate_global_permissions()
+
+
+def team_assignment_changed(instance, *args, **kwargs):
+    "Connect to post_save and post_delete signals, a global role for a team affects every user in the team"
+    if instance.object_role_id is None:
+        invalidate_global_permissions()
+
+
+post_save.connect(user_assignment_changed, sender=RoleUserAssignment, dispatch_uid='rbac-user-assignment-save')
+post_delete.connect(user_assignment_changed, sender=RoleUserAssignment, dispatch_uid='rbac-user-assignment-delete')
+post_save.connect(team_assignment_changed, sender=RoleTeamAssignment, dispatch_uid='rbac-team-assignment-save')
+post_delete.connect(team_assignment_changed, sender=RoleTeamAssignment, dispatch_uid='rbac-team-assignment-delete')
+
+
 def rbac_post_init_set_original_parent(sender, instance, **kwargs):
     """
     connect to post_init signal
@@ -186,12 +424,148 @@ def post_save_update_obj_permissions(instance):
     # If the actual object changed (created or modified) was a team, any org role
     # that has member_team needs to be updated, and any parent teams that have that role
     if instance._meta.model_name == permission_registry.team_model._meta.model_name:
-        compute_team_member_roles()
+        compute_team_member_roles(team_ids=[instance.pk])
 
     if to_update:
         compute_object_role_permissions(object_roles=to_update)
 
 
+def post_create_add_obj_permissions(instance):
+    """
+    Append-only version of post_save_update_obj_permissions for newly created objects.
+    A new object can not have any evaluations yet, and can not have child objects,
+    so the only evaluations to add are for the new object, from roles on its parent objects.
+    This avoids loading all existing evaluations of the parent object roles.
+    """
+    if instance._meta.model_name == permission_registry.team_model._meta.model_name:
+        compute_team_member_roles(team_ids=[instance.pk])
+
+    parent_gfks = get_parent_ids(instance)
+    if not parent_gfks:
+        return
+
+    q_filter = Q()
+    for parent_ct, parent_id in parent_gfks:
+        q_filter |= Q(content_type=parent_ct, object_id=parent_id)
+    parent_roles = list(ObjectRole.objects.filter(q_filter))
+    if not parent_roles:
+        return
+
+    # Permissions that parent object roles give to objects of this type
+    types_prefetch = TypesPrefetch()
+    new_permissions = {}
+    for object_role in parent_roles:
+        new_permissions[object_role.id] = set()
+        for permission, eval_ct, child_model, _ in object_role.child_permission_paths(types_prefetch):
+            if child_model._meta.concrete_model is instance._meta.concrete_model:
+                new_permissions[object_role.id].add((permission.codename, eval_ct))
+
+    # Roles that give membership to teams which have parent object roles get the same permissions
+    new_evaluations = set()
+    for role_id, team_role_id in ObjectRole.objects.filter(provides_teams__has_roles__in=parent_roles).values_list('id', 'provides_teams__has_roles'):
+        for codename, eval_ct in new_permissions.get(team_role_id, []):
+            new_evaluations.add((role_id, codename, eval_ct))
+    for role_id, permissions in new_permissions.items():
+        for codename, eval_ct in permissions:
+            new_evaluations.add((role_id, codename, eval_ct))
+
+    if new_evaluations:
+        clear_permission_cache()
+        # pk may have been given as a string, save_cache_updates needs the python type to pick the evaluation table
+        object_id = instance._meta.pk.to_python(instance.pk)
+        to_add = [
+            RoleEvaluation(codename=codename, content_type_id=eval_ct, object_id=object_id, role_id=role_id) for role_id, codename, eval_ct in new_evaluations
+        ]
+        logger.debug(f'Adding {len(to_add)} object-permissions for new {instance._meta.model_name} {instance.pk}')
+        save_cache_updates(set(), to_add)
+
+
+def get_subtree_ids(instance) -> dict[Type[Model], list]:
+    "Returns primary keys of the instance and all its child objects, by model"
+    subtree_ids = {instance._meta.concrete_model: [instance.pk]}
+    for path, child_model in permission_registry.get_child_models(type(instance)):
+        child_ids = list(child_model.objects.filter(**{path: instance.pk}).values_list('pk', flat=True))
+        if child_ids:
+            subtree_ids[child_model._meta.concrete_model] = child_ids
+    return subtree_ids
+
+
+def parent_roles_filter(parent_gfks: list) -> Q:
+    q_filter = Q(pk__in=[])
+    for parent_ct, parent_id in parent_gfks:
+        q_filter |= Q(content_type=parent_ct, object_id=parent_id)
+    return q_filter
+
+
+def post_parent_change_move_obj_permissions(instance):
+    """
+    Incremental version of post_save_update_obj_permissions for an object that changed its parent object.
+    Only the evaluations for the object and its child objects, from roles on the old and new parent objects
+    (and roles that give membership to teams holding those), are deleted or added.
+    """
+    if instance._meta.model_name == permission_registry.team_model._meta.model_name:
+        # changing the organization of a team changes team membership, which affects many more roles
+        post_save_update_obj_permissions(instance)
+        return
+
+    parent_cls = permission_registry.get_parent_model(instance)
+    original_parent_id = instance.__rbac_original_parent_id
+    delattr(instance, '__rbac_original_parent_id')
+    old_parent_gfks = [(permission_registry.content_type_model.objects.get_for_model(parent_cls), original_parent_id)]
+    original_parent = parent_cls.objects.filter(pk=original_parent_id).first()
+    if original_parent:
+        old_parent_gfks += get_parent_ids(original_parent)
+
+    chain_roles = set(ObjectRole.objects.filter(parent_roles_filter(old_parent_gfks + get_parent_ids(instance))))
+    new_chain_roles = set(ObjectRole.objects.filter(parent_roles_filter(get_parent_ids(instance))))
+
+    subtree_ids = get_subtree_ids(instance)
+    subtree_q = Q(pk__in=[])
+    for model, ids in subtree_ids.items():
+        subtree_q |= Q(content_type=permission_registry.content_type_model.objects.get_for_model(model), object_id__in=[str(pk) for pk in ids])
+    subtree_roles = list(ObjectRole.objects.filter(subtree_q))
+
+    # Evaluations on objects in the subtree that each of the relevant roles gives, after the change
+    types_prefetch = TypesPrefetch()
+    source_evaluations = {}
+    for object_role in new_chain_roles:
+        source_evaluations[object_role.id] = set()
+        for permission, eval_ct, child_model, _ in object_role.child_permission_paths(types_prefetch):
+            for pk in subtree_ids.get(child_model._meta.concrete_model, []):
+                source_evaluations[object_role.id].add((permission.codename, eval_ct, pk))
+    for object_role in subtree_roles:
+        # all evaluations of roles for objects in the subtree are inside of the subtree
+        source_evaluations[object_role.id] = object_role.expected_direct_permissions(types_prefetch)
+
+    # Roles whose evaluations may change, and what they should be
+    to_update = {object_role.id: object_role for object_role in chain_roles}
+    to_update.update({object_role.id: object_role for object_role in ObjectRole.objects.filter(provides_teams__has_roles__in=chain_roles).distinct()})
+    expected = set()
+    for role_id in to_update:
+        for codename, ct_id, pk in source_evaluations.get(role_id, []):
+            expected.add((role_id, codename, ct_id, pk))
+    for role_id, team_role_id in ObjectRole.objects.filter(id__in=to_update.keys()).values_list('id', 'provides_teams__has_roles'):
+        for codename, ct_id, pk in source_evaluations.get(team_role_id, []):
+            expected.add((role_id, codename, ct_id, pk))
+
+    existing = {}
+    for model, ids in subtree_ids.items():
+        eval_cls = get_evaluation_model(model)
+        eval_ct = permission_registry.content_type_model.objects.get_for_model(model)
+        for evaluation in eval_cls.objects.filter(role_id__in=to_update.keys(), content_type_id=eval_ct.id, object_id__in=ids):
+            existing[(evaluation.role_id, evaluation.codename, evaluation.content_type_id, evaluation.object_id)] = evaluation
+
+    to_delete = set((existing[key].id, type(key[-1])) for key in set(existing.keys()) - expected)
+    to_add = [
+        RoleEvaluation(codename=codename, content_type_id=ct_id, object_id=pk, role_id=role_id)
+        for role_id, codename, ct_id, pk in expected - set(existing.keys())
+    ]
+    if to_delete or to_add:
+        clear_permission_cache()
+        logger.debug(f'Moving {instance._meta.model_name} {instance.pk}, adding {len(to_add)} and deleting {len(to_delete)} object-permissions')
+        save_cache_updates(to_delete, to_add)
+
+
 def rbac_pre_save_identify_changes(instance, *args, **kwargs):
     # Exit right away if object does not have any parent objects
     parent_field_name = permission_registry.get_parent_fd_name(instance)
@@ -221,7 +595,7 @@ def rbac_post_save_update_evaluations(instance, created, *args, **kwargs):
     # If child object is created and parent object has existing ObjectRoles
     # evaluations for the parent object roles need to be added
     if created:
-        post_save_update_obj_permissions(instance)
+        post_create_add_obj_permissions(instance)
         return
 
     # The parent object can not have changed if update_fields was given and did not list that field
@@ -233,11 +607,28 @@ def rbac_post_save_update_evaluations(instance, created, *args, **kwargs):
     current_parent_id = getattr(instance, f'{parent_field_name}_id')
     if hasattr(instance, '__rbac_original_parent_id') and instance.__rbac_original_parent_id != current_parent_id:
         logger.info(f'Object {instance} changed RBAC parent {instance.__rbac_original_parent_id}-->{current_parent_id}')
-        post_save_update_obj_permissions(instance)
+        post_parent_change_move_obj_permissions(instance)
+
+
+def delete_orphaned_object_roles(role_ids) -> int:
+    "Deletes those of the given object roles that have no users or teams assigned, returns the number deleted"
+    if not role_ids:
+        return 0
+    _, deleted_by_model = ObjectRole.objects.filter(id__in=role_ids, users__isnull=True, teams__isnull=True).delete()
+    return deleted_by_model.get(ObjectRole._meta.label, 0)
+
+
+def actor_pre_delete(instance, *args, **kwargs):
+    "Save the roles of a user or team, which may be orphaned by its deletion"
+    instance.__rbac_stashed_role_ids = list(instance.has_roles.values_list('id', flat=True))
 
 
 def team_pre_delete(instance, *args, **kwargs):
+    actor_pre_delete(instance)
     instance.__rbac_stashed_member_roles = list(instance.member_roles.all())
+    # Teams that this team gives membership to, which will lose members from this team
+    child_teams_qs = permission_registry.team_model.objects.filter(member_roles__in=instance.has_roles.all()).exclude(pk=instance.pk)
+    instance.__rbac_stashed_child_team_ids = set(child_teams_qs.values_list('pk', flat=True))
 
 
 def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
@@ -245,16 +636,20 @@ def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
     Call this when deleting an object to cascade delete its object roles
     Deleting a team can have consequences for the rest of the graph
     """
+    if rbac_batch_state:
+        rbac_batch_state.add_deleted(instance)
+        return
+
     if instance._meta.model_name == permission_registry.team_model._meta.model_name:
         indirectly_affected_roles = set()
         indirectly_affected_roles.update(team_ancestor_roles(instance))
         for team_role in instance.__rbac_stashed_member_roles:
             indirectly_affected_roles.update(team_role.descendent_roles())
-        compute_team_member_roles()
+        compute_team_member_roles(team_ids=instance.__rbac_stashed_child_team_ids)
         compute_object_role_permissions(object_roles=indirectly_affected_roles)
 
-        # Similar to user deletion, clean up any orphaned object roles
-        ObjectRole.objects.filter(users__isnull=True, teams__isnull=True).delete()
+        # Similar to user deletion, clean up any object roles orphaned by this deletion
+        delete_orphaned_object_roles(instance.__rbac_stashed_role_ids)
 
     ct = permission_registry.content_type_model.objects.get_for_model(instance)
     ObjectRole.objects.filter(content_type=ct, object_id=instance.pk).delete()
@@ -264,6 +659,9 @@ def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
         # Delete all evaluations from inherited permissions
         get_evaluation_model(instance).objects.filter(content_type_id=ct.id, object_id=instance.pk).delete()
 
+    # Memoized permissions and ids may reference the deleted object
+    clear_permission_cache()
+
 
 def rbac_post_user_delete(instance, *args, **kwargs):
     """
@@ -271,7 +669,11 @@ def rbac_post_user_delete(instance, *args, **kwargs):
     """
     # Any RoleUserAssignment entries will already be cascade deleted
     # Just clean up any object roles that may be orphaned by this deletion
-    ObjectRole.objects.filter(users__isnull=True, teams__isnull=True).delete()
+    role_ids = instance.__rbac_stashed_role_ids
+    if rbac_batch_state:
+        rbac_batch_state.deleted.orphan_candidate_ids.update(role_ids)
+        return
+    delete_orphaned_object_roles(role_ids)
 
 
 def post_migration_rbac_setup(sender, *args, **kwargs):
@@ -283,6 +685,10 @@ def post_migration_rbac_setup(sender, *args, **kwargs):
 
     dab_post_migrate.send(sender=sender)
 
+    # migrations may have changed role assignments without sending signals
+    invalidate_all_role_ids()
+    invalidate_global_permissions()
+    invalidate_types_prefetch()
     compute_team_member_roles()
     compute_object_role_permissions()
 
@@ -335,40 +741,44 @@ class TrackedRelationship:
         else:
             manager.remove(actor)
 
-    def _sync_actor_to_role(self, actor_model: type, instance: Model, action: str, pk_set: Optional[set[int]]):
+    def _sync_actor_to_role(self, actor_model: type, instance: Model, model: type, action: str, pk_set: Optional[set[int]], reverse: bool):
+        """
+        Give or remove the role for all the actors and objects changed by one m2m_changed signal
+        with one bulk assignment, so that cached data is computed once
+        """
         if self._active_sync_flag:
             return
         if action.startswith('pre_'):
             return
         rd = RoleDefinition.objects.get(name=self.role_name)
+        actor_fd = 'teams' if actor_model._meta.model_name == permission_registry.team_model._meta.model_name else 'users'
 
-        if action in ('post_add', 'post_remove'):
-            actor_set = pk_set
-        elif action == 'post_clear':
-            ct = permission_registry.content_type_model.objects.get_for_model(instance)
-            role = ObjectRole.objects.get(object_id=instance.pk, content_type=ct, role_definition=rd)
-            if actor_model._meta.model_name == 'team':
-                actor_set = set(role.teams.values_list('id', flat=True))
+        if not reverse:
+            content_objects = [instance]
+            if action == 'post_clear':
+                ct = permission_registry.content_type_model.objects.get_for_model(instance)
+                role = ObjectRole.objects.filter(object_id=instance.pk, content_type=ct, role_definition=rd).first()
+                actor_set = set(getattr(role, actor_fd).values_list('id', flat=True)) if role else set()
+            else:
+                actor_set = pk_set
+            actors = list(actor_model.objects.filter(pk__in=actor_set))
+        else:
+            actors = [instance]
+            if action == 'post_clear':
+                ct = permission_registry.content_type_model.objects.get_for_model(self.cls)
+                object_ids = ObjectRole.objects.filter(role_definition=rd, content_type=ct, **{actor_fd: instance}).values_list('object_id', flat=True)
+                content_objects = [self.cls(pk=self.cls._meta.pk.to_python(object_id)) for object_id in object_ids]
             else:
-                actor_set = set(role.users.values_list('id', flat=True))
+                content_objects = [model(pk=pk) for pk in pk_set]
 
         giving = bool(action == 'post_add')
-        for actor in actor_model.objects.filter(pk__in=actor_set):
-            rd.give_or_remove_permission(actor, instance, giving=giving, sync_action=True)
+        rd.give_or_remove_permissions_bulk(actors, content_objects, giving=giving, sync_action=True)
 
     def sync_team_to_role(self, instance: Model, action: str, model: type, pk_set: Optional[set[int]], reverse: bool, **kwargs):
-        if not reverse:
-            self._sync_actor_to_role(permission_registry.team_model, instance, action, pk_set)
-        else:
-            for pk in pk_set:
-                self._sync_actor_to_role(permission_registry.team_model, model(pk=pk), action, {instance.pk})
+        self._sync_actor_to_role(permission_registry.team_model, instance, model, action, pk_set, reverse)
 
     def sync_user_to_role(self, instance: Model, action: str, model: type, pk_set: Optional[set[int]], reverse: bool, **kwargs):
-        if not reverse:
-            self._sync_actor_to_role(permission_registry.user_model, instance, action, pk_set)
-        else:
-            for pk in pk_set:
-                self._sync_actor_to_role(permission_registry.user_model, model(pk=pk), action, {instance.pk})
+        self._sync_actor_to_role(permission_registry.user_model, instance, model, action, pk_set, reverse)
 
 
 def connect_rbac_signals(cls):
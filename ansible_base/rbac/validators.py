@@ -1,6 +1,6 @@
 import re
 from collections import defaultdict
-from typing import Optional, Type, Union
+from typing import Mapping, Optional, Type, Union
 
 from django.conf import settings
 from django.db.models import Model
@@ -25,9 +25,9 @@ def prnt_codenames(codename_set: set[str]) -> str:
     return ', '.join(codename_set)
 
 
-def codenames_for_cls(cls) -> list[str]:
+def codenames_for_cls(cls) -> tuple[str, ...]:
     "Helper method that gives the Django permission codenames for a given class"
-    return [t[0] for t in cls._meta.permissions] + [f'{act}_{cls._meta.model_name}' for act in cls._meta.default_permissions]
+    return permission_registry.get_codenames(cls)
 
 
 def permissions_allowed_for_system_role() -> dict[Type[Model], list[str]]:
@@ -42,14 +42,11 @@ def permissions_allowed_for_system_role() -> dict[Type[Model], list[str]]:
     return permissions_by_model
 
 
-def permissions_allowed_for_role(cls) -> dict[Type[Model], list[str]]:
-    "Permission codenames valid for a RoleDefinition of given class, organized by permission class"
+def compute_permissions_allowed_for_role(cls) -> dict[Type[Model], list[str]]:
+    "Used by the permission registry to build its table of permissions_allowed_for_role results"
     if cls is None:
         return permissions_allowed_for_system_role()
 
-    if not permission_registry.is_registered(cls):
-        raise ValidationError(f'Django-ansible-base RBAC does not track permissions for model {cls._meta.model_name}')
-
     # Include direct model permissions (except for add permission)
     permissions_by_model = defaultdict(list)
     permissions_by_model[cls] = [codename for codename in codenames_for_cls(cls) if not is_add_perm(codename)]
@@ -61,7 +58,14 @@ def permissions_allowed_for_role(cls) -> dict[Type[Model], list[str]]:
     return permissions_by_model
 
 
-def combine_values(data: dict[Type[Model], list[str]]) -> set[str]:
+def permissions_allowed_for_role(cls) -> Mapping[Type[Model], tuple[str, ...]]:
+    "Permission codenames valid for a RoleDefinition of given class, organized by permission class"
+    if cls is not None and not permission_registry.is_registered(cls):
+        raise ValidationError(f'Django-ansible-base RBAC does not track permissions for model {cls._meta.model_name}')
+    return permission_registry.get_allowed_permissions(cls)
+
+
+def combine_values(data: Mapping[Type[Model], tuple[str, ...]]) -> set[str]:
     "Utility method to merge everything in .values() into a single set"
     ret = set()
     for this_list in data.values():
@@ -88,7 +92,7 @@ def validate_role_definition_enabled(permissions, content_type) -> None:
                 raise ValidationError('Creating custom roles that include team permissions is disabled')
 
 
-def check_view_permission_criteria(codename_set: set[str], permissions_by_model: dict[Type[Model], list[str]]) -> None:
+def check_view_permission_criteria(codename_set: set[str], permissions_by_model: Mapping[Type[Model], tuple[str, ...]]) -> None:
     """Given a codename_set to be used in a role definition, enforce that view permission is included
 
     For example, a role can not give change permission to a thing without also giving view permission,
@@ -104,7 +108,7 @@ def check_view_permission_criteria(codename_set: set[str], permissions_by_model:
                 )
 
 
-def check_has_change_with_delete(codename_set: set[str], permissions_by_model: dict[Type[Model], list[str]]):
+def check_has_change_with_delete(codename_set: set[str], permissions_by_model: Mapping[Type[Model], tuple[str, ...]]):
     """Given a codename_set to be used in a role definition, include change if including delete
 
     We would like to get rid of this criteria eventually, but no harm in making it configurable.
@@ -192,9 +196,8 @@ def validate_codename_for_model(codename: str, model: Union[Model, Type[Model]])
             raise RuntimeError(f'Add permissions only valid for parent models, received for {model._meta.model_name}')
         return name
 
-    for rel, child_cls in permission_registry.get_child_models(model):
-        if name in codenames_for_cls(child_cls):
-            return name
+    if name in permission_registry.get_child_codenames(model):
+        return name
     raise RuntimeError(f'The permission {name} is not valid for model {model._meta.model_name}')
 
 
@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ansible_base.rbac.models import RoleDefinition
+from test_app.models import Inventory, Organization, User
+
+STRATEGIES = ('in', 'exists')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares query strategies of access_qs on generated data, the data is removed afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inventories', type=int, default=20000, help='Number of inventories to generate')
+        parser.add_argument('--small', type=int, default=20, help='Number of inventories the user with few permissions can see')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times each query is timed')
+
+    def time_query(self, get_queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(get_queryset().values_list('id', flat=True))
+            timings.append(time.perf_counter() - start)
+        return min(timings), statistics.median(timings)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        start = time.time()
+        org = Organization.objects.create(name='benchmark_org')
+        other_org = Organization.objects.create(name='benchmark_other_org')
+        count = options['inventories']
+        Inventory.objects.bulk_create([Inventory(name=f'benchmark_inv_{i}', organization=org if i % 2 else other_org) for i in range(count)])
+        inventories = list(Inventory.objects.filter(organization=org).order_by('id')[: options['small']])
+
+        org_rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_organization', 'view_inventory'],
+            name='benchmark-org-inventory-view',
+            content_type=ContentType.objects.get_for_model(Organization),
+            managed=True,
+        )
+        inv_rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_inventory'],
+            name='benchmark-inventory-view',
+            content_type=ContentType.objects.get_for_model(Inventory),
+            managed=True,
+        )
+        large_user = User.objects.create(username='benchmark_large')
+        small_user = User.objects.create(username='benchmark_small')
+        org_rd.give_permission(large_user, org)
+        inv_rd.give_permissions_bulk([small_user], inventories)
+        self.stdout.write(f'Created {count} inventories and their permissions in {time.time() - start:.2f} seconds')
+
+        self.stdout.write(f'{"user":<10} {"visible":>8} {"strategy":>9} {"min ms":>9} {"median ms":>10}')
+        for user in (small_user, large_user):
+            for strategy in STRATEGIES:
+                visible = Inventory.access_qs(user, strategy=strategy).count()
+                best, median = self.time_query(lambda: Inventory.access_qs(user, strategy=strategy), options['repeat'])
+                label = user.username.removeprefix('benchmark_')
+                self.stdout.write(f'{label:<10} {visible:>8} {strategy:>9} {best * 1000:>9.2f} {median * 1000:>10.2f}')
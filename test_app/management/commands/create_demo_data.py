@@ -9,6 +9,7 @@ from django.core.management.base import BaseCommand, CommandError
 from ansible_base.authentication.models import Authenticator, AuthenticatorUser
 from ansible_base.oauth2_provider.models import OAuth2Application
 from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.triggers import rbac_batch
 from test_app.models import EncryptionModel, InstanceGroup, Inventory, Organization, Team, User
 
 
@@ -90,13 +91,14 @@ class Command(BaseCommand):
 
         org_admin_user, _ = User.objects.get_or_create(username='org_admin')
         ig_admin_user, _ = User.objects.get_or_create(username='instance_group_admin')
-        RoleDefinition.objects.managed.org_admin.give_permission(org_admin_user, awx)
-        ig_admin.give_permission(ig_admin_user, isolated_group)
-        for user in (org_admin_user, ig_admin_user, spud):
-            user.set_password('password')
-            user.save()
+        with rbac_batch():
+            RoleDefinition.objects.managed.org_admin.give_permission(org_admin_user, awx)
+            ig_admin.give_permission(ig_admin_user, isolated_group)
+            for user in (org_admin_user, ig_admin_user, spud):
+                user.set_password('password')
+                user.save()
 
-        RoleDefinition.objects.managed.team_member.give_permission(spud, awx_devs)
+            RoleDefinition.objects.managed.team_member.give_permission(spud, awx_devs)
 
         OAuth2Application.objects.get_or_create(
             name="Demo OAuth2 Application",
@@ -88,6 +88,7 @@ MIDDLEWARE = [
     'crum.CurrentRequestUserMiddleware',
     'ansible_base.lib.middleware.logging.LogRequestMiddleware',
     'ansible_base.lib.middleware.logging.LogTracebackMiddleware',
+    'ansible_base.rbac.middleware.RBACPermissionCacheMiddleware',
 ]
 
 # set some vanilla social auth plugins so that we can test the social_auth based
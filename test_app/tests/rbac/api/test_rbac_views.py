@@ -1,8 +1,12 @@
+from unittest import mock
+
 import pytest
+from django.db import IntegrityError
 from django.test.utils import override_settings
 
 from ansible_base.lib.utils.response import get_relative_url
-from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.models import RoleDefinition, RoleTeamAssignment
+from test_app.models import Inventory, User
 
 
 @pytest.mark.django_db
@@ -81,6 +85,62 @@ def test_make_user_assignment(admin_api_client, inv_rd, rando, inventory):
     assert rando.has_obj_perm(inventory, 'change')
 
 
+@pytest.mark.django_db
+def test_make_bulk_user_assignments(admin_api_client, inv_rd, inventory, organization):
+    users = [User.objects.create(username=f'bulk-user-{i}') for i in range(3)]
+    other_inv = Inventory.objects.create(name='other-inv', organization=organization)
+    inv_rd.give_permission(users[0], inventory)  # an existing assignment is returned as-is
+    url = get_relative_url('roleuserassignment-list')
+    data = [dict(role_definition=inv_rd.id, user=u.id, object_id=inventory.id) for u in users]
+    data.append(dict(role_definition=inv_rd.id, user=users[0].id, object_id=other_inv.id))
+    response = admin_api_client.post(url, data=data, format="json")
+    assert response.status_code == 201, response.data
+    assert [item['user'] for item in response.data] == [u.id for u in users] + [users[0].id]
+    assert [int(item['object_id']) for item in response.data] == [inventory.id] * 3 + [other_inv.id]
+
+    for u in users:
+        assert u.has_obj_perm(inventory, 'change')
+    assert users[0].has_obj_perm(other_inv, 'change')
+    assert not users[1].has_obj_perm(other_inv, 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_assignments_not_partially_applied(user_api_client, user, inv_rd, member_rd, team, inventory, organization):
+    other_inv = Inventory.objects.create(name='other-inv', organization=organization)
+    inv_rd.give_permission(user, inventory)
+    member_rd.give_permission(user, team)
+    url = get_relative_url('roleteamassignment-list')
+    data = [dict(role_definition=inv_rd.id, team=team.id, object_id=inventory.id), dict(role_definition=inv_rd.id, team=team.id, object_id=other_inv.id)]
+    response = user_api_client.post(url, data=data, format="json")
+    # user can not see the second inventory, so no assignments are made
+    assert response.status_code == 400, response.data
+    assert 'object_id' in str(response.data)
+    assert not RoleTeamAssignment.objects.filter(team=team).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_assignments_empty_list(admin_api_client):
+    response = admin_api_client.post(get_relative_url('roleuserassignment-list'), data=[], format="json")
+    assert response.status_code == 400, response.data
+
+
+@pytest.mark.django_db
+def test_bulk_global_assignments_duplicate(admin_api_client, rando):
+    rd = RoleDefinition.objects.create_from_permissions(permissions=['change_inventory', 'view_inventory'], name='global-change-inv', content_type=None)
+    existing = rd.give_global_permission(rando)
+    url = get_relative_url('roleuserassignment-list')
+    data = [dict(role_definition=rd.id, user=rando.id), dict(role_definition=rd.id, user=rando.id)]
+    response = admin_api_client.post(url, data=data, format="json")
+    assert response.status_code == 201, response.data
+    assert [item['id'] for item in response.data] == [existing.id, existing.id]
+
+    # assignment made by another request at the same time
+    with mock.patch.object(RoleDefinition, 'give_global_permission', side_effect=IntegrityError):
+        response = admin_api_client.post(url, data=data, format="json")
+    assert response.status_code == 201, response.data
+    assert [item['id'] for item in response.data] == [existing.id, existing.id]
+
+
 @pytest.mark.django_db
 def test_invalid_user_assignment(admin_api_client, inv_rd, inventory):
     url = get_relative_url('roleuserassignment-list')
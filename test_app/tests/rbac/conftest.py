@@ -2,10 +2,18 @@ import pytest
 from django.contrib.auth import get_user_model
 
 from ansible_base.rbac import permission_registry
-from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.models import RoleDefinition, RoleEvaluation, RoleEvaluationUUID
 from test_app.models import Inventory, Organization
 
 
+def evaluation_snapshot():
+    "Returns the content of both evaluation tables, independent of the ids of the evaluations"
+    ret = set()
+    for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+        ret.update(set((eval_cls._meta.model_name,) + row for row in eval_cls.objects.values_list('role_id', 'codename', 'content_type_id', 'object_id')))
+    return ret
+
+
 @pytest.fixture
 def rando():
     return get_user_model().objects.create(username='rando')
@@ -0,0 +1,84 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+
+from ansible_base.lib.utils.response import get_relative_url
+from ansible_base.rbac import permission_registry
+from ansible_base.rbac.models import RecomputeQueueEntry
+from ansible_base.rbac.recompute_queue import get_recompute_status, process_recompute_queue
+from test_app.models import Inventory
+
+
+def run_worker(*args):
+    out = StringIO()
+    call_command('rbac_process_recompute_queue', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def inventories(organization, inv_rd, rando):
+    inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(3)]
+    inv_rd.give_permissions_bulk([rando], inventories)
+    return inventories
+
+
+@pytest.fixture(autouse=True)
+def queue_threshold():
+    with override_settings(ANSIBLE_BASE_EVALUATION_QUEUE_THRESHOLD=2):
+        yield
+
+
+@pytest.mark.django_db
+class TestRecomputeQueue:
+    def test_small_change_not_queued(self, inventory, inv_rd, rando):
+        inv_rd.give_permission(rando, inventory)
+        inv_rd.permissions.add(permission_registry.permission_qs.get(codename='delete_inventory'))
+        assert not RecomputeQueueEntry.objects.exists()
+        assert rando.has_obj_perm(inventory, 'delete')
+
+    def test_added_permission_given_by_worker(self, inventories, inv_rd, rando):
+        inv_rd.permissions.add(permission_registry.permission_qs.get(codename='delete_inventory'))
+        assert get_recompute_status(inv_rd) == {'status': 'pending', 'pending_object_roles': 3}
+        assert not any(rando.has_obj_perm(inv, 'delete') for inv in inventories)
+
+        assert 'Recomputed 3 object roles' in run_worker('--chunk-size', '2')
+        assert get_recompute_status(inv_rd) == {'status': 'complete', 'pending_object_roles': 0}
+        assert all(rando.has_obj_perm(inv, 'delete') for inv in inventories)
+
+    def test_removed_permission_taken_away_immediately(self, inventories, inv_rd, rando):
+        inv_rd.permissions.remove(permission_registry.permission_qs.get(codename='change_inventory'))
+        assert not any(rando.has_obj_perm(inv, 'change') for inv in inventories)
+        assert all(rando.has_obj_perm(inv, 'view') for inv in inventories)
+        assert get_recompute_status(inv_rd)['pending_object_roles'] == 3
+
+    def test_pessimistic_removal_restored(self, inventories, inv_rd, org_inv_rd, rando, organization):
+        "A permission the user also has from another role comes back after the recompute"
+        org_inv_rd.give_permission(rando, organization)
+        inv_rd.permissions.remove(permission_registry.permission_qs.get(codename='change_inventory'))
+        while process_recompute_queue(chunk_size=1):
+            pass
+        assert all(rando.has_obj_perm(inv, 'change') for inv in inventories)
+
+    def test_team_member_roles_queued(self, inventories, inv_rd, member_rd, team, rando):
+        team_user = permission_registry.user_model.objects.create(username='team-user')
+        member_rd.give_permission(team_user, team)
+        inv_rd.give_permission(team, inventories[0])
+        inv_rd.permissions.add(permission_registry.permission_qs.get(codename='delete_inventory'))
+        assert set(RecomputeQueueEntry.objects.values_list('object_role__role_definition', flat=True)) == {inv_rd.id, member_rd.id}
+        run_worker()
+        assert team_user.has_obj_perm(inventories[0], 'delete')
+
+    def test_role_definition_api_status(self, admin_api_client, inventories, inv_rd):
+        url = get_relative_url('roledefinition-detail', kwargs={'pk': inv_rd.pk})
+        response = admin_api_client.patch(url, data={'permissions': ['aap.view_inventory']}, format='json')
+        assert response.status_code == 200, response.data
+        assert response.data['recompute_status'] == {'status': 'pending', 'pending_object_roles': 3}
+
+        response = admin_api_client.get(get_relative_url('roledefinition-list'), data={'id': inv_rd.pk})
+        assert response.data['results'][0]['recompute_status']['pending_object_roles'] == 3
+
+        run_worker()
+        response = admin_api_client.get(url)
+        assert response.data['recompute_status'] == {'status': 'complete', 'pending_object_roles': 0}
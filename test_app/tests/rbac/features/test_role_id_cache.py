@@ -0,0 +1,101 @@
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ansible_base.rbac.role_id_cache import GLOBAL_GENERATION_KEY, actor_roles, get_user_role_ids, invalidate_all_role_ids, user_generation_key
+from test_app.models import Inventory, User
+
+
+@pytest.fixture
+def role_id_cache():
+    with override_settings(ANSIBLE_BASE_ROLE_ID_CACHE='default'):
+        caches['default'].clear()
+        yield caches['default']
+        caches['default'].clear()
+
+
+@pytest.mark.django_db
+class TestRoleIdCache:
+    def test_not_enabled(self, rando):
+        assert get_user_role_ids(rando) is None
+        assert list(actor_roles(rando)) == []
+
+    def test_ids_are_saved(self, role_id_cache, rando, inventory, inv_rd, django_assert_num_queries):
+        assignment = inv_rd.give_permission(rando, inventory)
+        assert get_user_role_ids(rando) == [assignment.object_role_id]
+        with django_assert_num_queries(0):
+            assert get_user_role_ids(rando) == [assignment.object_role_id]
+        with CaptureQueriesContext(connection) as ctx:
+            assert rando.has_obj_perm(inventory, 'change')
+        # the role ids are given to the database as literals
+        evaluation_sql = ctx.captured_queries[-1]['sql']
+        assert 'roleevaluation' in evaluation_sql
+        assert 'roleuserassignment' not in evaluation_sql
+
+    @pytest.mark.parametrize('method', ['single', 'bulk'])
+    def test_assignments_invalidate(self, role_id_cache, rando, organization, inv_rd, method):
+        inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(2)]
+        assert get_user_role_ids(rando) == []
+        if method == 'single':
+            inv_rd.give_permission(rando, inventories[0])
+            inv_rd.give_permission(rando, inventories[1])
+        else:
+            inv_rd.give_permissions_bulk([rando], inventories)
+        assert all(rando.has_obj_perm(inv, 'change') for inv in inventories)
+        assert len(get_user_role_ids(rando)) == 2
+
+        if method == 'single':
+            inv_rd.remove_permission(rando, inventories[0])
+        else:
+            inv_rd.remove_permissions_bulk([rando], inventories[:1])
+        assert not rando.has_obj_perm(inventories[0], 'change')
+        assert rando.has_obj_perm(inventories[1], 'change')
+
+    def test_object_deletion_invalidates(self, role_id_cache, rando, inventory, inv_rd):
+        inv_rd.give_permission(rando, inventory)
+        assert len(get_user_role_ids(rando)) == 1
+        inventory.delete()
+        assert get_user_role_ids(rando) == []
+
+    def test_team_membership(self, role_id_cache, rando, team, inventory, inv_rd, member_rd):
+        "Team membership is in evaluations of roles the user already has, so those ids are still correct"
+        member_rd.give_permission(rando, team)
+        role_ids = get_user_role_ids(rando)
+        inv_rd.give_permission(team, inventory)
+        assert get_user_role_ids(rando) == role_ids
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_too_many_roles(self, role_id_cache, rando, organization, inv_rd):
+        inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(3)]
+        inv_rd.give_permissions_bulk([rando], inventories)
+        with override_settings(ANSIBLE_BASE_ROLE_ID_CACHE_MAX_SIZE=2):
+            assert get_user_role_ids(rando) is None
+            assert all(rando.has_obj_perm(inv, 'change') for inv in inventories)
+
+    def test_global_invalidation(self, role_id_cache, rando, inventory, inv_rd):
+        inv_rd.give_permission(rando, inventory)
+        get_user_role_ids(rando)
+        # simulate assignments changed without signals, like by a migration
+        other_user = User.objects.create(username='other-user')
+        inv_rd.object_roles.first().users.through.objects.filter(user=rando).update(user=other_user)
+        invalidate_all_role_ids()
+        assert get_user_role_ids(rando) == []
+
+    @pytest.mark.parametrize('evicted_key', ['user', 'global'])
+    def test_evicted_generation(self, role_id_cache, rando, inventory, inv_rd, evicted_key):
+        inv_rd.give_permission(rando, inventory)
+        role_id_cache.clear()  # ids are saved when no generation exists yet
+        assert len(get_user_role_ids(rando)) == 1
+        # assignments changed without signals, then the generation is evicted from the cache
+        other_user = User.objects.create(username='other-user')
+        inv_rd.object_roles.first().users.through.objects.filter(user=rando).update(user=other_user)
+        role_id_cache.delete(user_generation_key(rando.pk) if evicted_key == 'user' else GLOBAL_GENERATION_KEY)
+        assert get_user_role_ids(rando) == []
+
+    def test_cache_without_storage(self, rando, inventory, inv_rd):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}, ANSIBLE_BASE_ROLE_ID_CACHE='default'):
+            inv_rd.give_permission(rando, inventory)
+            assert len(get_user_role_ids(rando)) == 1
+            assert rando.has_obj_perm(inventory, 'change')
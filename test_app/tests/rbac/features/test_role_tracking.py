@@ -1,6 +1,10 @@
+from unittest import mock
+
 import pytest
 
 from ansible_base.rbac import permission_registry
+from ansible_base.rbac.caching import compute_object_role_permissions
+from test_app.models import Organization
 
 
 @pytest.mark.django_db
@@ -71,3 +75,27 @@ def test_add_organization_member_to_relationship(rando, organization, org_member
     object_role = org_member_rd.object_roles.first()
     assert rando in object_role.users.all()
     assert rando.has_obj_perm(organization, 'member')
+
+
+@pytest.mark.django_db
+def test_add_many_users_to_relationship(team, inventory, inv_rd, member_rd):
+    inv_rd.give_permission(team, inventory)
+    users = [permission_registry.user_model.objects.create(username=f'member-{i}') for i in range(5)]
+    with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions', wraps=compute_object_role_permissions) as mck:
+        team.users.add(*users)
+    mck.assert_called_once()
+    assert all(user.has_obj_perm(inventory, 'change_inventory') for user in users)
+
+    team.users.remove(*users[:3])
+    assert [user.has_obj_perm(inventory, 'change_inventory') for user in users] == [False, False, False, True, True]
+
+
+@pytest.mark.django_db
+def test_reverse_relationship_many_objects(rando, org_member_rd):
+    organizations = [Organization.objects.create(name=f'member-org-{i}') for i in range(3)]
+    rando.member_of_organizations.add(*organizations)
+    assert all(rando.has_obj_perm(organization, 'member') for organization in organizations)
+
+    rando.member_of_organizations.clear()
+    assert not any(rando.has_obj_perm(organization, 'member') for organization in organizations)
+    assert not org_member_rd.object_roles.exists()
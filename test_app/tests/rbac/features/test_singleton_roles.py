@@ -1,9 +1,12 @@
 import pytest
+from django.core.cache import caches
+from django.test import override_settings
 from rest_framework.exceptions import ValidationError
 
 from ansible_base.lib.utils.response import get_relative_url
 from ansible_base.rbac import permission_registry
 from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.role_id_cache import GLOBAL_PERMISSIONS_GENERATION_KEY, user_generation_key
 from test_app.models import Inventory, Organization, User
 
 
@@ -119,3 +122,76 @@ def test_remove_invalid_user_singleton_assignment(rando, global_inv_rd):
 
     # should still be able to remove the permission, even if the configuration is invalid
     global_inv_rd.remove_global_permission(rando)
+
+
+@pytest.mark.django_db
+def test_team_change_seen_by_all_user_objects(rando, organization, team, global_inv_rd, org_team_member_rd):
+    org_team_member_rd.give_permission(rando, organization)
+    other_rando = User.objects.get(pk=rando.pk)
+    assert rando.singleton_permissions() == set()
+    assert other_rando.singleton_permissions() == set()
+
+    global_inv_rd.give_global_permission(team)
+    assert rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+    assert other_rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+
+@pytest.mark.django_db
+class TestGlobalPermissionsCache:
+    @pytest.fixture(autouse=True)
+    def global_permissions_cache(self):
+        with override_settings(ANSIBLE_BASE_GLOBAL_PERMISSIONS_CACHE='default'):
+            caches['default'].clear()
+            yield caches['default']
+            caches['default'].clear()
+
+    def test_shared_by_user_objects(self, rando, global_inv_rd, django_assert_num_queries):
+        global_inv_rd.give_global_permission(rando)
+        assert rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+        other_rando = User.objects.get(pk=rando.pk)
+        with django_assert_num_queries(0):
+            assert other_rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+    def test_user_assignment(self, rando, global_inv_rd):
+        assert rando.singleton_permissions() == set()
+        global_inv_rd.give_global_permission(rando)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+        global_inv_rd.remove_global_permission(rando)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == set()
+
+    def test_team_assignment(self, rando, organization, team, global_inv_rd, org_team_member_rd):
+        org_team_member_rd.give_permission(rando, organization)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == set()
+        global_inv_rd.give_global_permission(team)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+    def test_team_membership(self, rando, organization, team, global_inv_rd, org_team_member_rd, member_rd):
+        global_inv_rd.give_global_permission(team)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == set()
+        org_team_member_rd.give_permission(rando, organization)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+        # membership through another team
+        org_team_member_rd.remove_permission(rando, organization)
+        parent_team = permission_registry.team_model.objects.create(name='parent-team', organization=organization)
+        member_rd.give_permission(rando, parent_team)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == set()
+        member_rd.give_permission(parent_team, team)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+    def test_role_definition_permissions_change(self, rando, global_inv_rd):
+        global_inv_rd.give_global_permission(rando)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+        global_inv_rd.permissions.remove(permission_registry.permission_qs.get(codename='change_inventory'))
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'view_inventory'}
+
+    @pytest.mark.parametrize('evicted_key', ['user', 'global'])
+    def test_evicted_generation(self, global_permissions_cache, rando, global_inv_rd, evicted_key):
+        global_inv_rd.give_global_permission(rando)
+        global_permissions_cache.clear()  # permissions are saved when no generation exists yet
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == {'change_inventory', 'view_inventory'}
+        # assignment removed without signals, then the generation is evicted from the cache
+        other_user = User.objects.create(username='other-user')
+        global_inv_rd.user_assignments.filter(user=rando).update(user=other_user)
+        global_permissions_cache.delete(user_generation_key(rando.pk) if evicted_key == 'user' else GLOBAL_PERMISSIONS_GENERATION_KEY)
+        assert User.objects.get(pk=rando.pk).singleton_permissions() == set()
@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ansible_base.rbac import prefetch
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import DABPermission, RoleDefinition
+from ansible_base.rbac.prefetch import TYPES_PREFETCH_GENERATION_KEY, TypesPrefetch
+
+
+@pytest.fixture
+def types_prefetch_cache():
+    with override_settings(ANSIBLE_BASE_TYPES_PREFETCH_CACHE='default'):
+        caches['default'].clear()
+        prefetch.types_prefetch_snapshot = None
+        prefetch.types_prefetch_state.changed_in_transaction = False
+        yield caches['default']
+        caches['default'].clear()
+        prefetch.types_prefetch_snapshot = None
+
+
+def role_definition_queries(ctx):
+    return [query for query in ctx.captured_queries if 'FROM "dab_rbac_roledefinition"' in query['sql']]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTypesPrefetchCache:
+    def test_not_enabled(self, inventory, inv_rd, rando):
+        assignment = inv_rd.give_permission(rando, inventory)
+        with CaptureQueriesContext(connection) as ctx:
+            compute_object_role_permissions(object_roles=[assignment.object_role])
+        assert role_definition_queries(ctx)
+
+    def test_snapshot_is_reused(self, types_prefetch_cache, inventory, inv_rd, rando):
+        assignment = inv_rd.give_permission(rando, inventory)
+        TypesPrefetch.from_snapshot(RoleDefinition)
+        with CaptureQueriesContext(connection) as ctx:
+            compute_object_role_permissions(object_roles=[assignment.object_role])
+        assert not role_definition_queries(ctx)
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_permission_change_invalidates(self, types_prefetch_cache, inventory, inv_rd, rando):
+        inv_rd.give_permission(rando, inventory)
+        TypesPrefetch.from_snapshot(RoleDefinition)
+        inv_rd.permissions.add(DABPermission.objects.get(codename='delete_inventory'))
+        assert rando.has_obj_perm(inventory, 'delete')
+        assert 'delete_inventory' in [perm.codename for perm in TypesPrefetch.from_snapshot(RoleDefinition)._permissions.values()]
+
+    def test_change_in_transaction_not_saved(self, types_prefetch_cache, inventory, inv_rd):
+        TypesPrefetch.from_snapshot(RoleDefinition)
+        with transaction.atomic():
+            inv_rd.permissions.add(DABPermission.objects.get(codename='delete_inventory'))
+            TypesPrefetch.from_snapshot(RoleDefinition)
+            assert prefetch.types_prefetch_snapshot is None
+        TypesPrefetch.from_snapshot(RoleDefinition)
+        assert prefetch.types_prefetch_snapshot is not None
+
+    def test_evicted_generation(self, types_prefetch_cache, inventory, inv_rd):
+        types_prefetch_cache.clear()  # snapshot is saved when no generation exists yet
+        TypesPrefetch.from_snapshot(RoleDefinition)
+        # permissions changed by another process, then the generation is evicted from the cache
+        with mock.patch('ansible_base.rbac.triggers.invalidate_types_prefetch'):
+            inv_rd.permissions.add(DABPermission.objects.get(codename='delete_inventory'))
+        types_prefetch_cache.delete(TYPES_PREFETCH_GENERATION_KEY)
+        assert 'delete_inventory' in [perm.codename for perm in TypesPrefetch.from_snapshot(RoleDefinition)._permissions.values()]
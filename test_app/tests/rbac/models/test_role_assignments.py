@@ -1,6 +1,9 @@
+from unittest import mock
+
 import pytest
 
-from ansible_base.rbac.models import RoleUserAssignment
+from ansible_base.rbac.models import ObjectRole, RoleEvaluation, RoleUserAssignment
+from test_app.models import Inventory, Team, User
 
 
 @pytest.mark.django_db
@@ -15,3 +18,52 @@ def test_load_assignment_property(rando, inventory, inv_rd, global_inv_rd):
     assignment = inv_rd.give_permission(rando, inventory)
     global_inv_rd.give_global_permission(rando)
     assert str(assignment.object_id) in [asmt.object_id for asmt in RoleUserAssignment.objects.only('object_id')]
+
+
+@pytest.mark.django_db
+class TestBulkAssignments:
+    def test_give_permissions_bulk(self, system_user, inventory, inv_rd, team, organization):
+        users = [User.objects.create(username=f'bulk-user-{i}') for i in range(4)]
+        other_inv = Inventory.objects.create(name='other-inv', organization=organization)
+        inv_rd.give_permission(users[0], inventory)
+        assignments = inv_rd.give_permissions_bulk(users + [team], [inventory, other_inv])
+        assert len(assignments) == 10
+        for u in users:
+            assert u.has_obj_perm(inventory, 'change')
+            assert u.has_obj_perm(other_inv, 'change')
+        assert set(Inventory.access_qs(team, 'change')) == {inventory, other_inv}
+        assert set(assignment.created_by_id for assignment in assignments) == {system_user.id}
+        assert ObjectRole.objects.filter(role_definition=inv_rd).count() == 2
+
+        inv_rd.remove_permissions_bulk(users[1:], [inventory, other_inv])
+        assert users[0].has_obj_perm(inventory, 'change')
+        assert not users[1].has_obj_perm(inventory, 'change')
+        inv_rd.remove_permissions_bulk([users[0], team], [inventory, other_inv])
+        assert not ObjectRole.objects.filter(role_definition=inv_rd).exists()
+
+    def test_bulk_matches_single_assignment(self, inventory, inv_rd, member_rd, organization, rando):
+        "Cached data from bulk team-member assignments should be the same as giving them one-by-one"
+        teams = [Team.objects.create(name=f'bulk-team-{i}', organization=organization) for i in range(3)]
+        member_rd.give_permission(rando, teams[0])
+        inv_rd.give_permission(teams[2], inventory)
+
+        member_rd.give_permissions_bulk(teams[:1], teams[1:])
+        assert rando.has_obj_perm(inventory, 'change')
+        bulk_evaluations = set(RoleEvaluation.objects.values_list('role__role_definition_id', 'role__object_id', 'codename', 'object_id'))
+        bulk_memberships = set(ObjectRole.provides_teams.through.objects.values_list('objectrole__role_definition_id', 'objectrole__object_id', 'team_id'))
+
+        member_rd.remove_permissions_bulk(teams[:1], teams[1:])
+        assert not rando.has_obj_perm(inventory, 'change')
+        for child_team in teams[1:]:
+            member_rd.give_permission(teams[0], child_team)
+        # object roles are re-created, so compare by object role content
+        assert (
+            set(ObjectRole.provides_teams.through.objects.values_list('objectrole__role_definition_id', 'objectrole__object_id', 'team_id')) == bulk_memberships
+        )
+        assert set(RoleEvaluation.objects.values_list('role__role_definition_id', 'role__object_id', 'codename', 'object_id')) == bulk_evaluations
+
+    def test_bulk_recomputes_once(self, inventory, inv_rd):
+        users = [User.objects.create(username=f'bulk-user-{i}') for i in range(5)]
+        with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions') as mck:
+            inv_rd.give_permissions_bulk(users, [inventory])
+        mck.assert_called_once()
@@ -1,8 +1,11 @@
+from unittest import mock
+
 import pytest
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.exceptions import ValidationError
 
 from ansible_base.rbac import permission_registry
+from ansible_base.rbac.caching import compute_object_role_permissions
 from ansible_base.rbac.models import DABPermission, ObjectRole, RoleDefinition, RoleEvaluation
 from ansible_base.rbac.validators import validate_permissions_for_model
 from test_app.models import ExampleEvent, Organization
@@ -106,3 +109,40 @@ def test_change_role_definition_member_permission(organization, inventory, org_t
     # Adding it back restores them
     member_rd.permissions.add(member_perm)
     assert [u.has_obj_perm(inventory, 'change') for u in (team_user, org_team_user)] == [True, True]
+
+
+@pytest.mark.django_db
+def test_clear_role_definition_permissions(organization, team, inventory, member_rd, org_inv_rd, inv_rd):
+    team_user = permission_registry.user_model.objects.create(username='team-user')
+    other_user = permission_registry.user_model.objects.create(username='other-user')
+
+    org_inv_rd.give_permission(team, organization)
+    member_rd.give_permission(team_user, team)
+    inv_rd.give_permission(other_user, inventory)
+
+    with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions', wraps=compute_object_role_permissions) as compute_mock:
+        org_inv_rd.permissions.set([permission_registry.permission_qs.get(codename='view_inventory')], clear=True)
+    # Only roles of this role definition, and roles of teams it applies to, are recomputed
+    recomputed = compute_mock.call_args.kwargs['object_roles']
+    assert recomputed == set(ObjectRole.objects.filter(role_definition__in=[org_inv_rd, member_rd]))
+
+    assert team_user.has_obj_perm(inventory, 'view')
+    assert not team_user.has_obj_perm(inventory, 'change')
+    assert other_user.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_clear_role_definition_member_permission(organization, inventory, org_team_member_rd, member_rd, inv_rd):
+    team_user = permission_registry.user_model.objects.create(username='team-user')
+    org_team_user = permission_registry.user_model.objects.create(username='org-team-user')
+    team = permission_registry.team_model.objects.create(name='ateam', organization=organization)
+    org_team = permission_registry.team_model.objects.create(name='org-team', organization=organization)
+
+    inv_rd.give_permission(team, inventory)
+    org_team_member_rd.give_permission(org_team, organization)
+    member_rd.give_permission(org_team_user, org_team)
+    member_rd.give_permission(team_user, team)
+    assert [u.has_obj_perm(inventory, 'change') for u in (team_user, org_team_user)] == [True, True]
+
+    member_rd.permissions.set([permission_registry.permission_qs.get(codename='view_team')], clear=True)
+    assert [u.has_obj_perm(inventory, 'change') for u in (team_user, org_team_user)] == [False, False]
@@ -0,0 +1,163 @@
+import logging
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ansible_base.rbac.caching import (
+    compute_all_object_role_permissions,
+    compute_all_team_member_roles,
+    compute_object_role_permissions,
+    compute_team_member_roles,
+    get_descendent_team_ids,
+)
+from ansible_base.rbac.models import ObjectRole, RoleEvaluation, TeamAncestor
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import Inventory, Organization
+from test_app.tests.rbac.conftest import evaluation_snapshot
+
+
+def team_member_role_snapshot():
+    "Returns the full content of the ObjectRole.provides_teams relationship"
+    through_model = ObjectRole.provides_teams.through
+    return set(through_model.objects.values_list('objectrole_id', 'team_id'))
+
+
+def team_ancestor_snapshot():
+    return set(TeamAncestor.objects.values_list('team_id', 'ancestor_id', 'depth'))
+
+
+@pytest.fixture
+def team_graph(organization, member_rd, org_team_member_rd, rando):
+    """Nest teams in a chain with a loop at the end, and some organization-level membership
+
+    team-0 --> team-1 --> team-2 --> team-3 <--> team-4
+    other-team (in another organization), gets members from the organization member_team role
+    """
+    teams = [permission_registry.team_model.objects.create(name=f'team-{i}', organization=organization) for i in range(5)]
+    for parent_team, child_team in zip(teams[:-1], teams[1:]):
+        member_rd.give_permission(parent_team, child_team)
+    member_rd.give_permission(teams[4], teams[3])
+    member_rd.give_permission(rando, teams[0])
+
+    other_org = Organization.objects.create(name='other-org')
+    other_team = permission_registry.team_model.objects.create(name='other-team', organization=other_org)
+    org_team_member_rd.give_permission(teams[2], other_org)
+    return teams + [other_team]
+
+
+@pytest.mark.django_db
+class TestScopedTeamMemberRoles:
+    def test_descendent_teams(self, team_graph):
+        assert get_descendent_team_ids([team_graph[0].id]) == set(team.id for team in team_graph)
+        assert get_descendent_team_ids([team_graph[3].id]) == set([team_graph[3].id, team_graph[4].id])
+        assert get_descendent_team_ids([team_graph[5].id]) == set([team_graph[5].id])
+
+    def test_signals_match_global_rebuild(self, team_graph, member_rd):
+        member_rd.remove_permission(team_graph[1], team_graph[2])
+        team_graph[4].delete()
+        expected = team_member_role_snapshot()
+        expected_ancestors = team_ancestor_snapshot()
+        ObjectRole.provides_teams.through.objects.all().delete()
+        TeamAncestor.objects.all().delete()
+        compute_all_team_member_roles()
+        assert team_member_role_snapshot() == expected
+        assert team_ancestor_snapshot() == expected_ancestors
+
+    def test_team_ancestors(self, team_graph):
+        ancestors = {}
+        for team_id, ancestor_id, depth in team_ancestor_snapshot():
+            ancestors.setdefault(team_id, {})[ancestor_id] = depth
+        teams = [team.id for team in team_graph]
+        assert ancestors[teams[2]] == {teams[1]: 1, teams[0]: 2}
+        # teams in the loop are their own ancestors
+        assert ancestors[teams[3]] == {teams[4]: 1, teams[3]: 2, teams[2]: 1, teams[1]: 2, teams[0]: 3}
+        assert ancestors[teams[4]] == {teams[3]: 1, teams[4]: 2, teams[2]: 2, teams[1]: 3, teams[0]: 4}
+        # membership from the organization role held by team-2
+        assert ancestors[teams[5]] == {teams[2]: 1, teams[1]: 2, teams[0]: 3}
+        assert teams[0] not in ancestors
+
+    @pytest.mark.parametrize('team_idx', [0, 2, 3, 5])
+    def test_scoped_rebuild_from_empty(self, team_graph, team_idx):
+        expected = team_member_role_snapshot()
+        affected_ids = get_descendent_team_ids([team_graph[team_idx].id])
+        expected_ancestors = team_ancestor_snapshot()
+        ObjectRole.provides_teams.through.objects.filter(team_id__in=affected_ids).delete()
+        # saved ancestors are used to find affected teams, so those entries can only be made wrong
+        TeamAncestor.objects.filter(team_id__in=affected_ids).update(depth=99)
+        compute_team_member_roles(team_ids=[team_graph[team_idx].id])
+        assert team_member_role_snapshot() == expected
+        assert team_ancestor_snapshot() == expected_ancestors
+
+    def test_scoped_by_object_role(self, team_graph, organization, org_team_member_rd, rando):
+        assignment = org_team_member_rd.give_permission(rando, organization)
+        expected = team_member_role_snapshot()
+        assert set(assignment.object_role.provides_teams.all()) == set(team_graph)
+
+        ObjectRole.provides_teams.through.objects.all().delete()
+        compute_team_member_roles(object_roles=[assignment.object_role])
+        # all teams are in the organization, or are members of those teams
+        assert team_member_role_snapshot() == expected
+
+    def test_unaffected_teams_not_queried(self, team_graph, django_assert_max_num_queries):
+        new_org = Organization.objects.create(name='new-org')
+        lone_team = permission_registry.team_model.objects.create(name='lone-team', organization=new_org)
+        # the team is not related to the team graph, so the number of queries is independent of it
+        with django_assert_max_num_queries(8):
+            compute_team_member_roles(team_ids=[lone_team.id])
+
+
+@pytest.mark.django_db
+class TestChunkedRebuild:
+    def test_chunked_rebuild(self, team_graph, inventory, inv_rd, caplog):
+        inv_rd.give_permission(team_graph[3], inventory)
+        expected = evaluation_snapshot()
+        RoleEvaluation.objects.all().delete()
+        RoleEvaluation.objects.create(role=ObjectRole.objects.first(), codename='delete_inventory', content_type_id=1, object_id=12345)
+
+        with caplog.at_level(logging.INFO, logger='ansible_base.rbac.caching'):
+            compute_all_object_role_permissions(chunk_size=2)
+        assert evaluation_snapshot() == expected
+
+        role_ct = ObjectRole.objects.count()
+        progress_logs = [record.message for record in caplog.records if record.message.startswith('Processed')]
+        assert len(progress_logs) == (role_ct + 1) // 2
+        assert progress_logs[-1].startswith(f'Processed {role_ct} object roles, added {len(expected)} and deleted 1 object-permission records')
+
+    def test_child_objects_fetched_once(self, org_inv_rd, rando):
+        organizations = [Organization.objects.create(name=f'org-{i}') for i in range(3)]
+        for organization in organizations:
+            for i in range(2):
+                Inventory.objects.create(name=f'{organization.name}-inv-{i}', organization=organization)
+            org_inv_rd.give_permission(rando, organization)
+        expected = evaluation_snapshot()
+        RoleEvaluation.objects.all().delete()
+
+        object_roles = list(ObjectRole.objects.filter(role_definition=org_inv_rd))
+        with CaptureQueriesContext(connection) as ctx:
+            compute_object_role_permissions(object_roles=object_roles)
+        assert evaluation_snapshot() == expected
+        # inventories of all organizations are fetched in one query
+        assert len([query for query in ctx.captured_queries if query['sql'].startswith('SELECT') and 'FROM "test_app_inventory"' in query['sql']]) == 1
+
+    def test_queries_independent_of_role_count(self, org_inv_rd, inv_rd, member_rd, rando):
+        team = permission_registry.team_model.objects.create(name='inv-team', organization=Organization.objects.create(name='team-org'))
+        member_assignment = member_rd.give_permission(rando, team)
+        organizations = [Organization.objects.create(name=f'org-{i}') for i in range(4)]
+        for organization in organizations:
+            inv_rd.give_permission(team, Inventory.objects.create(name=f'{organization.name}-inv', organization=organization))
+            org_inv_rd.give_permission(rando, organization)
+            org_inv_rd.give_permission(team, organization)
+
+        expected = evaluation_snapshot()
+        query_counts = []
+        for orgs in (organizations[:1], organizations):
+            # the team member role has evaluations for all the roles the team has
+            object_roles = [member_assignment.object_role]
+            object_roles += list(ObjectRole.objects.filter(object_id__in=[str(org.id) for org in orgs], content_type_id=permission_registry.org_ct_id))
+            RoleEvaluation.objects.filter(role__in=object_roles).delete()
+            with CaptureQueriesContext(connection) as ctx:
+                compute_object_role_permissions(object_roles=object_roles)
+            query_counts.append(len(ctx.captured_queries))
+            assert evaluation_snapshot() == expected
+        assert query_counts[0] == query_counts[1]
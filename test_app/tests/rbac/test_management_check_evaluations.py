@@ -0,0 +1,53 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from ansible_base.rbac.models import RoleEvaluation, RoleEvaluationUUID
+from test_app.models import UUIDModel
+
+
+def run_check(*args):
+    out = StringIO()
+    call_command('rbac_check_evaluations', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def evaluation_data(rando, team, member_rd, organization, org_inv_rd, inventory, inv_rd):
+    UUIDModel.objects.create(organization=organization)
+    member_rd.give_permission(rando, team)
+    org_inv_rd.give_permission(team, organization)
+    inv_rd.give_permission(rando, inventory)
+
+
+@pytest.mark.django_db
+class TestCheckEvaluations:
+    def test_no_drift(self, evaluation_data):
+        assert 'All role evaluations are correct' in run_check()
+
+    def test_check_does_not_write(self, evaluation_data):
+        RoleEvaluation.objects.filter(codename='change_inventory').delete()
+        before = set(RoleEvaluation.objects.values_list('id', flat=True))
+        with pytest.raises(CommandError):
+            run_check()
+        assert set(RoleEvaluation.objects.values_list('id', flat=True)) == before
+
+    def test_repair_only_drifted_roles(self, evaluation_data, rando, inventory):
+        member_role = rando.has_roles.get(role_definition__name__icontains='member')
+        inv_role = rando.has_roles.get(content_type__model='inventory')
+        inv_role.permission_partials.filter(codename='change_inventory').delete()
+        RoleEvaluationUUID.objects.create(role=member_role, codename='view_uuidmodel', content_type_id=1, object_id='6e1e4c1a-0d8c-4f63-9a49-6c1f4d0b6f6b')
+        untouched_ids = set(RoleEvaluation.objects.exclude(role__in=[member_role, inv_role]).values_list('id', flat=True))
+
+        out = StringIO()
+        call_command('rbac_check_evaluations', '--repair', stdout=out)
+        output = out.getvalue()
+        assert f'{inv_role} is missing 1 and has 0 unexpected evaluations' in output
+        assert f'{member_role} is missing 0 and has 1 unexpected evaluations' in output
+        assert 'Repaired evaluations for 2 object roles' in output
+
+        assert rando.has_obj_perm(inventory, 'change')
+        assert untouched_ids <= set(RoleEvaluation.objects.values_list('id', flat=True))
+        assert 'All role evaluations are correct' in run_check()
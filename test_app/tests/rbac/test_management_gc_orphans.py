@@ -0,0 +1,42 @@
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+
+from ansible_base.rbac.models import ObjectRole
+from test_app.models import Inventory
+
+
+def run_gc(*args):
+    out = StringIO()
+    call_command('rbac_gc_orphans', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def orphaned_roles(organization, inv_rd, rando):
+    "Object roles where assignments were removed without signals"
+    inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(5)]
+    for inv in inventories:
+        inv_rd.give_permission(rando, inv)
+    kept = inv_rd.give_permission(rando, Inventory.objects.create(name='kept-inv', organization=organization)).object_role
+    ObjectRole.users.through.objects.exclude(object_role=kept).delete()
+    return kept
+
+
+@pytest.mark.django_db
+class TestGCOrphans:
+    def test_delete_orphans(self, orphaned_roles):
+        assert 'Deleted 5 orphaned object roles' in run_gc('--chunk-size', '2')
+        assert list(ObjectRole.objects.all()) == [orphaned_roles]
+
+    def test_time_limit(self, orphaned_roles):
+        first_id = ObjectRole.objects.order_by('id').first().id
+        with mock.patch('ansible_base.rbac.management.commands.rbac_gc_orphans.time.monotonic', side_effect=[0, 100, 100]):
+            output = run_gc('--chunk-size', '1', '--time-limit', '10')
+        assert f'continue with --start-id {first_id}' in output
+        assert ObjectRole.objects.count() == 5
+
+        assert 'Deleted 4 orphaned object roles' in run_gc('--start-id', str(first_id))
+        assert list(ObjectRole.objects.all()) == [orphaned_roles]
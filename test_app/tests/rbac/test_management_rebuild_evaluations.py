@@ -0,0 +1,95 @@
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.management.commands.rbac_rebuild_evaluations import get_shard_ranges
+from ansible_base.rbac.models import ObjectRole, RoleEvaluation
+from test_app.models import Inventory
+from test_app.tests.rbac.conftest import evaluation_snapshot
+
+
+@pytest.fixture
+def inventory_roles(organization, inv_rd, rando):
+    for i in range(7):
+        inv = Inventory.objects.create(name=f'inv-{i}', organization=organization)
+        inv_rd.give_permission(rando, inv)
+    return list(ObjectRole.objects.order_by('id'))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('workers', [1, 2, 3, 7, 20])
+def test_shard_ranges(inventory_roles, workers):
+    shards = get_shard_ranges(workers)
+    assert len(shards) == min(workers, len(inventory_roles))
+    covered = []
+    for first_id, last_id in shards:
+        covered.extend(ObjectRole.objects.filter(id__gte=first_id, id__lte=last_id).order_by('id'))
+    assert covered == inventory_roles
+
+
+@pytest.mark.django_db
+def test_shard_ranges_no_roles():
+    assert get_shard_ranges(4) == []
+    assert get_shard_ranges(1) == []
+
+
+@pytest.mark.django_db
+def test_shard_ranges_with_gaps(inventory_roles):
+    "Ranges are split by the number of roles, not by the ids, so deleted roles do not make empty shards"
+    ObjectRole.objects.filter(id__in=[role.id for role in inventory_roles[1:5]]).delete()
+    remaining = list(ObjectRole.objects.order_by('id'))
+    shards = get_shard_ranges(3)
+    assert len(shards) == 3
+    assert shards[0][0] == remaining[0].id and shards[-1][1] == remaining[-1].id
+    for first_id, last_id in shards:
+        assert ObjectRole.objects.filter(id__gte=first_id, id__lte=last_id).count() == 1
+
+
+@pytest.mark.django_db
+def test_rebuild_evaluations(inventory_roles, rando):
+    expected = evaluation_snapshot()
+    RoleEvaluation.objects.all().delete()
+    assert not rando.has_obj_perm(Inventory.objects.first(), 'change')
+
+    out = StringIO()
+    call_command('rbac_rebuild_evaluations', '--workers=1', '--chunk-size=3', stdout=out)
+    assert evaluation_snapshot() == expected
+    assert f'processed {len(inventory_roles)} roles, added {len(expected)} and deleted 0 evaluations' in out.getvalue()
+
+
+def skip_for_in_memory_database():
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip('Worker processes can not connect to an in-memory database')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_evaluations_worker_processes(inventory_roles, rando):
+    skip_for_in_memory_database()
+    RoleEvaluation.objects.all().delete()
+    out = StringIO()
+    call_command('rbac_rebuild_evaluations', '--workers=2', '--chunk-size=3', stdout=out)
+    assert 'for 2 shards of object roles with 2 workers' in out.getvalue()
+    assert all(rando.has_obj_perm(inv, 'change') for inv in Inventory.objects.all())
+
+    snapshot = evaluation_snapshot()
+    compute_object_role_permissions()
+    assert evaluation_snapshot() == snapshot
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_evaluations_worker_error(inventory_roles):
+    # the patch is kept by the forked worker processes
+    with mock.patch('ansible_base.rbac.management.commands.rbac_rebuild_evaluations.rebuild_shard', side_effect=RuntimeError('shard failed')):
+        with pytest.raises(CommandError, match='failed in worker process: shard failed'):
+            call_command('rbac_rebuild_evaluations', '--workers=2', stdout=StringIO())
+
+
+@pytest.mark.django_db
+def test_rebuild_evaluations_invalid_workers():
+    with pytest.raises(CommandError):
+        call_command('rbac_rebuild_evaluations', '--workers=0', stdout=StringIO())
@@ -1,10 +1,13 @@
 import pytest
 from django.test.utils import override_settings
+from rest_framework.exceptions import ValidationError
 
 from ansible_base.lib.utils.models import is_add_perm
+from ansible_base.lib.utils.response import get_relative_url
+from ansible_base.rbac.evaluations import permission_cache, permission_cache_state
 from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry
-from test_app.models import Inventory, Organization
+from test_app.models import Inventory, Organization, UUIDModel, WeirdPerm
 
 
 @pytest.mark.django_db
@@ -219,3 +222,199 @@ class TestMultipleMemberRoles:
         assert not bob.has_obj_perm(inventory, 'change')
         assert not bob.has_obj_perm(team, 'member')
         assert not bob.has_obj_perm(organization, 'view')
+
+
+@pytest.mark.django_db
+class TestPermissionCache:
+    def test_has_obj_perm_memoized(self, rando, inventory, inv_rd, django_assert_num_queries):
+        inv_rd.give_permission(rando, inventory)
+        with permission_cache():
+            assert rando.has_obj_perm(inventory, 'change')
+            with django_assert_num_queries(0):
+                assert rando.has_obj_perm(inventory, 'change')
+                assert rando.has_obj_perm(inventory, 'change_inventory')
+        assert not permission_cache_state.obj_perms
+
+    def test_access_ids_qs_memoized(self, rando, inventory, inv_rd, django_assert_num_queries):
+        inv_rd.give_permission(rando, inventory)
+        with permission_cache():
+            assert list(Inventory.access_ids_qs(rando, 'change')) == [(inventory.id,)]
+            with django_assert_num_queries(0):
+                assert list(Inventory.access_ids_qs(rando, 'change')) == [(inventory.id,)]
+                assert Inventory.access_ids_qs(rando, 'change').exists()
+
+    def test_invalidated_by_assignment(self, rando, inventory, inv_rd):
+        with permission_cache():
+            assert not rando.has_obj_perm(inventory, 'change')
+            assert list(Inventory.access_ids_qs(rando, 'change')) == []
+            inv_rd.give_permission(rando, inventory)
+            assert rando.has_obj_perm(inventory, 'change')
+            assert list(Inventory.access_ids_qs(rando, 'change')) == [(inventory.id,)]
+            inv_rd.remove_permission(rando, inventory)
+            assert not rando.has_obj_perm(inventory, 'change')
+
+    def test_invalidated_by_global_assignment(self, rando, inventory):
+        rd = RoleDefinition.objects.create_from_permissions(permissions=['change_inventory', 'view_inventory'], name='global-change-inv')
+        with permission_cache():
+            assert not rando.has_obj_perm(inventory, 'change')
+            rd.give_global_permission(rando)
+            assert rando.has_obj_perm(inventory, 'change')
+
+    def test_middleware_clears_cache(self, user, user_api_client, inventory, inv_rd):
+        inv_rd.give_permission(user, inventory)
+        response = user_api_client.get(get_relative_url('inventory-detail', kwargs={'pk': inventory.pk}))
+        assert response.status_code == 200
+        assert not permission_cache_state
+        assert not permission_cache_state.singleton_perms
+
+
+@pytest.mark.django_db
+class TestBatchEvaluation:
+    @pytest.fixture
+    def inventories(self, organization):
+        return [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(4)]
+
+    def test_has_obj_perms(self, rando, inventories, inv_rd, view_inv_rd, django_assert_num_queries):
+        inv_rd.give_permission(rando, inventories[0])
+        view_inv_rd.give_permission(rando, inventories[1])
+        with django_assert_num_queries(3):  # global roles of user and teams, then evaluations
+            result = rando.has_obj_perms(inventories, 'change')
+        assert result == {inventories[0].pk: True, inventories[1].pk: False, inventories[2].pk: False, inventories[3].pk: False}
+        for inv in inventories:
+            assert result[inv.pk] == rando.has_obj_perm(inv, 'change')
+
+    def test_get_obj_perms(self, rando, inventories, inv_rd, view_inv_rd):
+        inv_rd.give_permission(rando, inventories[0])
+        view_inv_rd.give_permission(rando, inventories[1])
+        result = rando.get_obj_perms(inventories[:3], ['view', 'change_inventory', 'delete'])
+        assert result == {inventories[0].pk: {'view', 'change_inventory'}, inventories[1].pk: {'view'}, inventories[2].pk: set()}
+
+    def test_get_obj_perms_same_permission_twice(self, rando, inventories, inv_rd, admin_user):
+        inv_rd.give_permission(rando, inventories[0])
+        result = rando.get_obj_perms(inventories[:2], ['change', 'change_inventory'])
+        assert result == {inventories[0].pk: {'change', 'change_inventory'}, inventories[1].pk: set()}
+        assert admin_user.get_obj_perms(inventories[:1], ['change', 'aap.change_inventory']) == {inventories[0].pk: {'change', 'aap.change_inventory'}}
+
+    def test_superuser(self, admin_user, inventories, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            assert all(admin_user.has_obj_perms(inventories, 'delete').values())
+
+    def test_uuid_model(self, rando, organization, org_inv_rd):
+        objs = [UUIDModel.objects.create(organization=organization) for i in range(2)]
+        rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_uuidmodel'], name='see-uuid', content_type=permission_registry.content_type_model.objects.get_for_model(UUIDModel)
+        )
+        rd.give_permission(rando, objs[0])
+        assert rando.has_obj_perms(objs, 'view') == {objs[0].pk: True, objs[1].pk: False}
+
+    def test_pk_given_as_string(self, rando, organization, inventories, inv_rd):
+        obj = UUIDModel.objects.create(organization=organization)
+        rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_uuidmodel'], name='see-uuid', content_type=permission_registry.content_type_model.objects.get_for_model(UUIDModel)
+        )
+        rd.give_permission(rando, obj)
+        assert rando.has_obj_perms([UUIDModel(pk=str(obj.pk), organization=organization)], 'view') == {obj.pk: True}
+
+        inv_rd.give_permission(rando, inventories[0])
+        assert rando.get_obj_perms([Inventory(pk=str(inventories[0].pk))], ['change']) == {inventories[0].pk: {'change'}}
+
+    def test_populates_permission_cache(self, rando, inventories, inv_rd, django_assert_num_queries):
+        inv_rd.give_permission(rando, inventories[0])
+        with permission_cache():
+            rando.has_obj_perms(inventories, 'change')
+            with django_assert_num_queries(0):
+                assert rando.has_obj_perm(inventories[0], 'change')
+                assert not rando.has_obj_perm(inventories[1], 'change')
+
+    def test_empty_and_mixed(self, rando, inventory, organization):
+        assert rando.has_obj_perms([], 'view') == {}
+        with pytest.raises(ValidationError):
+            rando.has_obj_perms([inventory, organization], 'view')
+
+
+@pytest.mark.django_db
+class TestUserPermissionsAnnotation:
+    def test_annotated_permissions(self, rando, organization, inv_rd, view_inv_rd, django_assert_num_queries):
+        inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(3)]
+        inv_rd.give_permission(rando, inventories[0])
+        view_inv_rd.give_permission(rando, inventories[1])
+        qs = Inventory.with_user_permissions(rando, queryset=Inventory.access_qs(rando))
+        with django_assert_num_queries(1):  # global roles were checked when making the queryset
+            result = {inv.pk: set(inv.user_permissions) for inv in qs}
+        assert result == {inventories[0].pk: {'change_inventory', 'view_inventory'}, inventories[1].pk: {'view_inventory'}}
+        for inv in qs:
+            assert set(inv.user_permissions) == set(RoleEvaluation.get_permissions(rando, inv))
+
+    def test_given_codenames(self, rando, inventory, inv_rd):
+        inv_rd.give_permission(rando, inventory)
+        inv = Inventory.with_user_permissions(rando, codenames=['change'], annotation='perms').get(pk=inventory.pk)
+        assert inv.perms == ['change_inventory']
+        inv = Inventory.with_user_permissions(rando, codenames=['delete']).get(pk=inventory.pk)
+        assert inv.user_permissions == []
+
+    def test_superuser(self, admin_user, inventory):
+        inv = Inventory.with_user_permissions(admin_user).get(pk=inventory.pk)
+        assert set(inv.user_permissions) == {'change_inventory', 'delete_inventory', 'view_inventory', 'update_inventory'}
+
+    def test_global_role(self, rando, inventory):
+        rd = RoleDefinition.objects.create_from_permissions(permissions=['delete_inventory', 'view_inventory'], name='global-delete-inv')
+        rd.give_global_permission(rando)
+        inv = Inventory.with_user_permissions(rando).get(pk=inventory.pk)
+        assert set(inv.user_permissions) == {'delete_inventory', 'view_inventory'}
+
+    def test_uuid_model(self, rando, organization):
+        obj = UUIDModel.objects.create(organization=organization)
+        rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_uuidmodel'], name='see-uuid', content_type=permission_registry.content_type_model.objects.get_for_model(UUIDModel)
+        )
+        rd.give_permission(rando, obj)
+        assert UUIDModel.with_user_permissions(rando).get(pk=obj.pk).user_permissions == ['view_uuidmodel']
+
+    def test_codenames_with_spaces(self, rando, organization):
+        obj = WeirdPerm.objects.create(organization=organization)
+        rd = RoleDefinition.objects.create_from_permissions(
+            permissions=["I'm a lovely coconut", 'crack', 'view_weirdperm'],
+            name='coconut-cracker',
+            content_type=permission_registry.content_type_model.objects.get_for_model(WeirdPerm),
+        )
+        rd.give_permission(rando, obj)
+        assert set(WeirdPerm.with_user_permissions(rando).get(pk=obj.pk).user_permissions) == {"I'm a lovely coconut", 'crack', 'view_weirdperm'}
+        obj = WeirdPerm.with_user_permissions(rando, codenames=["I'm a lovely coconut"]).get(pk=obj.pk)
+        assert obj.user_permissions == ["I'm a lovely coconut"]
+
+
+@pytest.mark.django_db
+class TestAccessibleObjectsStrategy:
+    @pytest.mark.parametrize('strategy', ['in', 'exists'])
+    def test_strategies_agree(self, rando, team, organization, inv_rd, org_inv_rd, member_rd, strategy):
+        inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(4)]
+        other_org = Organization.objects.create(name='other-org')
+        other_inv = Inventory.objects.create(name='other-inv', organization=other_org)
+        inv_rd.give_permission(rando, inventories[0])
+        inv_rd.give_permission(team, inventories[1])  # also given through the organization, so has duplicate evaluations
+        org_inv_rd.give_permission(team, organization)
+        member_rd.give_permission(rando, team)
+
+        assert set(Inventory.access_qs(rando, strategy=strategy)) == set(inventories)
+        assert set(Inventory.access_qs(rando, 'delete', strategy=strategy)) == set(inventories)
+        assert list(Inventory.access_qs(rando, strategy=strategy, queryset=Inventory.objects.filter(name='inv-2'))) == [inventories[2]]
+        assert set(Inventory.access_qs(team, strategy=strategy)) == set(inventories)
+        assert other_inv not in Inventory.access_qs(rando, strategy=strategy)
+
+    def test_uuid_model(self, rando, organization):
+        objs = [UUIDModel.objects.create(organization=organization) for i in range(2)]
+        rd = RoleDefinition.objects.create_from_permissions(
+            permissions=['view_uuidmodel'], name='see-uuid', content_type=permission_registry.content_type_model.objects.get_for_model(UUIDModel)
+        )
+        rd.give_permission(rando, objs[0])
+        assert list(UUIDModel.access_qs(rando, strategy='exists')) == [objs[0]]
+
+    def test_strategy_setting(self, rando, inventory, inv_rd):
+        inv_rd.give_permission(rando, inventory)
+        with override_settings(ANSIBLE_BASE_ACCESSIBLE_OBJECTS_STRATEGY='exists'):
+            qs = Inventory.access_qs(rando)
+            assert 'EXISTS' in str(qs.query)
+            assert list(qs) == [inventory]
+        with override_settings(ANSIBLE_BASE_ACCESSIBLE_OBJECTS_STRATEGY='hash'):
+            with pytest.raises(RuntimeError):
+                Inventory.access_qs(rando)
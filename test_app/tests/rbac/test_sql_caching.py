@@ -0,0 +1,83 @@
+import pytest
+from django.test import override_settings
+
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.sql_caching import compute_object_role_permissions_sql
+from test_app.models import CollectionImport, Inventory, Namespace, Organization, UUIDModel
+from test_app.tests.rbac.conftest import evaluation_snapshot
+
+
+@pytest.fixture
+def rbac_data(organization, inventory, rando, member_rd, org_inv_rd, inv_rd):
+    """Roles of many types, including team membership, child objects, add permissions, and UUID models"""
+    org_ct = permission_registry.content_type_model.objects.get_for_model(Organization)
+    org_uuid_rd, _ = RoleDefinition.objects.get_or_create(
+        permissions=['add_uuidmodel', 'view_uuidmodel', 'view_organization'], name='org-see UUID model', content_type=org_ct
+    )
+    org_collection_rd, _ = RoleDefinition.objects.get_or_create(
+        permissions=['add_collectionimport', 'view_collectionimport', 'view_namespace', 'view_organization'], name='org-collections', content_type=org_ct
+    )
+
+    other_org = Organization.objects.create(name='other-org')
+    for org in (organization, other_org):
+        for i in range(3):
+            Inventory.objects.create(name=f'inv-{i}', organization=org)
+            UUIDModel.objects.create(organization=org)
+            namespace = Namespace.objects.create(name=f'ns-{org.name}-{i}', organization=org)
+            CollectionImport.objects.create(name=f'collection-{org.name}-{i}', namespace=namespace)
+
+    teams = [permission_registry.team_model.objects.create(name=f'team-{i}', organization=organization) for i in range(3)]
+    member_rd.give_permission(rando, teams[0])
+    member_rd.give_permission(teams[0], teams[1])
+    org_inv_rd.give_permission(teams[1], other_org)
+    org_uuid_rd.give_permission(teams[2], organization)
+    org_collection_rd.give_permission(rando, other_org)
+    inv_rd.give_permission(teams[0], inventory)
+    org_uuid_rd.give_permission(rando, other_org)
+    return teams
+
+
+@pytest.mark.django_db
+class TestSQLEvaluationParity:
+    @pytest.mark.parametrize('cache_parent', [True, False])
+    def test_full_rebuild_parity(self, rbac_data, cache_parent):
+        with override_settings(ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS=cache_parent):
+            compute_object_role_permissions()
+            expected = evaluation_snapshot()
+            # sanity, data covers both evaluation tables and grandchild objects
+            assert {row[0] for row in expected} == {'roleevaluation', 'roleevaluationuuid'}
+            assert 'view_collectionimport' in {row[2] for row in expected}
+
+            RoleEvaluation.objects.filter(id__in=RoleEvaluation.objects.values('id')[:5]).delete()
+            RoleEvaluationUUID.objects.filter(id__in=RoleEvaluationUUID.objects.values('id')[:2]).delete()
+            object_role = ObjectRole.objects.first()
+            RoleEvaluation.objects.create(role=object_role, codename='delete_inventory', content_type_id=object_role.content_type_id, object_id=12345)
+            assert evaluation_snapshot() != expected
+
+            compute_object_role_permissions_sql()
+            assert evaluation_snapshot() == expected
+
+    def test_scoped_parity(self, rbac_data):
+        expected = evaluation_snapshot()
+        team_role = rbac_data[1].has_roles.first()
+        affected_roles = set(ObjectRole.objects.filter(provides_teams__in=rbac_data[:2]).distinct()) | {team_role}
+        for object_role in affected_roles:
+            object_role.permission_partials.all().delete()
+            object_role.permission_partials_uuid.all().delete()
+
+        compute_object_role_permissions_sql(object_roles=affected_roles)
+        assert evaluation_snapshot() == expected
+
+    def test_signals_with_sql_engine(self, rbac_data, rando, inventory, member_rd):
+        with override_settings(ANSIBLE_BASE_EVALUATION_ENGINE='sql'):
+            member_rd.remove_permission(rando, rbac_data[0])
+            assert not rando.has_obj_perm(inventory, 'change')
+            member_rd.give_permission(rando, rbac_data[0])
+            assert rando.has_obj_perm(inventory, 'change')
+            rbac_data[2].delete()
+            sql_result = evaluation_snapshot()
+
+        compute_object_role_permissions()
+        assert evaluation_snapshot() == sql_result
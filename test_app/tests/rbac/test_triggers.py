@@ -1,13 +1,18 @@
+from unittest import mock
 from unittest.mock import MagicMock
+from uuid import uuid4
 
 import pytest
 from django.apps import apps
-from django.test.utils import override_settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
 
-from ansible_base.rbac.models import ObjectRole, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment
+from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry
-from ansible_base.rbac.triggers import dab_post_migrate, post_migration_rbac_setup
-from test_app.models import Inventory, Organization
+from ansible_base.rbac.triggers import dab_post_migrate, post_migration_rbac_setup, rbac_batch, rbac_batch_state
+from test_app.models import CollectionImport, Inventory, Namespace, Organization, UUIDModel
+from test_app.tests.rbac.conftest import evaluation_snapshot
 
 
 @pytest.mark.django_db
@@ -46,6 +51,109 @@ def test_change_parent_field_with_only(team, rando, inventory, org_inv_rd, membe
     assert not rando.has_obj_perm(inv_copy, 'change')
 
 
+@pytest.fixture
+def org_everything_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=[
+            'view_organization',
+            'change_inventory',
+            'view_inventory',
+            'view_namespace',
+            'add_collectionimport',
+            'view_collectionimport',
+            'view_uuidmodel',
+        ],
+        name='org-everything',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+@pytest.mark.django_db
+class TestChildObjectCreated:
+    @pytest.mark.parametrize('model', ['inventory', 'namespace', 'collectionimport', 'uuidmodel'])
+    def test_new_evaluations_match_recompute(self, organization, team, rando, org_everything_rd, member_rd, model):
+        member_rd.give_permission(rando, team)
+        org_everything_rd.give_permission(team, organization)
+        org_everything_rd.give_permission(rando, organization)
+        namespace = Namespace.objects.create(name='existing-namespace', organization=organization)
+
+        if model == 'inventory':
+            obj = Inventory.objects.create(name='new-inv', organization=organization)
+        elif model == 'namespace':
+            obj = Namespace.objects.create(name='new-namespace', organization=organization)
+        elif model == 'collectionimport':
+            obj = CollectionImport.objects.create(name='new-collection', namespace=namespace)
+        else:
+            obj = UUIDModel.objects.create(organization=organization)
+        assert rando.has_obj_perm(obj, 'view')
+
+        snapshot = evaluation_snapshot()
+        compute_object_role_permissions()
+        assert evaluation_snapshot() == snapshot
+
+    def test_uuid_given_as_string(self, organization, rando, org_everything_rd):
+        org_everything_rd.give_permission(rando, organization)
+        obj = UUIDModel.objects.create(id=str(uuid4()), organization=organization)
+        assert rando.has_obj_perm(UUIDModel.objects.get(pk=obj.pk), 'view')
+
+    def test_existing_evaluations_not_loaded(self, organization, rando, org_inv_rd):
+        org_inv_rd.give_permission(rando, organization)
+        with CaptureQueriesContext(connection) as ctx:
+            inventory = Inventory.objects.create(name='new-inv', organization=organization)
+        assert not any(query['sql'].startswith('SELECT') and 'roleevaluation' in query['sql'] for query in ctx.captured_queries)
+        assert rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+class TestParentChanged:
+    @pytest.fixture
+    def setup(self, organization, team, rando, org_everything_rd, member_rd):
+        "Roles on both organizations, given to users directly and through teams"
+        new_org = Organization.objects.create(name='new-org')
+        member_rd.give_permission(rando, team)
+        org_everything_rd.give_permission(team, organization)
+        org_everything_rd.give_permission(rando, new_org)
+        namespace = Namespace.objects.create(name='namespace', organization=organization)
+        CollectionImport.objects.create(name='collection', namespace=namespace)
+        return (organization, new_org, namespace)
+
+    @pytest.mark.parametrize('model', ['inventory', 'namespace', 'collectionimport'])
+    def test_moved_evaluations_match_recompute(self, setup, team, rando, model):
+        organization, new_org, namespace = setup
+        new_namespace = Namespace.objects.create(name='new-namespace', organization=new_org)
+        if model == 'inventory':
+            obj = Inventory.objects.create(name='inv', organization=organization)
+        elif model == 'namespace':
+            obj = namespace
+        else:
+            obj = namespace.collections.first()
+        # a direct role on the object through the team gives some of the same permissions
+        RoleDefinition.objects.create_from_permissions(
+            permissions=[f'view_{model}'], name='view-obj', content_type=permission_registry.content_type_model.objects.get_for_model(obj)
+        ).give_permission(team, obj)
+
+        if model == 'collectionimport':
+            obj.namespace = new_namespace
+        else:
+            obj.organization = new_org
+        obj.save()
+
+        snapshot = evaluation_snapshot()
+        compute_object_role_permissions()
+        assert evaluation_snapshot() == snapshot
+        assert rando.has_obj_perm(obj, 'view')
+
+    def test_move_within_organization(self, setup):
+        organization, _, namespace = setup
+        collection = namespace.collections.first()
+        collection.namespace = Namespace.objects.create(name='other-namespace', organization=organization)
+        collection.save()
+
+        snapshot = evaluation_snapshot()
+        compute_object_role_permissions()
+        assert evaluation_snapshot() == snapshot
+
+
 @pytest.mark.django_db
 def test_perform_unrelated_update(inventory):
     """
@@ -172,3 +280,117 @@ def test_delete_signals_team_organization(organization, inventory, team, org_inv
         assert not RoleEvaluation.objects.filter(**org_gfk).exists()
 
     assert not RoleEvaluation.objects.filter(**inv_gfk).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('actor_type', ['user', 'team'])
+def test_actor_delete_only_cleans_own_roles(organization, inv_rd, actor_type):
+    inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(2)]
+    other_user = permission_registry.user_model.objects.create(username='other-user')
+    unrelated_role = inv_rd.give_permission(other_user, inventories[0]).object_role
+    ObjectRole.users.through.objects.filter(object_role=unrelated_role).delete()  # orphaned without signals
+    if actor_type == 'user':
+        actor = permission_registry.user_model.objects.create(username='deleted-user')
+    else:
+        actor = permission_registry.team_model.objects.create(name='deleted-team', organization=organization)
+    actor_role = inv_rd.give_permission(actor, inventories[1]).object_role
+
+    actor.delete()
+    assert not ObjectRole.objects.filter(id=actor_role.id).exists()
+    # only roles the deleted actor had are checked
+    assert ObjectRole.objects.filter(id=unrelated_role.id).exists()
+
+
+@pytest.mark.django_db
+class TestRBACBatch:
+    def test_one_recompute_for_many_assignments(self, organization, inventory, org_inv_rd):
+        users = [permission_registry.user_model.objects.create(username=f'batch-user-{i}') for i in range(5)]
+        with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions') as mck:
+            with rbac_batch():
+                for user in users:
+                    org_inv_rd.give_permission(user, organization)
+                mck.assert_not_called()
+            mck.assert_called_once()
+
+    def test_evaluations_correct_after_batch(self, organization, inventory, org_inv_rd, member_rd, rando):
+        teams = [permission_registry.team_model.objects.create(name=f'batch-team-{i}', organization=organization) for i in range(3)]
+        with rbac_batch():
+            for parent_team, child_team in zip(teams[:-1], teams[1:]):
+                member_rd.give_permission(parent_team, child_team)
+            org_inv_rd.give_permission(teams[-1], organization)
+            member_rd.give_permission(rando, teams[0])
+            assert not rando.has_obj_perm(inventory, 'change')  # not computed yet
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_give_and_remove_in_batch(self, inventory, inv_rd, rando):
+        with rbac_batch():
+            inv_rd.give_permission(rando, inventory)
+            inv_rd.remove_permission(rando, inventory)
+        assert not rando.has_obj_perm(inventory, 'change')
+        assert not ObjectRole.objects.filter(role_definition=inv_rd).exists()
+
+    def test_nested_batch(self, inventory, inv_rd, rando):
+        with rbac_batch():
+            with rbac_batch():
+                inv_rd.give_permission(rando, inventory)
+            assert not rando.has_obj_perm(inventory, 'change')
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_exception_in_batch(self, inventory, inv_rd, rando):
+        with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions') as mck:
+            with pytest.raises(ValueError):
+                with transaction.atomic():
+                    with rbac_batch():
+                        inv_rd.give_permission(rando, inventory)
+                        raise ValueError('block failed')
+            mck.assert_not_called()
+        assert not rbac_batch_state
+        assert not rbac_batch_state.role_ids
+        assert not ObjectRole.objects.filter(role_definition=inv_rd).exists()
+
+        # later batches are not affected by the failed one
+        with rbac_batch():
+            inv_rd.give_permission(rando, inventory)
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_on_commit_mode(self, inventory, inv_rd, rando, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with rbac_batch(on_commit=True):
+                inv_rd.give_permission(rando, inventory)
+            assert not rando.has_obj_perm(inventory, 'change')
+        assert len(callbacks) == 1
+        assert rando.has_obj_perm(inventory, 'change')
+
+    def test_bulk_delete_in_batch(self, organization, inv_rd, org_inv_rd, rando):
+        org_inv_rd.give_permission(rando, organization)
+        query_counts = []
+        for count in (2, 6):
+            inventories = [Inventory.objects.create(name=f'batch-inv-{count}-{i}', organization=organization) for i in range(count)]
+            for inventory in inventories:
+                inv_rd.give_permission(rando, inventory)
+            with CaptureQueriesContext(connection) as ctx:
+                with rbac_batch():
+                    Inventory.objects.filter(pk__in=[inventory.pk for inventory in inventories]).delete()
+            query_counts.append(len([query for query in ctx.captured_queries if 'dab_rbac_objectrole' in query['sql']]))
+            for inventory in inventories:
+                assert not ObjectRole.objects.filter(**gfk_filter(inventory)).exists()
+                assert not RoleEvaluation.objects.filter(**gfk_filter(inventory)).exists()
+        assert query_counts[0] == query_counts[1]
+        assert ObjectRole.objects.filter(role_definition=org_inv_rd).exists()
+
+    def test_delete_teams_in_batch(self, organization, inventory, org_inv_rd, member_rd, rando):
+        teams = [permission_registry.team_model.objects.create(name=f'batch-team-{i}', organization=organization) for i in range(4)]
+        for parent_team, child_team in zip(teams[:-1], teams[1:]):
+            member_rd.give_permission(parent_team, child_team)
+        org_inv_rd.give_permission(teams[-1], organization)
+        member_rd.give_permission(rando, teams[0])
+        assert rando.has_obj_perm(inventory, 'change')
+
+        with rbac_batch():
+            permission_registry.team_model.objects.filter(pk__in=[teams[1].pk, teams[2].pk]).delete()
+        assert not rando.has_obj_perm(inventory, 'change')
+
+        snapshot = evaluation_snapshot()
+        compute_team_member_roles()
+        compute_object_role_permissions()
+        assert evaluation_snapshot() == snapshot
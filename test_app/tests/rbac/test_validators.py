@@ -1,4 +1,6 @@
 import contextlib
+from types import MappingProxyType
+from unittest import mock
 
 import pytest
 from django.test.utils import override_settings
@@ -6,7 +8,8 @@ from rest_framework.exceptions import ValidationError
 
 from ansible_base.lib.utils.response import get_relative_url
 from ansible_base.rbac.models import RoleDefinition
-from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.permission_registry import model_codenames, permission_registry
+from ansible_base.rbac.validators import compute_permissions_allowed_for_role, permissions_allowed_for_role
 from test_app.models import Credential, Inventory, Organization
 
 
@@ -138,3 +141,22 @@ def test_no_change_permission_without_view(enabled):
             )
     if enabled:
         assert 'needs to include view, got:' in str(exc)
+
+
+def test_compiled_lookups_match_registry():
+    for cls in permission_registry.all_registered_models + [None]:
+        allowed = permissions_allowed_for_role(cls)
+        assert {model: list(codenames) for model, codenames in allowed.items()} == compute_permissions_allowed_for_role(cls)
+        with pytest.raises(TypeError):
+            allowed[Inventory] = ()  # shared between callers, so it can not be changed
+        if cls is None:
+            continue
+        assert permission_registry.get_codenames(cls) == model_codenames(cls)
+        assert permission_registry.get_child_models(cls) == tuple(permission_registry._find_child_models(cls))
+        assert permission_registry.get_model_by_name(cls._meta.model_name) is cls
+
+
+def test_allowed_permissions_before_lookups_compiled():
+    with mock.patch.object(permission_registry, '_allowed_permissions', MappingProxyType({})):
+        allowed = permissions_allowed_for_role(Inventory)
+    assert allowed == permissions_allowed_for_role(Inventory)